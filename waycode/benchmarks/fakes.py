@@ -0,0 +1,64 @@
+import math
+import re
+import zlib
+from types import SimpleNamespace
+
+# Offline stand-ins for the google.genai client so benchmarks measure
+# WayCode's own overhead with no network and reproducible results.
+
+EMBEDDING_DIMENSIONS = 256
+
+def hashing_embedding(text, dimensions=EMBEDDING_DIMENSIONS):
+    # Signed feature-hashing of identifier tokens, L2-normalized, so similar
+    # code maps to nearby vectors like a real embedding model would
+    vector = [0.0] * dimensions
+    for token in re.findall(r"[A-Za-z_][A-Za-z0-9_]*|\d+|\S", text):
+        h = zlib.crc32(token.encode("utf-8"))
+        vector[h % dimensions] += 1.0 if h & 0x80000000 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+def refactor_response(prompt):
+    # Deterministic model answer echoing the code block found in the prompt
+    match = re.search(r"```(\w*)\n(.*?)\n```", prompt, re.S)
+    language, code = (match.group(1), match.group(2)) if match else ("", "")
+    return (
+        "Renamed nothing and kept behaviour identical (benchmark response).\n"
+        f"```{language}\n{code}\n```"
+    )
+
+class FakeModels:
+    # Implements the subset of client.models used by WayCode
+    def __init__(self):
+        self.embed_calls = 0
+        self.generate_calls = 0
+    
+    def embed_content(self, model, contents, config=None):
+        self.embed_calls += 1
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=hashing_embedding(text)) for text in contents
+        ])
+    
+    def generate_content(self, model, contents, config=None):
+        self.generate_calls += 1
+        return SimpleNamespace(text=refactor_response(contents))
+    
+    def generate_content_stream(self, model, contents, config=None):
+        self.generate_calls += 1
+        text = refactor_response(contents)
+        for start in range(0, len(text), 64):
+            yield SimpleNamespace(text=text[start:start + 64])
+
+class FakeAsyncModels:
+    # Async counterpart used by arefactor_code
+    def __init__(self, models):
+        self.models = models
+    
+    async def generate_content(self, model, contents, config=None):
+        return self.models.generate_content(model, contents, config)
+
+class FakeGenaiClient:
+    # Drop-in replacement for genai.Client with deterministic responses
+    def __init__(self):
+        self.models = FakeModels()
+        self.aio = SimpleNamespace(models=FakeAsyncModels(self.models))
@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Offline benchmark suite: indexing throughput, retrieval latency and the
+# refactor pipeline's own overhead, using a fake genai client and a local
+# hashing embedding so no network or API key is needed.
+#
+#   python benchmarks/run.py --files 200 --queries 50 --output results.json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [ROOT, HERE]
+
+def percentiles(samples):
+    # Latency summary in milliseconds
+    ordered = sorted(samples)
+    
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+    
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else None,
+        "p50_ms": pick(0.50) if ordered else None,
+        "p90_ms": pick(0.90) if ordered else None,
+        "p99_ms": pick(0.99) if ordered else None,
+        "max_ms": ordered[-1] * 1000 if ordered else None
+    }
+
+def peak_rss_bytes():
+    # Peak resident set size of this process, where the platform reports it
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def build_agent(client):
+    # RefactorAgent wired to the fake client and an offline vector store
+    from waycode.rag.embeddings import EmbeddingGenerator
+    from waycode.rag.memory_manager import MemoryManager
+    from waycode.rag.vector_store import VectorStore
+    from waycode.refactor_agent import RefactorAgent
+    
+    memory = MemoryManager()
+    memory._vector_store = VectorStore(EmbeddingGenerator(client=client))
+    agent = RefactorAgent(use_cache=False)
+    agent._client = client
+    agent._memory = memory
+    return agent
+
+def bench_index(agent, repo, workers):
+    # Cold index of the whole repository, then a no-op re-index
+    from waycode.rag.indexer import ProjectIndexer
+    cold = ProjectIndexer(agent.memory).index_path(repo, recursive=True, workers=workers)
+    warm = ProjectIndexer(agent.memory).index_path(repo, recursive=True, workers=workers)
+    elapsed = max(cold["elapsed"], 1e-9)
+    return {
+        "files": cold["files"],
+        "chunks": cold["chunks"],
+        "elapsed_s": cold["elapsed"],
+        "files_per_s": cold["files"] / elapsed,
+        "chunks_per_s": cold["chunks"] / elapsed,
+        "reindex_unchanged_s": warm["elapsed"]
+    }
+
+def bench_retrieval(agent, samples):
+    # get_relevant_context latency for distinct queries, then repeated ones
+    memory = agent.memory
+    cold = []
+    for code, language in samples:
+        started = time.perf_counter()
+        memory.get_relevant_context(code, language)
+        cold.append(time.perf_counter() - started)
+    
+    warm = []
+    for code, language in samples:
+        started = time.perf_counter()
+        memory.get_relevant_context(code, language)
+        warm.append(time.perf_counter() - started)
+    return {"cold": percentiles(cold), "warm": percentiles(warm)}
+
+def bench_refactor(agent, samples):
+    # refactor_code end to end; the fake model answers instantly, so this
+    # is WayCode's own overhead (retrieval, prompt, parse, diff, history)
+    timings = []
+    for code, language in samples:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.refactor_code(code, language, "benchmark.py")
+        timings.append(time.perf_counter() - started)
+    return percentiles(timings)
+
+def bench_diff(lines, seed):
+    # Unified diff and diff-stat of a generated file dominated by repeated
+    # lines (braces, blanks), the worst case for difflib's SequenceMatcher
+    from waycode.utils.diff_generator import DiffGenerator
+    rng = random.Random(seed)
+    original = [rng.choice(["", "}", "{", "    return x;"]) if i % 7 else f"int f{i}() {{"
+                for i in range(lines)]
+    changed = list(original)
+    for _ in range(max(1, lines // 50)):
+        changed[rng.randrange(lines)] = rng.choice(["", "}", "x = 1;"])
+    original, changed = "\n".join(original), "\n".join(changed)
+    
+    differ = DiffGenerator()
+    started = time.perf_counter()
+    differ.generate_diff(original, changed)
+    unified = time.perf_counter() - started
+    started = time.perf_counter()
+    differ.stat(original, changed)
+    return {"lines": lines, "unified_ms": unified * 1000,
+            "stat_ms": (time.perf_counter() - started) * 1000}
+
+def sample_units(agent, paths, count, seed):
+    # Pick code units from the synthetic repo to use as queries
+    rng = random.Random(seed)
+    units = []
+    for _ in range(count):
+        path = rng.choice(paths)
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+        language = agent.analyzer.detect_language(path)
+        units.append((rng.choice(agent.memory.chunker.chunk(code, language))["content"], language))
+    return units
+
+def run(args):
+    # Execute every benchmark inside an isolated data directory
+    from fakes import FakeGenaiClient
+    from synthetic import make_repo
+    
+    repo = os.path.join(args.workdir, "repo")
+    paths = make_repo(repo, files=args.files, units_per_file=args.units, seed=args.seed)
+    
+    client = FakeGenaiClient()
+    agent = build_agent(client)
+    results = {
+        "index": bench_index(agent, repo, args.workers),
+    }
+    samples = sample_units(agent, paths, args.queries, args.seed)
+    results["retrieval"] = bench_retrieval(agent, samples)
+    results["refactor"] = bench_refactor(agent, samples[:args.refactors])
+    results["diff"] = bench_diff(args.diff_lines, args.seed)
+    results["peak_rss_bytes"] = peak_rss_bytes()
+    results["model_calls"] = {
+        "embed": client.models.embed_calls,
+        "generate": client.models.generate_calls
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run WayCode's offline benchmarks")
+    parser.add_argument("--files", type=int, default=200, help="Files in the synthetic repo")
+    parser.add_argument("--units", type=int, default=8, help="Functions/classes per file")
+    parser.add_argument("--queries", type=int, default=50, help="Retrieval queries to time")
+    parser.add_argument("--refactors", type=int, default=20, help="refactor_code calls to time")
+    parser.add_argument("--diff-lines", type=int, default=10000, help="Lines in the diff benchmark file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--backend", choices=("chroma", "flat"), default="chroma",
+                        help="Vector store backend to benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary work directory")
+    args = parser.parse_args()
+    
+    # WayCode resolves its data directory from HOME at import time, so point
+    # it at a scratch directory before anything from waycode is imported
+    args.workdir = tempfile.mkdtemp(prefix="waycode-bench-")
+    os.environ["HOME"] = os.environ["USERPROFILE"] = os.path.join(args.workdir, "home")
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    os.environ["WAYCODE_NO_DAEMON"] = "1"
+    os.environ["WAYCODE_VECTOR_BACKEND"] = args.backend
+    
+    try:
+        started = time.perf_counter()
+        results = run(args)
+        import waycode
+        report = {
+            "waycode_version": waycode.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": datetime.now().isoformat(),
+            "parameters": {k: v for k, v in vars(args).items() if k not in ("output", "keep", "workdir")},
+            "total_s": time.perf_counter() - started,
+            "results": results
+        }
+    finally:
+        if not args.keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
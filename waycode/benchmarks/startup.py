@@ -0,0 +1,58 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold-start benchmark for the CLI. Editor integrations run `waycode` on
+# every save, so startup time is tracked alongside the other benchmarks.
+#
+#   python benchmarks/startup.py --runs 20 --max-ms 300
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    "import": ["-c", "import waycode"],
+    "version": ["-m", "waycode.cli", "--version"],
+    "help": ["-m", "waycode.cli", "--help"],
+    "refactor-help": ["-m", "waycode.cli", "refactor", "--help"],
+}
+
+def time_command(args, runs, env):
+    # Wall-clock milliseconds for each run of a fresh interpreter
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, *args], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure WayCode CLI startup time")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Exit non-zero if any command's median exceeds this")
+    args = parser.parse_args()
+    
+    env = dict(os.environ, HOME=tempfile.mkdtemp(), PYTHONPATH=ROOT)
+    baseline = statistics.median(time_command(["-c", "pass"], args.runs, env))
+    print(f"{'interpreter':<14} median {baseline:7.1f} ms")
+    
+    slow = []
+    for name, command in COMMANDS.items():
+        samples = time_command(command, args.runs, env)
+        median = statistics.median(samples)
+        print(f"{name:<14} median {median:7.1f} ms  min {min(samples):7.1f} ms  "
+              f"(+{median - baseline:.1f} ms over bare python)")
+        if args.max_ms is not None and median > args.max_ms:
+            slow.append(name)
+    
+    if slow:
+        print(f"Startup regression: {', '.join(slow)} slower than {args.max_ms} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import random
+
+# Synthetic repositories of configurable size for the benchmark suite. The
+# generated code is varied enough that chunking, embedding and retrieval do
+# real work, and is fully determined by the seed.
+
+VERBS = ["load", "parse", "build", "render", "update", "validate", "fetch", "merge", "format", "sync"]
+NOUNS = ["user", "order", "invoice", "report", "session", "config", "payload", "record", "token", "cart"]
+
+def _name(rng):
+    return f"{rng.choice(VERBS)}_{rng.choice(NOUNS)}_{rng.randint(0, 999)}"
+
+def python_module(rng, units):
+    # A module with a mix of functions and small classes
+    lines = ["import os", "import json", ""]
+    for i in range(units):
+        name = _name(rng)
+        if i % 4 == 3:
+            cls = name.title().replace("_", "")
+            lines += [
+                f"class {cls}:",
+                "    def __init__(self, items):",
+                "        self.items = list(items)",
+                "",
+                "    def total(self):",
+                "        return sum(item.get('amount', 0) for item in self.items)",
+                "",
+            ]
+        else:
+            lines += [
+                f"def {name}(data, limit={rng.randint(1, 50)}):",
+                "    result = []",
+                "    for item in data:",
+                f"        if item.get('{rng.choice(NOUNS)}') and len(result) < limit:",
+                f"            result.append(json.dumps(item, sort_keys={rng.choice(['True', 'False'])}))",
+                f"    return os.linesep.join(result)",
+                "",
+            ]
+    return "\n".join(lines)
+
+def javascript_module(rng, units):
+    # A module with function declarations, arrow functions and classes
+    lines = []
+    for i in range(units):
+        name = _name(rng).replace("_", "")
+        if i % 3 == 2:
+            lines += [
+                f"class {name.title()} {{",
+                "  constructor(items) { this.items = items; }",
+                "  total() { return this.items.reduce((a, b) => a + b.amount, 0); }",
+                "}",
+                "",
+            ]
+        elif i % 3 == 1:
+            lines += [f"const {name} = (data) => data.filter((x) => x.{rng.choice(NOUNS)}).map(String);", ""]
+        else:
+            lines += [
+                f"function {name}(data, limit = {rng.randint(1, 50)}) {{",
+                "  const out = [];",
+                f"  for (const item of data) {{ if (item.{rng.choice(NOUNS)}) out.push(item); }}",
+                "  return out.slice(0, limit);",
+                "}",
+                "",
+            ]
+    return "\n".join(lines)
+
+def make_repo(root, files=100, units_per_file=8, js_ratio=0.3, seed=0):
+    # Write a synthetic project under root and return the file paths
+    rng = random.Random(seed)
+    paths = []
+    for i in range(files):
+        package = os.path.join(root, f"pkg{i % 10}")
+        os.makedirs(package, exist_ok=True)
+        if rng.random() < js_ratio:
+            path = os.path.join(package, f"module_{i}.js")
+            source = javascript_module(rng, units_per_file)
+        else:
+            path = os.path.join(package, f"module_{i}.py")
+            source = python_module(rng, units_per_file)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        paths.append(path)
+    return paths
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from waycode.batch_refactor import BatchRefactorer
+from waycode.refactor_agent import RefactorAgent
+
+class SlowAgent:
+    # Fake agent whose refactor takes a fixed time and fails on one file
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+    
+    async def arefactor_code(self, code, language, filename=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        if 'broken' in filename:
+            return None
+        return {'code': code.upper(), 'explanation': '', 'cached': 'cached' in filename}
+
+class CountingModels:
+    # Async model API recording the peak number of calls in flight
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+    
+    async def generate_content(self, model, contents, config=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SimpleNamespace(text="ok", usage_metadata=None)
+
+class TestBatchRefactorer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, 'src')
+        os.makedirs(os.path.join(self.src, 'pkg'))
+        names = ['a.py', 'b.py', 'cached.py', 'pkg/c.py', 'pkg/broken.py', 'notes.txt']
+        for name in names:
+            with open(os.path.join(self.src, name), 'w') as f:
+                f.write('x = 1\n')
+        self.out = os.path.join(self.tmp.name, 'out')
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_concurrency_outputs_and_summary(self):
+        agent = SlowAgent(delay=0.05)
+        batch = BatchRefactorer(agent, concurrency=2, output_dir=self.out)
+        
+        started = time.perf_counter()
+        summary = batch.run(self.src)
+        elapsed = time.perf_counter() - started
+        
+        self.assertEqual(agent.peak, 2)
+        self.assertLess(elapsed, 5 * 0.05)
+        self.assertEqual((summary['succeeded'], summary['cached'], summary['failed']), (3, 1, 1))
+        with open(os.path.join(self.out, 'pkg', 'c.py')) as f:
+            self.assertEqual(f.read(), 'X = 1\n')
+        self.assertFalse(os.path.exists(os.path.join(self.out, 'notes.txt')))
+    
+    def test_agent_bounds_model_calls_across_callers(self):
+        # Files and the segments of split files share the agent's limit
+        agent = RefactorAgent(use_memory=False, concurrency=2)
+        models = CountingModels()
+        agent._client = SimpleNamespace(aio=SimpleNamespace(models=models))
+        
+        async def many():
+            return await asyncio.gather(*(agent._agenerate_with_retry("p") for _ in range(6)))
+        
+        for _ in range(2):
+            # Each asyncio.run has its own loop and semaphore
+            self.assertEqual(asyncio.run(many()), ["ok"] * 6)
+        self.assertEqual(models.peak, 2)
+    
+    def test_glob_target(self):
+        batch = BatchRefactorer(SlowAgent(delay=0), output_dir=self.out)
+        base, files = batch.collect_files(os.path.join(self.src, 'pkg', '*.py'))
+        self.assertEqual(base, os.path.join(self.src, 'pkg'))
+        self.assertEqual(len(files), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestBenchmarks(unittest.TestCase):
+    def test_offline_suite_writes_json(self):
+        # A tiny run completes without network access and reports every metric
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'results.json')
+            result = subprocess.run(
+                [sys.executable, os.path.join(ROOT, 'benchmarks', 'run.py'), '--files', '6',
+                 '--queries', '3', '--refactors', '2', '--output', output],
+                env=dict(os.environ, GEMINI_API_KEY=''), capture_output=True, text=True, timeout=120
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            with open(output) as f:
+                report = json.load(f)
+        
+        results = report['results']
+        self.assertEqual(results['index']['files'], 6)
+        self.assertGreater(results['index']['chunks'], 6)
+        self.assertEqual(results['retrieval']['cold']['count'], 3)
+        self.assertEqual(results['refactor']['count'], 2)
+        self.assertEqual(results['model_calls']['generate'], 2)
+        self.assertEqual(results['diff']['lines'], 10000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from waycode.rag.blob_store import BlobStore
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.blobs = BlobStore(':memory:')
+    
+    def tearDown(self):
+        self.blobs.close()
+    
+    def test_round_trip_and_dedupe(self):
+        value = {'original': 'x=1\n' * 500, 'refactored': 'x = 1\n' * 500, 'explanation': 'Spacing'}
+        key = self.blobs.put(value)
+        self.assertEqual(self.blobs.put(dict(value)), key)
+        self.assertEqual(self.blobs.get(key), value)
+        self.assertIsNone(self.blobs.get('missing'))
+        
+        stats = self.blobs.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertLess(stats['bytes'] * 20, stats['raw_bytes'])
+    
+    def test_delete(self):
+        keys = [self.blobs.put({'n': n}) for n in range(3)]
+        self.blobs.delete(keys[:2])
+        self.assertEqual(self.blobs.keys(), keys[2:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from waycode.rag.chunker import CodeChunker
+
+PYTHON_SOURCE = '''import os
+
+LIMIT = 10
+
+def load(path):
+    return open(path).read()
+
+class Store:
+    """Keeps things."""
+    size = 0
+
+    def add(self, item):
+        self.size += 1
+'''
+
+JS_SOURCE = '''import { api } from './api';
+
+export function fetchUser(id) {
+  return api.get(`/users/${id}`);
+}
+
+const double = (x) => x * 2;
+
+class Cart {
+  constructor() {
+    this.items = [];
+  }
+  total() {
+    return this.items.reduce((a, b) => a + b, 0);
+  }
+}
+'''
+
+class TestCodeChunker(unittest.TestCase):
+    def setUp(self):
+        self.chunker = CodeChunker()
+    
+    def test_python_units(self):
+        # Functions, classes and methods become separate units
+        units = {u['symbol']: u for u in self.chunker.chunk(PYTHON_SOURCE, 'python')}
+        self.assertEqual(set(units), {'<module>', 'load', 'Store', 'Store.add'})
+        self.assertEqual((units['load']['start_line'], units['load']['end_line']), (5, 6))
+        self.assertNotIn('import os', units['<module>']['content'])
+        self.assertNotIn('def add', units['Store']['content'])
+        self.assertEqual(units['Store.add']['kind'], 'method')
+    
+    def test_javascript_units(self):
+        # Declarations, arrow functions and class methods are recognised
+        units = {u['symbol']: u for u in self.chunker.chunk(JS_SOURCE, 'javascript')}
+        self.assertIn('fetchUser', units)
+        self.assertIn('double', units)
+        self.assertIn('Cart.constructor', units)
+        self.assertIn('Cart.total', units)
+        self.assertEqual(units['Cart.total']['start_line'], 13)
+        self.assertEqual(units['Cart.total']['end_line'], 15)
+    
+    def test_unparseable_falls_back_to_module(self):
+        # Invalid source is indexed as one unit instead of failing
+        units = self.chunker.chunk('def broken(:\n    pass\n', 'python')
+        self.assertEqual(len(units), 1)
+        self.assertEqual(units[0]['kind'], 'module')
+
+if __name__ == '__main__':
+    unittest.main()
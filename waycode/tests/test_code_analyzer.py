@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+from waycode.repo_stats import RepoStats
+from waycode.utils.code_analyzer import CodeAnalyzer
+
+PYTHON = '''import os
+
+# undef def things in comments do not count
+class Store:
+    def load(self, keys):
+        """def fake(): pass"""
+        if keys and self.ready or self.force:
+            for key in keys:
+                if key:
+                    pass
+        elif self.empty:
+            pass
+        return [k for k in keys if k]
+
+def helper():
+    def inner():
+        return 1 if os.sep else 2
+    try:
+        return inner()
+    except OSError:
+        return None
+'''
+
+JAVASCRIPT = '''// function fake() { if (x) { } }
+class Store {
+  load(keys?: string[]): number {
+    const s = "{ if (";
+    if (keys && this.ready) { return keys.length ? 1 : 0; }
+    return /[}]/.test(s) ? 1 : 0;
+  }
+}
+const helper = async (q) => {
+  switch (q) { case 1: break; case 2: break; }
+};
+'''
+
+class TestCodeAnalyzer(unittest.TestCase):
+    def test_python_metrics(self):
+        metrics = CodeAnalyzer().analyze_complexity(PYTHON, 'python')
+        functions = {f['name']: f for f in metrics['functions']}
+        self.assertEqual(sorted(functions), ['Store.load', 'helper', 'helper.inner'])
+        self.assertEqual(metrics['class_count'], 1)
+        self.assertEqual(metrics['comment_lines'], 1)
+        # if + and/or + for + if + elif + comprehension with a filter
+        self.assertEqual(functions['Store.load']['complexity'], 9)
+        # if/for/if under the def; the elif is not a deeper level
+        self.assertEqual(functions['Store.load']['nesting'], 3)
+        self.assertEqual(metrics['nesting_level'], 5)
+        self.assertEqual(functions['helper']['complexity'], 2)
+        self.assertEqual(functions['helper.inner']['complexity'], 2)
+    
+    def test_python_syntax_error(self):
+        metrics = CodeAnalyzer().analyze_complexity("def broken(:\n    pass\n", 'python')
+        self.assertEqual(metrics['error'], 'syntax')
+        self.assertEqual(metrics['function_count'], 0)
+    
+    def test_javascript_ignores_strings_comments_and_regexes(self):
+        metrics = CodeAnalyzer().analyze_complexity(JAVASCRIPT, 'typescript')
+        functions = {f['name']: f for f in metrics['functions']}
+        self.assertEqual(sorted(functions), ['helper', 'load'])
+        self.assertEqual(metrics['class_count'], 1)
+        self.assertEqual(metrics['nesting_level'], 3)
+        # if + && + two ternaries; `keys?:` is an optional marker, not a ternary
+        self.assertEqual(functions['load']['complexity'], 5)
+        self.assertEqual(functions['helper']['complexity'], 3)
+        self.assertEqual(metrics['comment_lines'], 1)
+
+class TestRepoStats(unittest.TestCase):
+    def test_collect_and_rank(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'node_modules'))
+            with open(os.path.join(tmp, 'node_modules', 'dep.js'), 'w') as f:
+                f.write("function skipped() {}\n")
+            for i in range(4):
+                with open(os.path.join(tmp, f"m{i}.py"), 'w') as f:
+                    f.write("def f(x):\n" + "    if x:\n        pass\n" * i + "    return x\n")
+            
+            for workers in (1, 2):
+                stats = RepoStats(workers=workers)
+                reports, _ = stats.collect(tmp)
+                rows = stats.file_rows(reports)
+                self.assertEqual([r['file'] for r in rows], ['m3.py', 'm2.py', 'm1.py', 'm0.py'])
+                self.assertEqual(rows[0]['max_complexity'], 4)
+                functions = stats.function_rows(reports, 'lines')
+                self.assertEqual((functions[0]['file'], functions[0]['lines']), ('m3.py', 8))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from waycode.rag.context_builder import ContextBuilder
+
+def result(docs, distances, metadatas=None):
+    # Shape a list of documents like a Chroma query result
+    return {
+        "documents": [docs],
+        "distances": [distances],
+        "metadatas": [metadatas or [None] * len(docs)]
+    }
+
+class StubMemory:
+    def __init__(self, relevant, definitions=()):
+        self.relevant = relevant
+        self.definitions = list(definitions)
+    
+    def get_relevant_context(self, code, language, n_results=3, filename=None):
+        return self.relevant
+    
+    def get_definitions(self, code, language, filename=None):
+        return self.definitions
+
+class TestContextBuilder(unittest.TestCase):
+    def _build(self, relevant, budget=1000, code="def target():\n    pass", definitions=()):
+        builder = ContextBuilder(StubMemory(relevant, definitions), token_budget=budget,
+                                 max_distance=0.5)
+        return builder.build_context(code, "python")
+    
+    def test_orders_filters_and_dedupes(self):
+        close = "def load_user(user_id):\n    return db.get(user_id)"
+        near_copy = "def load_user(user_id):\n    return db.get(user_id)  "
+        far = "def unrelated():\n    return 42"
+        relevant = {
+            "similar_code": result([far, near_copy, close], [0.9, 0.2, 0.1]),
+            "refactor_history": result([], []),
+            "style_patterns": result(["prefers_async_await"], [0.3]),
+            "project_patterns": ["prefers_async_await"]
+        }
+        context = self._build(relevant)
+        self.assertEqual(context.count("def load_user"), 1)
+        self.assertNotIn("unrelated", context)
+        self.assertIn("Your coding style preferences:", context)
+    
+    def test_budget_keeps_whole_units(self):
+        big = "def big():\n" + "    x = 1\n" * 200
+        small = "def small():\n    return 1"
+        relevant = {
+            "similar_code": result([big, small], [0.1, 0.2]),
+            "refactor_history": result([], []),
+            "style_patterns": result([], []),
+            "project_patterns": []
+        }
+        context = self._build(relevant, budget=100)
+        self.assertNotIn("def big", context)
+        self.assertIn("def small():\n    return 1", context)
+    
+    def test_refactor_hunks_are_labelled(self):
+        hunk = "@@ -1,2 +1 @@\n-    y = x + 1\n-    return y\n+    return x + 1"
+        metadata = {"filename": "calc.py", "symbol": "add_one", "hunk": 0,
+                    "changes": "Inlined the temporary.\nMore detail."}
+        relevant = {
+            "similar_code": result([], []),
+            "refactor_history": result([hunk], [0.2], [metadata]),
+            "style_patterns": result([], []),
+            "project_patterns": []
+        }
+        self.assertIn("Change (calc.py::add_one) - Inlined the temporary.:\n" + hunk,
+                      self._build(relevant))
+    
+    def test_skips_units_of_the_target_file(self):
+        code = "def target():\n    pass\n\ndef helper():\n    return 1"
+        relevant = {
+            "similar_code": result(["def helper():\n    return 1"], [0.0]),
+            "refactor_history": result([], []),
+            "style_patterns": result([], []),
+            "project_patterns": []
+        }
+        self.assertNotIn("helper", self._build(relevant, code=code))
+    
+    def test_definitions_come_first_within_the_budget(self):
+        definition = {"filename": "db.py", "symbol": "load_user", "kind": "function",
+                      "signature": "def load_user(user_id):", "doc": "Fetch a user row.",
+                      "start_line": 3, "end_line": 5}
+        huge = dict(definition, symbol="dump", signature="def dump():", doc="x " * 2000)
+        relevant = {
+            "similar_code": result(["def similar():\n    return 2"], [0.1]),
+            "refactor_history": result([], []),
+            "style_patterns": result([], []),
+            "project_patterns": []
+        }
+        context = self._build(relevant, definitions=[definition, huge])
+        self.assertIn("Definitions this code uses:\nDefinition (db.py::load_user, lines 3-5):\n"
+                      "def load_user(user_id):\n    Fetch a user row.", context)
+        self.assertLess(context.index("load_user"), context.index("def similar"))
+        self.assertNotIn("def dump", context)
+
+if __name__ == '__main__':
+    unittest.main()
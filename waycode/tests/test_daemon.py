@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from waycode.daemon import DaemonClient, DaemonError, DaemonServer, DaemonService, ReadWriteLock
+
+class FakeStore:
+    # Vector store stand-in answering every query with one hit
+    def search_similar_code(self, query, n_results=3, namespace=None, language=None, path_prefix=None):
+        return {'documents': [[f"def {query}(): pass"]], 'metadatas': [[{'filename': 'a.py'}]],
+                'distances': [[0.1]]}
+
+class FakeMemory:
+    vector_store = FakeStore()
+
+class FakeAgent:
+    # Agent stand-in recording the pipeline steps the service drives
+    def __init__(self):
+        self.memory = FakeMemory()
+        self.finalized = []
+    
+    def _should_split(self, code, language):
+        return False
+    
+    def _build_prompt(self, code, language, filename=None):
+        return f"{language}:{code}"
+    
+    def generate(self, prompt):
+        return f"Explained\n```\n{prompt.upper()}\n```"
+    
+    def _parse_refactored_code(self, response):
+        return {'code': response.split('\n')[2], 'explanation': 'Explained'}
+    
+    def _finalize(self, code, language, filename, refactored, cached=False, diff_mode=None):
+        self.finalized.append(filename)
+        return dict(refactored, diff='', cached=cached)
+
+class TestReadWriteLock(unittest.TestCase):
+    def test_readers_share_and_writer_excludes(self):
+        # Two readers overlap; a writer waits for both to leave
+        lock = ReadWriteLock()
+        events = []
+        
+        def reader(name):
+            with lock.reading():
+                events.append(f"{name}+")
+                time.sleep(0.05)
+                events.append(f"{name}-")
+        
+        def writer():
+            time.sleep(0.01)
+            with lock.writing():
+                events.append("w")
+        
+        threads = [threading.Thread(target=reader, args=(n,)) for n in "ab"]
+        threads.append(threading.Thread(target=writer))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(events[:2]), ["a+", "b+"])
+        self.assertEqual(events[-1], "w")
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.tmp.name, 'daemon.json')
+        self.agent = FakeAgent()
+        self.server = DaemonServer(DaemonService(self.agent), port=0)
+        self.server.write_state(self.state)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+    
+    def test_discover_and_requests(self):
+        # The CLI finds the daemon through the state file and forwards calls
+        client = DaemonClient.discover(self.state)
+        self.assertIsNotNone(client)
+        self.assertEqual(client.health()['pid'], os.getpid())
+        hits = client.search('parse', n_results=1)
+        self.assertEqual(hits[0]['document'], "def parse(): pass")
+        result = client.refactor('x = 1', 'python', 'a.py')
+        self.assertEqual(result['code'], 'PYTHON:X = 1')
+        self.assertEqual(self.agent.finalized, ['a.py'])
+    
+    def test_rejects_bad_token_and_arguments(self):
+        # Requests without the published token or with bad arguments fail
+        host, port = self.server.server_address[:2]
+        with self.assertRaises(DaemonError):
+            DaemonClient(host, port, 'wrong').health()
+        client = DaemonClient.discover(self.state)
+        with self.assertRaises(DaemonError):
+            client.search('x', collection='nope')
+    
+    def test_stale_state_is_ignored(self):
+        # A state file left by a daemon that is gone does not break the CLI
+        self.server.shutdown()
+        self.server.server_close()
+        self.assertIsNone(DaemonClient.discover(self.state))
+        self.assertIsNone(DaemonClient.discover(os.path.join(self.tmp.name, 'missing.json')))
+
+if __name__ == '__main__':
+    unittest.main()
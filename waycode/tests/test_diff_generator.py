@@ -0,0 +1,91 @@
+import difflib
+import random
+import time
+import unittest
+from waycode.utils.diff_generator import DiffGenerator, diff_opcodes
+
+ORIGINAL = "def f(x):\n    y = x + 1\n    return y\n\n\ndef g():\n    pass\n"
+REFACTORED = "def f(x):\n    return x + 1\n\n\ndef g():\n    pass\n"
+
+def apply(a, b, opcodes):
+    # Rebuild b from a and the opcodes, checking the equal runs
+    out = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+            out.extend(a[i1:i2])
+        else:
+            out.extend(b[j1:j2])
+    return out
+
+class TestDiffGenerator(unittest.TestCase):
+    def test_unified_matches_difflib(self):
+        # Headers and hunks are separate lines, in difflib's format
+        expected = '\n'.join(line.rstrip('\n') for line in difflib.unified_diff(
+            ORIGINAL.splitlines(True), REFACTORED.splitlines(True), 'original', 'refactored'))
+        self.assertEqual(DiffGenerator().generate_diff(ORIGINAL, REFACTORED), expected)
+        self.assertEqual(DiffGenerator().generate_diff(ORIGINAL, ORIGINAL), '')
+    
+    def test_hunks_carry_text_and_line_ranges(self):
+        a = ''.join(f"line {i}\n" for i in range(20))
+        b = a.replace("line 2\n", "line two\n").replace("line 15\n", "")
+        hunks = list(DiffGenerator(context=1).hunks(a, b))
+        self.assertEqual([(h['changed_start'], h['changed_end']) for h in hunks], [(2, 3), (15, 16)])
+        self.assertEqual(hunks[0]['text'], "@@ -2,3 +2,3 @@\n line 1\n-line 2\n+line two\n line 3")
+        self.assertEqual('\n'.join(h['text'] for h in hunks),
+                         '\n'.join(DiffGenerator(context=1).iter_diff(a, b))
+                         .split('\n', 2)[2])
+    
+    def test_opcodes_are_valid_for_repetitive_input(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            a = [rng.choice(['', '}', '{', 'x']) for _ in range(rng.randint(0, 40))]
+            b = [rng.choice(['', '}', '{', 'y']) for _ in range(rng.randint(0, 40))]
+            self.assertEqual(apply(a, b, diff_opcodes(a, b)), b)
+    
+    def test_missing_final_newline(self):
+        lines = DiffGenerator().generate_diff("a\nb\n", "a\nb").splitlines()
+        self.assertEqual(lines[-3:], ["-b", "+b", "\\ No newline at end of file"])
+    
+    def test_stat_and_side_by_side(self):
+        differ = DiffGenerator()
+        self.assertEqual(differ.stat(ORIGINAL, REFACTORED), {'insertions': 1, 'deletions': 2})
+        self.assertIn("1 insertions(+), 2 deletions(-)", differ.format_stat(differ.stat(ORIGINAL, REFACTORED)))
+        
+        rows = list(differ.iter_side_by_side("a\nb\nc\n", "a\nc\nd\n", width=5))[2:]
+        self.assertEqual(rows, ["a       a", "b     <", "c       c", "      > d"])
+    
+    def test_color(self):
+        lines = list(DiffGenerator(color=True).iter_diff("a\n", "b\n"))
+        self.assertEqual(lines[-1], "\033[32m+b\033[0m")
+        self.assertEqual(DiffGenerator().colorize("-a"), "\033[31m-a\033[0m")
+    
+    def test_large_generated_file(self):
+        # 10k lines dominated by braces and blank lines diff in well under a second
+        rng = random.Random(3)
+        a = [rng.choice(['', '}', '{', '    return x;']) if i % 7 else f"int f{i}() {{"
+             for i in range(10000)]
+        b = list(a)
+        for _ in range(200):
+            b[rng.randrange(len(b))] = rng.choice(['', '}', 'x = 1;'])
+        started = time.perf_counter()
+        diff = DiffGenerator().generate_diff('\n'.join(a), '\n'.join(b))
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertTrue(diff.startswith("--- original\n+++ refactored\n@@ "))
+    
+    def test_fully_rewritten_file(self):
+        # A reindent changes every non-blank line; two unrelated files share
+        # none. Both stay fast and come out as a coarse replace.
+        rng = random.Random(5)
+        a = [rng.choice(['', '    }', f'    x{i} = f({i % 50})']) for i in range(6000)]
+        b = ['  ' + line.strip() if line else line for line in a]
+        disjoint = ([f"a{i}" for i in range(5000)], [f"b{i}" for i in range(5000)])
+        for old, new in ((a, b), disjoint):
+            started = time.perf_counter()
+            opcodes = diff_opcodes(old, new)
+            self.assertLess(time.perf_counter() - started, 1.0)
+            self.assertEqual(apply(old, new, opcodes), new)
+        self.assertEqual(diff_opcodes(*disjoint), [('replace', 0, 5000, 0, 5000)])
+
+if __name__ == '__main__':
+    unittest.main()
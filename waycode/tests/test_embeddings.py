@@ -0,0 +1,48 @@
+import unittest
+from types import SimpleNamespace
+from waycode.rag.embedding_cache import EmbeddingCache
+from waycode.rag.embeddings import EmbeddingGenerator
+
+class CountingModels:
+    # Fake genai models API returning one small vector per input text
+    def __init__(self):
+        self.requests = []
+    
+    def embed_content(self, model, contents, config=None):
+        self.requests.append(list(contents))
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=[float(len(text)), 1.0]) for text in contents
+        ])
+
+class TestEmbeddingGenerator(unittest.TestCase):
+    def setUp(self):
+        self.models = CountingModels()
+        self.generator = EmbeddingGenerator(
+            client=SimpleNamespace(models=self.models),
+            cache=EmbeddingCache(':memory:', max_entries=3),
+            batch_size=2
+        )
+    
+    def test_batches_and_caches(self):
+        # Misses are embedded in batches; repeats never hit the API again
+        vectors = self.generator.embed_documents(['a', 'bb', 'ccc'])
+        self.assertEqual([v[0] for v in vectors], [1.0, 2.0, 3.0])
+        self.assertEqual(self.models.requests, [['a', 'bb'], ['ccc']])
+        
+        self.generator.embed_documents(['bb', 'a'])
+        self.assertEqual(len(self.models.requests), 2)
+        stats = self.generator.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 3))
+    
+    def test_lru_eviction(self):
+        # The least recently used entry is evicted once the cap is exceeded
+        self.generator.embed_documents(['a', 'bb', 'ccc'])
+        self.generator.embed_documents(['a'])
+        self.generator.embed_documents(['dddd'])
+        self.assertEqual(self.generator.stats()['entries'], 3)
+        
+        self.generator.embed_documents(['bb'])
+        self.assertEqual(self.models.requests[-1], ['bb'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from waycode.rag.history_store import HistoryStore
+
+class TestHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "history.jsonl")
+        self.legacy = os.path.join(self.tmp, "history.json")
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+    
+    def record(self, i, days_ago=0):
+        timestamp = (datetime.now() - timedelta(days=days_ago)).isoformat()
+        return {"filename": f"f{i}.py", "timestamp": timestamp, "changes_summary": str(i)}
+    
+    def test_append_and_page_newest_first(self):
+        # Pages come from the end of the log, including across read blocks
+        store = HistoryStore(self.path, self.legacy, compact_bytes=None)
+        for i in range(50):
+            store.append(self.record(i))
+        self.assertEqual([r["filename"] for r in store.page(0, 3)], ["f49.py", "f48.py", "f47.py"])
+        recent = [r["filename"] for r in store.iter_recent(block_size=64)]
+        self.assertEqual(recent, [f"f{i}.py" for i in reversed(range(50))])
+        self.assertEqual(len(list(store.iter_records())), 50)
+    
+    def test_compact_applies_retention(self):
+        # Old records and records beyond max_records are dropped
+        store = HistoryStore(self.path, self.legacy, max_records=3, max_age_days=30,
+                             compact_bytes=None)
+        store.append(self.record(0, days_ago=60))
+        for i in range(1, 6):
+            store.append(self.record(i))
+        self.assertEqual(store.compact(), 3)
+        self.assertEqual([r["filename"] for r in store.iter_records()], ["f3.py", "f4.py", "f5.py"])
+    
+    def test_migrates_legacy_json(self):
+        # A legacy JSON array is converted once and kept as a .migrated backup
+        with open(self.legacy, 'w') as f:
+            json.dump([self.record(0), self.record(1)], f)
+        store = HistoryStore(self.path, self.legacy, compact_bytes=None)
+        store.append(self.record(2))
+        self.assertEqual([r["filename"] for r in store.iter_records()], ["f0.py", "f1.py", "f2.py"])
+        self.assertFalse(os.path.exists(self.legacy))
+        self.assertTrue(os.path.exists(self.legacy + ".migrated"))
+    
+    def test_skips_torn_lines(self):
+        # A partially written trailing line does not break reads
+        store = HistoryStore(self.path, self.legacy, compact_bytes=None)
+        store.append(self.record(0))
+        with open(self.path, 'a') as f:
+            f.write('{"filename": "bro')
+        self.assertEqual(len(store.page()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
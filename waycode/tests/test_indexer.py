@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+from waycode.rag.indexer import ProjectIndexer
+from waycode.rag.manifest import IndexManifest
+
+class RecordingLexical:
+    # Stand-in for LexicalIndex tracking which files have units
+    def __init__(self, files=()):
+        self.files = set(files)
+    
+    def has_file(self, filepath, namespace=None):
+        return filepath in self.files
+    
+    def add_units(self, documents, metadatas):
+        self.files.update(m["filename"] for m in metadatas)
+
+class RecordingMemory:
+    # Minimal stand-in for MemoryManager that records calls
+    def __init__(self, lexical_files=(), project=None, symbol_files=None):
+        self.indexed = []
+        self.updated = []
+        self.removed = []
+        self.lexical = RecordingLexical(lexical_files)
+        self.symbols = RecordingLexical(lexical_files if symbol_files is None else symbol_files)
+        self.project = project
+    
+    def namespace_for(self, path=None, project=None):
+        return project or self.project or 'default'
+    
+    def prepare_file(self, filepath, code, language, namespace=None):
+        return {"namespace": namespace, "documents": [code], "patterns": [],
+                "metadatas": [{"filename": filepath, "namespace": namespace}],
+                "symbols": {"symbols": [{"symbol": "f"}]}}
+    
+    def add_code_units(self, documents, metadatas):
+        self.indexed.extend(m["filename"] for m in metadatas)
+        self.lexical.add_units(documents, metadatas)
+    
+    def record_symbols(self, filepath, prepared):
+        self.symbols.files.add(filepath)
+    
+    def record_patterns(self, patterns, language):
+        pass
+    
+    def persist(self):
+        pass
+    
+    def update_file(self, filepath, prepared):
+        self.updated.append(filepath)
+        return len(prepared["documents"])
+    
+    def remove_file(self, filepath, namespace=None):
+        self.removed.append(filepath)
+        self.removed_from = namespace
+
+class TestProjectIndexer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.manifest_path = os.path.join(self.root, 'state', 'manifest.json')
+        self.src = os.path.join(self.root, 'src')
+        os.makedirs(self.src)
+        for name in ('a.py', 'b.py'):
+            self._write(name, f"def {name[0]}():\n    return 1\n")
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def _write(self, name, text):
+        with open(os.path.join(self.src, name), 'w') as f:
+            f.write(text)
+    
+    def _run(self, lexical_files=None, project=None, symbol_files=None):
+        if lexical_files is None:
+            lexical_files = [os.path.join(self.src, name) for name in os.listdir(self.src)]
+        memory = RecordingMemory(lexical_files, symbol_files=symbol_files)
+        indexer = ProjectIndexer(memory, IndexManifest(self.manifest_path), project)
+        summary = indexer.index_path(self.src, recursive=True, workers=2, batch_size=1)
+        return memory, {k: summary[k] for k in ('added', 'updated', 'unchanged', 'deleted')}
+    
+    def test_second_run_skips_unchanged_files(self):
+        _, first = self._run()
+        self.assertEqual(first['added'], 2)
+        memory, second = self._run()
+        self.assertEqual(second, {'added': 0, 'updated': 0, 'unchanged': 2, 'deleted': 0})
+        self.assertEqual(memory.indexed, [])
+    
+    def test_unchanged_files_missing_from_lexical_index_are_backfilled(self):
+        self._run()
+        memory, second = self._run(lexical_files=[])
+        self.assertEqual(second['unchanged'], 2)
+        self.assertEqual(memory.indexed, [])
+        self.assertEqual(len(memory.lexical.files), 2)
+    
+    def test_unchanged_files_missing_from_symbol_index_are_backfilled(self):
+        self._run()
+        memory, second = self._run(symbol_files=[])
+        self.assertEqual(second['unchanged'], 2)
+        self.assertEqual(memory.indexed, [])
+        self.assertEqual(len(memory.symbols.files), 2)
+    
+    def test_modified_and_deleted_files_are_purged(self):
+        self._run()
+        self._write('a.py', "def a():\n    return 2\n")
+        os.remove(os.path.join(self.src, 'b.py'))
+        memory, summary = self._run()
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(summary['deleted'], 1)
+        self.assertEqual([os.path.basename(p) for p in memory.updated], ['a.py'])
+        self.assertEqual([os.path.basename(p) for p in memory.removed], ['b.py'])
+    
+    def test_index_files_only_touches_given_paths(self):
+        self._run()
+        a, b = (os.path.join(self.src, name) for name in ('a.py', 'b.py'))
+        self._write('a.py', "def a():\n    return 2\n")
+        self._write('c.py', "def c():\n    return 3\n")
+        os.remove(b)
+        memory = RecordingMemory([a])
+        indexer = ProjectIndexer(memory, IndexManifest(self.manifest_path))
+        summary = indexer.index_files([a, b])
+        self.assertEqual((summary['updated'], summary['added'], summary['deleted']), (1, 0, 1))
+        self.assertEqual(memory.updated, [a])
+        self.assertEqual(memory.removed, [b])
+        self.assertEqual(sorted(IndexManifest(self.manifest_path).entries), [a])
+
+    def test_files_indexed_under_a_new_namespace_are_moved(self):
+        self._run()
+        memory, summary = self._run(project='alpha')
+        self.assertEqual(summary['updated'], 2)
+        self.assertEqual(len(memory.removed), 2)
+        self.assertEqual(memory.removed_from, 'default')
+        manifest = IndexManifest(self.manifest_path)
+        self.assertEqual(manifest.namespaces(), {'alpha': 2})
+        _, third = self._run(project='alpha')
+        self.assertEqual(third['unchanged'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from waycode.rag.lexical_index import LexicalIndex, identifier_terms, reciprocal_rank_fusion
+from waycode.rag.memory_manager import MemoryManager
+
+PARSER = "class ResponseParser:\n    def parse_blocks(self, text):\n        return text.split('```')\n"
+CACHE = "class ResponseCache:\n    def get(self, key):\n        return self.entries.get(key)\n"
+QUERY = "from parser import ResponseParser\n\nblocks = ResponseParser().parse_blocks(reply)\n"
+
+def meta(filename, symbol):
+    return {"filename": filename, "language": "python", "symbol": symbol}
+
+class NoVectorStore:
+    # Fails the test if retrieval touches embeddings or Chroma
+    def __getattr__(self, name):
+        raise AssertionError(f"vector store used: {name}")
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.index = LexicalIndex(os.path.join(self.tmp, "lexical.sqlite"))
+        self.index.add_units([PARSER, CACHE], [meta("parser.py", "ResponseParser"),
+                                               meta("cache.py", "ResponseCache")])
+    
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp)
+    
+    def test_identifier_terms_split_camel_and_snake_case(self):
+        terms = identifier_terms("def parse_blocks(self, HTTPResponse): return None")
+        self.assertEqual(terms, ["parse_blocks", "parse", "blocks", "httpresponse", "http", "response"])
+    
+    def test_search_ranks_defining_unit_first(self):
+        hits = self.index.search(QUERY, n_results=2, language="python")
+        self.assertEqual(hits[0]["metadata"]["symbol"], "ResponseParser")
+        self.assertTrue(hits[0]["symbol_match"])
+        self.assertFalse(any(h["symbol_match"] for h in hits[1:]))
+        self.assertEqual(self.index.search(QUERY, language="javascript"), [])
+    
+    def test_add_is_idempotent_and_delete_drops_file(self):
+        self.index.add_units([PARSER], [meta("parser.py", "ResponseParser")])
+        self.assertEqual(self.index.count(), 2)
+        self.index.delete_file("parser.py")
+        self.assertFalse(self.index.has_file("parser.py"))
+        self.assertTrue(self.index.has_file("cache.py"))
+        self.assertEqual([h["metadata"]["filename"] for h in self.index.search(QUERY)], ["cache.py"])
+    
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([["a", "b"], ["c", "b"]], k=1)
+        self.assertEqual([key for key, _ in fused], ["b", "a", "c"])
+    
+    def test_lexical_mode_makes_no_vector_calls(self):
+        memory = MemoryManager("lexical", project="default")
+        memory.lexical = self.index
+        memory._vector_store = NoVectorStore()
+        context = memory.get_relevant_context(QUERY, "python", n_results=1)
+        self.assertEqual(context["similar_code"]["documents"], [[PARSER]])
+        self.assertEqual(context["similar_code"]["distances"], [[None]])
+        self.assertIsNone(context["refactor_history"])
+    
+    def test_fuse_merges_vector_and_lexical_rankings(self):
+        memory = MemoryManager("hybrid")
+        vector = {"documents": [[CACHE, PARSER]],
+                  "metadatas": [[meta("cache.py", "ResponseCache"), meta("parser.py", "ResponseParser")]],
+                  "distances": [[0.2, 0.3]]}
+        hits = self.index.search(QUERY, n_results=1)
+        fused = memory._fuse(vector, hits, 2)
+        self.assertEqual(fused["documents"], [[PARSER, CACHE]])
+        self.assertEqual(fused["distances"], [[0.3, 0.2]])
+    
+    def test_unknown_retrieval_mode_is_rejected(self):
+        with self.assertRaises(ValueError):
+            MemoryManager("fuzzy")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from waycode.rag.lexical_index import LexicalIndex
+from waycode.rag.manifest import IndexManifest
+from waycode.rag.namespaces import (
+    DEFAULT_NAMESPACE, collection_name, git_root, resolve_namespace, split_collection_name
+)
+
+CODE = "def load_config(path):\n    return open(path).read()\n"
+
+class TestNamespaces(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.repo = os.path.join(self.tmp, 'My Repo')
+        os.makedirs(os.path.join(self.repo, '.git'))
+        os.makedirs(os.path.join(self.repo, 'src'))
+        git_root.cache_clear()
+    
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+    
+    def test_files_resolve_to_their_repository(self):
+        namespace = resolve_namespace(os.path.join(self.repo, 'src', 'a.py'))
+        self.assertRegex(namespace, r'^my-repo-[0-9a-f]{8}$')
+        self.assertEqual(resolve_namespace(self.repo), namespace)
+        self.assertEqual(resolve_namespace(os.path.join(self.repo, 'src', 'a.py'), 'Web App'),
+                         'web-app')
+        with self.assertRaises(ValueError):
+            resolve_namespace(self.repo, '///')
+    
+    def test_default_namespace_keeps_legacy_collection_names(self):
+        self.assertEqual(collection_name('code_patterns'), 'code_patterns')
+        self.assertEqual(collection_name('style_preferences', 'web-app'), 'style_preferences')
+        name = collection_name('code_patterns', 'web-app')
+        self.assertEqual(name, 'code_patterns__web-app')
+        self.assertEqual(split_collection_name(name), ('code_patterns', 'web-app'))
+        self.assertEqual(split_collection_name('code_patterns'), ('code_patterns', DEFAULT_NAMESPACE))
+    
+    def test_lexical_index_filters_and_drops_by_namespace(self):
+        index = LexicalIndex(os.path.join(self.tmp, 'lexical.sqlite'))
+        self.addCleanup(index.close)
+        for namespace in ('alpha', 'beta'):
+            index.add_units([CODE], [{'filename': '/src/config.py', 'symbol': 'load_config',
+                                      'language': 'python', 'namespace': namespace}])
+        self.assertEqual(index.count(), 2)
+        hits = index.search("load_config('x')", namespace='alpha')
+        self.assertEqual([h['metadata']['namespace'] for h in hits], ['alpha'])
+        self.assertEqual(len(index.search("load_config('x')", path_prefix='/src/')), 2)
+        self.assertEqual(index.search("load_config('x')", path_prefix='/lib/'), [])
+        self.assertEqual(len(index.search("load_config('x')", path_prefix='/src')), 2)
+        self.assertEqual(index.search("load_config('x')", path_prefix='/sr'), [])
+        self.assertEqual(len(index.search("load_config('x')", path_prefix='/src/config.py')), 2)
+        
+        index.drop_namespace('alpha')
+        self.assertFalse(index.has_file('/src/config.py', 'alpha'))
+        self.assertTrue(index.has_file('/src/config.py', 'beta'))
+    
+    def test_manifest_keeps_namespace_of_touched_files(self):
+        path = os.path.join(self.repo, 'src', 'a.py')
+        with open(path, 'w') as f:
+            f.write(CODE)
+        manifest = IndexManifest(os.path.join(self.tmp, 'manifest.json'))
+        _, _, record = manifest.check(path)
+        manifest.update(path, dict(record, namespace='alpha'))
+        os.utime(path, (1, 1))
+        self.assertEqual(manifest.check(path)[0], 'unchanged')
+        self.assertEqual(manifest.namespace_of(path), 'alpha')
+        self.assertEqual(manifest.remove_namespace('alpha'), 1)
+        self.assertEqual(manifest.namespaces(), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from waycode.utils import profiler
+from waycode.utils.profiler import Profiler, span
+
+class TestProfiler(unittest.TestCase):
+    def tearDown(self):
+        profiler.deactivate()
+    
+    def test_disabled_spans_are_no_ops(self):
+        # Without an active profiler span() records nothing
+        with span("stage") as stage:
+            stage["tokens_in"] = 5
+        recorder = Profiler()
+        self.assertEqual(recorder.spans, [])
+    
+    def test_nesting_counters_and_worker_threads(self):
+        # Spans nest per thread; worker spans attach to the open parent
+        recorder = profiler.activate(Profiler())
+        with span("refactor"):
+            with span("generate") as stage:
+                stage.update(tokens_in=10, tokens_out=4)
+            with span("retrieval"):
+                t = threading.Thread(target=self._query)
+                t.start()
+                t.join()
+        
+        by_name = {r["name"]: r for r in recorder.spans}
+        self.assertEqual(by_name["generate"]["parent"], "refactor")
+        self.assertEqual(by_name["chroma.query"]["parent"], "retrieval")
+        self.assertEqual(by_name["chroma.query"]["depth"], 2)
+        rows = {row["name"]: row for row in recorder.summary()}
+        self.assertEqual((rows["generate"]["tokens_in"], rows["generate"]["tokens_out"]), (10, 4))
+        self.assertIn("generate", recorder.format_table())
+    
+    def _query(self):
+        with span("chroma.query") as stage:
+            stage["bytes_written"] = 3
+    
+    def test_trace_file_is_json_lines(self):
+        # Every span becomes one JSON line tagged with the run id
+        recorder = profiler.activate(Profiler())
+        with span("a"):
+            with span("b"):
+                pass
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.jsonl")
+            recorder.write_trace(path, command="refactor")
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual([l["name"] for l in lines], ["a", "b"])
+        self.assertTrue(all(l["run_id"] == recorder.run_id and l["command"] == "refactor"
+                            for l in lines))
+
+if __name__ == '__main__':
+    unittest.main()
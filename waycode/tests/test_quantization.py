@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+import zlib
+from types import SimpleNamespace
+import numpy as np
+from waycode.rag.embedding_cache import EmbeddingCache
+from waycode.rag.embeddings import EmbeddingGenerator
+from waycode.rag.flat_index import FlatBackend
+from waycode.rag.quantization import dequantize, normalize, quantize, recall_report, truncate
+from waycode.rag.vector_store import VectorStore
+
+class RandomModels:
+    # Fake genai models API returning a 16-dimensional vector seeded by the text
+    def embed_content(self, model, contents, config=None):
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=np.random.default_rng(zlib.crc32(t.encode())).normal(size=16).tolist())
+            for t in contents
+        ])
+
+class TestQuantization(unittest.TestCase):
+    def setUp(self):
+        self.vectors = normalize(np.random.default_rng(1).normal(size=(500, 64)))
+    
+    def test_int8_round_trip_keeps_cosine(self):
+        codes, scales = quantize(self.vectors, 'int8')
+        self.assertEqual(codes.dtype, np.int8)
+        decoded = dequantize(codes, scales)
+        cosine = np.sum(normalize(decoded) * self.vectors, axis=1)
+        self.assertGreater(cosine.min(), 0.999)
+    
+    def test_truncate_renormalizes_leading_components(self):
+        reduced = truncate(self.vectors, 8)
+        self.assertEqual(reduced.shape, (500, 8))
+        np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, rtol=1e-5)
+        np.testing.assert_allclose(reduced, normalize(self.vectors[:, :8]), rtol=1e-5)
+    
+    def test_recall_report(self):
+        report = recall_report(self.vectors, 'int8', k=5, samples=50)
+        self.assertGreater(report['recall'], 0.9)
+        self.assertGreaterEqual(report['recall_rescored'], report['recall'])
+        self.assertEqual(report['bytes_full'] / report['bytes_quantized'], 256 / 68)
+        truncated = recall_report(self.vectors, 'float16', dim=16, k=5, samples=50)
+        self.assertLess(truncated['recall'], report['recall'])
+        self.assertGreater(truncated['recall_rescored'], truncated['recall'])
+
+class TestQuantizedFlatIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.embedder = EmbeddingGenerator(client=SimpleNamespace(models=RandomModels()),
+                                           cache=EmbeddingCache(':memory:'))
+        self.docs = [f"def f{i}(): return {i}" for i in range(200)]
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def store(self, dtype, dim=None, rescore_factor=4):
+        backend = FlatBackend(self.embedder, path=os.path.join(self.tmp.name, 'flat'), dtype=dtype,
+                              dim=dim, rescore_factor=rescore_factor)
+        self.addCleanup(backend.close)
+        return VectorStore(self.embedder, backend=backend)
+    
+    def search(self, store, query):
+        return store.code_collection.query(query_embeddings=[query], n_results=5)
+    
+    def test_rescoring_restores_full_precision_order(self):
+        # A pool covering every row makes re-scored results exact
+        exact = self.store('float32', rescore_factor=40)
+        exact.add_code_patterns(self.docs, [{'filename': 'a.py', 'symbol': str(i)} for i in range(200)])
+        query = self.embedder.generate_query_embedding("def f7(): return 7")
+        expected = self.search(exact, query)
+        
+        compact = exact.code_collection
+        compact.reencode('int8', dim=4)
+        layout = compact.layout()
+        self.assertEqual((layout['dtype'], layout['dim'], layout['source_dim']), ('int8', 4, 16))
+        result = self.search(exact, query)
+        self.assertEqual(result['ids'], expected['ids'])
+        np.testing.assert_allclose(result['distances'], expected['distances'], atol=1e-5)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp.name, 'flat')))[:2],
+                         ['code_patterns.2.npy', 'code_patterns.2.scales.npy'])
+    
+    def test_new_collections_use_configured_layout(self):
+        store = self.store('int8', dim=8)
+        store.add_code_patterns(self.docs[:10], [{'filename': 'a.py', 'symbol': str(i)} for i in range(10)])
+        layout = store.code_collection.layout()
+        self.assertEqual((layout['dtype'], layout['dim'], layout['count']), ('int8', 8, 10))
+        report = store.recall_report('int8', dim=8, k=3, samples=10)
+        self.assertEqual(report['vectors'], 10)
+        self.assertEqual(report['full_dim'], 16)
+    
+    def test_recall_report_per_namespace(self):
+        store = self.store('float32')
+        store.add_code_patterns(self.docs[:10], [{'filename': 'a.py', 'symbol': str(i)} for i in range(10)])
+        store.add_code_patterns(self.docs[10:40], [{'filename': 'b.py', 'symbol': str(i)}
+                                                   for i in range(30)], namespace='alpha')
+        converted = {entry['collection']: entry for entry in store.quantize('int8', dim=8)}
+        self.assertEqual(converted['code_patterns__alpha']['count'], 30)
+        self.assertEqual(store.recall_report('int8', dim=8, k=3, samples=10)['vectors'], 10)
+        self.assertEqual(store.recall_report('int8', dim=8, k=3, samples=10,
+                                             namespace='alpha')['vectors'], 30)
+
+if __name__ == '__main__':
+    unittest.main()
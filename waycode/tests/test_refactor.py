@@ -1,18 +1,18 @@
-import unittest
-from waycode.refactor_agent import RefactorAgent
-
-class TestRefactorAgent(unittest.TestCase):
-    def setUp(self):
-        # Initialize the agent before each test case
-        self.agent = RefactorAgent()
-    
-    def test_agent_initialization(self):
-        # Ensure agent and its memory manager are correctly instantiated
-        self.assertIsNotNone(self.agent)
-        self.assertIsNotNone(self.agent.memory)
-    
-    # Placeholder for additional functional tests
-
-if __name__ == '__main__':
-    # Execute the test suite
-    unittest.main()
+import unittest
+from waycode.refactor_agent import RefactorAgent
+
+class TestRefactorAgent(unittest.TestCase):
+    def setUp(self):
+        # Initialize the agent before each test case
+        self.agent = RefactorAgent()
+    
+    def test_agent_initialization(self):
+        # Ensure agent and its memory manager are correctly instantiated
+        self.assertIsNotNone(self.agent)
+        self.assertIsNotNone(self.agent.memory)
+    
+    # Placeholder for additional functional tests
+
+if __name__ == '__main__':
+    # Execute the test suite
+    unittest.main()
@@ -0,0 +1,37 @@
+import time
+import unittest
+from waycode.utils.response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+    def test_round_trip_and_counters(self):
+        # Stored responses are returned verbatim and hits/misses are counted
+        cache = ResponseCache(':memory:', ttl=60, max_bytes=1024)
+        key = ResponseCache.make_key("prompt", "model", 0.3)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "```python\nx = 1\n```")
+        self.assertEqual(cache.get(key), "```python\nx = 1\n```")
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+    
+    def test_key_depends_on_model_and_temperature(self):
+        # Changing any part of the request changes the key
+        base = ResponseCache.make_key("prompt", "model", 0.3)
+        self.assertNotEqual(base, ResponseCache.make_key("prompt", "other", 0.3))
+        self.assertNotEqual(base, ResponseCache.make_key("prompt", "model", 0.4))
+    
+    def test_ttl_and_size_eviction(self):
+        # Expired entries are ignored and the size cap evicts the oldest entry
+        cache = ResponseCache(':memory:', ttl=0.05, max_bytes=1024)
+        cache.put("old", "x")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("old"))
+        
+        cache = ResponseCache(':memory:', ttl=None, max_bytes=10)
+        cache.put("a", "12345")
+        cache.put("b", "12345")
+        cache.put("c", "12345")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), "12345")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from waycode.utils.response_parser import ResponseParser
+
+RESPONSE = "Renamed variables.\n```python\ndef total(items):\n    return sum(items)\n```\nDone."
+
+class TestResponseParser(unittest.TestCase):
+    def test_parse_complete_response(self):
+        parsed = ResponseParser.parse(RESPONSE)
+        self.assertEqual(parsed['code'], "def total(items):\n    return sum(items)")
+        self.assertEqual(parsed['explanation'], "Renamed variables.\nDone.")
+    
+    def test_chunked_feed_matches_complete_parse(self):
+        # Arbitrary chunk boundaries, including mid-fence, give the same result
+        for size in (1, 3, 7, 64):
+            parser = ResponseParser()
+            events = []
+            for i in range(0, len(RESPONSE), size):
+                events.extend(parser.feed(RESPONSE[i:i + size]))
+            events.extend(parser.close())
+            self.assertEqual(parser.result(), ResponseParser.parse(RESPONSE))
+            self.assertEqual([line for kind, line in events if kind == 'code'],
+                             ["def total(items):", "    return sum(items)"])
+    
+    def test_no_code_block(self):
+        self.assertIsNone(ResponseParser.parse("I cannot help with that."))
+    
+    def test_truncated_response_is_incomplete(self):
+        # A response cut off inside the code block is flagged as incomplete
+        self.assertTrue(ResponseParser.parse(RESPONSE)['complete'])
+        self.assertFalse(ResponseParser.parse(RESPONSE[:RESPONSE.index("    return")])['complete'])
+    
+    def test_render_round_trip(self):
+        parser = ResponseParser()
+        parser.feed(RESPONSE)
+        parser.close()
+        self.assertEqual(ResponseParser.parse(parser.render('python')), parser.result())
+
+if __name__ == '__main__':
+    unittest.main()
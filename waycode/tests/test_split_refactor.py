@@ -0,0 +1,93 @@
+import asyncio
+import time
+import unittest
+from waycode.split_refactor import SplitRefactorer
+from waycode.utils.response_parser import ResponseParser
+
+SOURCE = '''import os
+
+LIMIT = 3
+
+
+# Adds one
+def inc(x):
+    return x + 1
+
+
+def dec(x):
+    return x - 1
+
+
+class Counter:
+    def __init__(self):
+        self.n = 0
+
+    def bump(self):
+        self.n = inc(self.n)
+
+
+def broken(x):
+    return x
+'''
+
+class EchoAgent:
+    # Fake agent: "refactors" a part by adding an import and a comment,
+    # returning invalid code for the part that defines broken()
+    use_memory = False
+    
+    def __init__(self, delay=0.05):
+        self.delay = delay
+    
+    def _cached_response(self, prompt):
+        return None, None
+    
+    def _store_response(self, key, response):
+        pass
+    
+    def _parse_refactored_code(self, response):
+        return ResponseParser.parse(response)
+    
+    async def _agenerate_with_retry(self, prompt):
+        await asyncio.sleep(self.delay)
+        code = prompt.split("Part to refactor:\n```python\n", 1)[1].split("\n```", 1)[0]
+        if 'def broken' in code:
+            code = "def broken(x)\n    return x"
+        return f"Tidied.\n```python\nimport re\n# refactored\n{code}\n```"
+
+class TestSplitRefactorer(unittest.TestCase):
+    def test_split_at_top_level_definitions(self):
+        # Segments are contiguous, keep leading comments and group small defs
+        splitter = SplitRefactorer(EchoAgent(), max_tokens=1)
+        preamble, segments = splitter.split(SOURCE, 'python')
+        self.assertEqual(preamble, "import os\n\nLIMIT = 3\n\n\n")
+        self.assertEqual([s['symbols'] for s in segments], [['inc'], ['dec'], ['Counter'], ['broken']])
+        self.assertTrue(segments[0]['text'].startswith("# Adds one\ndef inc"))
+        self.assertEqual(preamble + ''.join(s['text'] for s in segments), SOURCE)
+        
+        grouped = SplitRefactorer(EchoAgent(), max_tokens=10000).split(SOURCE, 'python')[1]
+        self.assertEqual(len(grouped), 1)
+    
+    def test_concurrent_refactor_and_stitch(self):
+        # Parts run concurrently, are stitched in order with hoisted imports,
+        # and an unparseable part is kept as it was
+        splitter = SplitRefactorer(EchoAgent(delay=0.2), max_tokens=1)
+        started = time.perf_counter()
+        result = splitter.refactor(SOURCE, 'python', 'mod.py')
+        self.assertLess(time.perf_counter() - started, 0.6)
+        
+        code = result['code']
+        self.assertEqual(code.count("import re"), 1)
+        self.assertTrue(code.startswith("import os\n\nLIMIT = 3\nimport re\n"))
+        self.assertLess(code.index("def inc"), code.index("def dec"))
+        self.assertLess(code.index("class Counter"), code.index("def broken(x):"))
+        self.assertEqual(result['failed_segments'], [4])
+        self.assertEqual(code.count("# refactored"), 3)
+        compile(code, 'mod.py', 'exec')
+    
+    def test_validate_javascript_brackets(self):
+        splitter = SplitRefactorer(EchoAgent())
+        self.assertTrue(splitter.validate("const s = '}';\nfunction f() { return [1, 2]; }", 'javascript'))
+        self.assertFalse(splitter.validate("function f() { return [1, 2; }", 'javascript'))
+
+if __name__ == '__main__':
+    unittest.main()
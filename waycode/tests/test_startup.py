@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# Runs the CLI in a fresh interpreter and reports which heavy modules got
+# imported; the last stderr line is a comma-separated list
+PROBE = """
+import sys
+from waycode.cli import main
+sys.argv = ['waycode'] + sys.argv[1:]
+try:
+    main()
+except SystemExit:
+    pass
+heavy = [m for m in ('chromadb', 'google.genai', 'waycode.refactor_agent') if m in sys.modules]
+sys.stderr.write(','.join(heavy))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestStartup(unittest.TestCase):
+    def run_cli(self, *args):
+        home = tempfile.mkdtemp()
+        env = dict(os.environ, HOME=home, PYTHONPATH=ROOT)
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, *args],
+            cwd=home, env=env, capture_output=True, text=True, timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result, home
+    
+    def test_help_and_version_skip_heavy_imports(self):
+        # --help and --version must not import the model or vector store stack
+        for args in (('--help',), ('--version',), ('refactor', '--help')):
+            result, home = self.run_cli(*args)
+            self.assertEqual(result.stderr.strip().splitlines()[-1:] or [''], [''], args)
+            self.assertFalse(os.path.exists(os.path.join(home, '.waycode')))
+    
+    def test_package_import_is_lazy(self):
+        # Importing waycode does not construct or import the agent
+        code = "import sys, waycode; print('waycode.refactor_agent' in sys.modules, waycode.GEMINI_MODEL)"
+        result = subprocess.run(
+            [sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=ROOT),
+            capture_output=True, text=True, timeout=60
+        )
+        self.assertTrue(result.stdout.startswith('False '), result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
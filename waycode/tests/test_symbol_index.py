@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+from waycode.rag.symbol_index import SymbolIndex, extract_symbols
+
+MODELS = '''# Storage rows
+LIMIT = 10
+
+class User(Base):
+    # A stored user account
+
+    def save(self, force=False) -> bool:
+        """Write the user to the database."""
+        return True
+
+    def delete(self):
+        return False
+
+def load_user(user_id, *, cache=None):
+    # Fetch one user by id
+    return User()
+'''
+
+SERVICE = '''from .models import User, load_user
+from . import models
+from .missing import nothing
+
+def handle(user_id) -> User:
+    user = load_user(user_id)
+    user.save()
+    return models.LIMIT
+'''
+
+API = '''import { load as fetchUser } from "./users";
+const helpers = require('./helpers');
+
+export function show(id) {
+  return helpers.render(fetchUser(id));
+}
+'''
+
+USERS = '''/**
+ * Load a user record.
+ */
+export async function load(id) {
+  return db.get(id);
+}
+'''
+
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.pkg = os.path.join(self.tmp, 'app')
+        os.makedirs(self.pkg)
+        self.files = {}
+        for name, text in (('__init__.py', 'from .models import User\n'), ('models.py', MODELS),
+                           ('service.py', SERVICE), ('users.js', USERS),
+                           ('helpers.js', 'export function render(x) {\n  return x;\n}\n')):
+            self.files[name] = os.path.join(self.pkg, name)
+            with open(self.files[name], 'w') as f:
+                f.write(text)
+        self.index = SymbolIndex(os.path.join(self.tmp, 'symbols.sqlite'))
+        for name, path in self.files.items():
+            language = 'javascript' if name.endswith('.js') else 'python'
+            self.index.replace_file(path, extract_symbols(open(path).read(), language, path))
+    
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp)
+    
+    def test_python_extraction(self):
+        extracted = extract_symbols(MODELS, 'python', self.files['models.py'])
+        self.assertEqual(extracted['module'], 'app.models')
+        symbols = {s['symbol']: s for s in extracted['symbols']}
+        self.assertEqual(list(symbols), ['LIMIT', 'User', 'User.save', 'User.delete', 'load_user'])
+        self.assertEqual(symbols['LIMIT']['doc'], 'Storage rows')
+        self.assertEqual(symbols['User']['doc'], 'A stored user account')
+        self.assertEqual(symbols['User.save']['signature'], 'def save(self, force=False) -> bool:')
+        self.assertEqual(symbols['User.save']['doc'], 'Write the user to the database.')
+        self.assertEqual(symbols['load_user']['signature'], 'def load_user(user_id, *, cache=None):')
+        
+        imports = extract_symbols(SERVICE, 'python', self.files['service.py'])['imports']
+        self.assertIn({'module': 'app.models', 'name': 'User', 'alias': 'User'}, imports)
+        self.assertIn({'module': 'app', 'name': 'models', 'alias': 'models'}, imports)
+    
+    def test_js_imports(self):
+        code = ("import a, { b as c } from './x';\nimport * as ns from '../lib/index.js';\n"
+                "const { d, e: f } = require('./y');\nexport * from './z';\nimport 'side';\n")
+        imports = extract_symbols(code, 'javascript', '/r/src/app.js')['imports']
+        self.assertEqual(imports, [
+            {'module': '/r/src/x', 'name': 'default', 'alias': 'a'},
+            {'module': '/r/src/x', 'name': 'b', 'alias': 'c'},
+            {'module': '/r/lib', 'name': None, 'alias': 'ns'},
+            {'module': '/r/src/y', 'name': 'd', 'alias': 'd'},
+            {'module': '/r/src/y', 'name': 'e', 'alias': 'f'},
+            {'module': '/r/src/z', 'name': '*', 'alias': '*'},
+        ])
+    
+    def test_definitions_of_used_imports(self):
+        found = self.index.definitions(SERVICE, 'python', self.files['service.py'])
+        self.assertEqual([d['symbol'] for d in found], ['User', 'User.save', 'load_user', 'LIMIT'])
+        self.assertEqual(found[2]['doc'], 'Fetch one user by id')
+        self.assertEqual(found[2]['filename'], self.files['models.py'])
+    
+    def test_fragment_resolves_through_the_files_imports(self):
+        fragment = "def other(user_id):\n    return load_user(user_id)\n"
+        found = self.index.definitions(fragment, 'python', self.files['service.py'])
+        self.assertEqual([d['symbol'] for d in found], ['load_user'])
+        self.assertEqual(self.index.definitions(fragment, 'python'), [])
+    
+    def test_reexports_are_followed(self):
+        code = "from app import User\n\nUser().delete()\n"
+        found = self.index.definitions(code, 'python', os.path.join(self.tmp, 'main.py'))
+        self.assertEqual([d['symbol'] for d in found], ['User', 'User.delete'])
+    
+    def test_js_definitions(self):
+        found = self.index.definitions(API, 'javascript', os.path.join(self.pkg, 'api.js'))
+        self.assertEqual([d['symbol'] for d in found], ['load', 'render'])
+        self.assertEqual(found[0]['signature'], 'export async function load(id)')
+        self.assertEqual(found[0]['doc'], 'Load a user record.')
+    
+    def test_delete_and_namespaces(self):
+        path = self.files['models.py']
+        self.index.replace_file(path, extract_symbols(MODELS, 'python', path), 'other')
+        self.assertEqual(self.index.count('other'), 5)
+        service = self.files['service.py']
+        self.assertEqual(len(self.index.definitions(SERVICE, 'python', service, 'other')), 4)
+        self.assertEqual(self.index.definitions(SERVICE, 'python', service, 'empty'), [])
+        self.index.delete_file(path)
+        self.assertFalse(self.index.has_file(path))
+        self.assertTrue(self.index.has_file(path, 'other'))
+        self.index.drop_namespace('other')
+        self.assertEqual(self.index.count('other'), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import zlib
+from types import SimpleNamespace
+from unittest import mock
+import chromadb
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+from waycode.rag.blob_store import BlobStore
+from waycode.rag.chroma_backend import ChromaBackend
+from waycode.rag.embedding_cache import EmbeddingCache
+from waycode.rag.embeddings import EmbeddingGenerator
+from waycode.rag.flat_index import FlatBackend
+from waycode.rag.vector_store import VectorStore, stable_id
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class HashingModels:
+    # Fake genai models API returning a deterministic vector per text
+    def embed_content(self, model, contents, config=None):
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=[float(zlib.crc32(t.encode()) % 97), float(len(t)), 1.0])
+            for t in contents
+        ])
+
+class VectorStoreIdCases:
+    # Behaviour every backend must share; subclasses pick the backend
+    def make_backend(self, embedder):
+        raise NotImplementedError
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        embedder = EmbeddingGenerator(client=SimpleNamespace(models=HashingModels()),
+                                      cache=EmbeddingCache(':memory:'))
+        self.store = VectorStore(embedder, backend=self.make_backend(embedder),
+                                 blobs=BlobStore(':memory:'))
+        self.source = os.path.join(self.tmp.name, 'a.py')
+        with open(self.source, 'w') as f:
+            f.write('def a(): pass\n')
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_reindexing_upserts(self):
+        # The same unit indexed twice keeps a single entry under a stable ID
+        metadata = {'filename': self.source, 'symbol': 'a'}
+        for _ in range(2):
+            self.store.add_code_patterns(['def a(): pass'], [metadata])
+            self.store.add_refactoring('x=1', 'x = 1', {'filename': self.source, 'timestamp': 't'})
+        self.assertEqual(self.store.counts(), {
+            'code_patterns': 1, 'refactor_history': 1, 'style_preferences': 0
+        })
+        ids = self.store.code_collection.get()['ids']
+        self.assertEqual(ids, [stable_id('code', self.source, 'a', 'def a(): pass')])
+    
+    def test_gc_removes_duplicates_and_orphans(self):
+        # Legacy hash() IDs are merged onto stable IDs; deleted files are purged
+        collection = self.store.code_collection
+        live = {'filename': self.source, 'symbol': 'a'}
+        gone = {'filename': os.path.join(self.tmp.name, 'gone.py'), 'symbol': 'b'}
+        collection.add(
+            ids=['code_legacy_1', 'code_legacy_2', 'code_legacy_3'],
+            documents=['def a(): pass', 'def a(): pass', 'def b(): pass'],
+            metadatas=[live, live, gone]
+        )
+        
+        report = self.store.gc(dry_run=True)
+        self.assertEqual(report['removed']['code_patterns'], 2)
+        self.assertEqual(collection.count(), 3)
+        
+        report = self.store.gc()
+        self.assertEqual(report['before']['code_patterns'], 3)
+        self.assertEqual(report['after']['code_patterns'], 1)
+        self.assertEqual(collection.get()['ids'], [stable_id('code', self.source, 'a', 'def a(): pass')])
+        self.assertEqual(self.store.gc()['removed']['code_patterns'], 0)
+    
+    def test_refactorings_are_stored_as_hunks(self):
+        # One entry per hunk, labelled with its symbol; the full text is in
+        # the blob store and a second refactoring of the same code replaces it
+        original = "def a():\n    x = 1\n    return x\n" + "\n" * 8 + "def b():\n    return  2\n"
+        refactored = original.replace("    x = 1\n    return x", "    return 1").replace("  2", " 2")
+        units = [{'symbol': 'a', 'start_line': 1, 'end_line': 3},
+                 {'symbol': 'b', 'start_line': 12, 'end_line': 13}]
+        metadata = {'filename': self.source, 'timestamp': 't', 'changes': 'Simplified.'}
+        blob = self.store.add_refactoring(original, refactored, metadata, units=units)
+        
+        stored = self.store.refactor_collection.get()
+        self.assertEqual(sorted(m['symbol'] for m in stored['metadatas']), ['a', 'b'])
+        self.assertTrue(all(d.startswith('@@') and 'Original' not in d for d in stored['documents']))
+        self.assertEqual(self.store.get_refactoring(blob),
+                         {'original': original, 'refactored': refactored, 'explanation': 'Simplified.'})
+        self.assertEqual(self.store.refactoring_blobs(), {blob})
+        
+        self.store.add_refactoring(original, original.replace("  2", " 3"), metadata, units=units)
+        self.assertEqual([m['symbol'] for m in self.store.refactor_collection.get()['metadatas']], ['b'])
+    
+    def test_gc_splits_full_text_refactorings(self):
+        self.store.refactor_collection.add(
+            ids=['refactor_legacy'],
+            documents=["Original:\nx=1\n\n\nRefactored:\nx = 1\n"],
+            metadatas=[{'filename': self.source, 'timestamp': 't', 'changes': 'Spacing.'}])
+        self.assertEqual(self.store.gc(dry_run=True)['converted']['refactor_history'], 1)
+        self.assertEqual(self.store.gc()['converted']['refactor_history'], 1)
+        stored = self.store.refactor_collection.get()
+        self.assertEqual(stored['documents'], ["@@ -1 +1 @@\n-x=1\n+x = 1"])
+        self.assertEqual(stored['metadatas'][0]['changes'], 'Spacing.')
+    
+    def test_sync_file_writes_only_changed_units(self):
+        # Unchanged units are skipped, moved ones rewritten, removed ones deleted
+        def unit(symbol, line):
+            return {'filename': self.source, 'symbol': symbol, 'start_line': line,
+                    'indexed_at': str(line)}
+        codes = ['def a(): pass', 'def b(): pass', 'def c(): pass']
+        self.assertEqual(self.store.sync_file(self.source, codes,
+                                              [unit('a', 1), unit('b', 2), unit('c', 3)]), 3)
+        written = self.store.sync_file(self.source, ['def a(): pass', 'def c(): pass', 'def d(): pass'],
+                                       [unit('a', 1), unit('c', 2), unit('d', 3)])
+        self.assertEqual(written, 2)
+        stored = self.store.code_collection.get()
+        self.assertEqual(sorted(m['symbol'] for m in stored['metadatas']), ['a', 'c', 'd'])
+        self.assertEqual({m['symbol']: m['start_line'] for m in stored['metadatas']}['c'], 2)
+    
+    def test_namespaces_are_isolated_and_filtered(self):
+        # Each namespace has its own code collection; language and path
+        # prefix narrow a query within it
+        other = os.path.join(self.tmp.name, 'lib', 'b.js')
+        self.store.add_code_patterns(
+            ['def a(): pass', 'function b() {}'],
+            [{'filename': self.source, 'symbol': 'a', 'language': 'python'},
+             {'filename': other, 'symbol': 'b', 'language': 'javascript'}],
+            namespace='alpha')
+        self.store.add_code_patterns(['def c(): pass'], [{'filename': self.source, 'symbol': 'c',
+                                                          'language': 'python'}])
+        
+        def found(**filters):
+            result = self.store.search_similar_code('def a(): pass', 5, **filters)
+            return sorted(m['symbol'] for m in result['metadatas'][0])
+        self.assertEqual(found(), ['c'])
+        self.assertEqual(found(namespace='alpha'), ['a', 'b'])
+        self.assertEqual(found(namespace='alpha', language='javascript'), ['b'])
+        self.assertEqual(found(namespace='alpha', path_prefix=os.path.dirname(other)), ['b'])
+        self.assertEqual(found(namespace='alpha', path_prefix=os.path.dirname(other)[:-1]), [])
+        self.assertEqual(found(namespace='alpha', path_prefix=other), ['b'])
+        # Only per-hit keys are filtered; e.g. Chroma's "included" is kept
+        plain = self.store.search_similar_code('def a(): pass', 5, namespace='alpha')
+        narrowed = self.store.search_similar_code('def a(): pass', 5, namespace='alpha',
+                                                  path_prefix=other)
+        self.assertEqual(narrowed.get('included'), plain.get('included'))
+        self.assertEqual(self.store.namespaces(), {'alpha': {'code_patterns': 2},
+                                                   'default': {'code_patterns': 1}})
+        
+        self.store.drop_namespace('alpha')
+        self.assertEqual(found(namespace='alpha'), [])
+        self.assertEqual(found(), ['c'])
+        self.store.add_code_patterns(['def a(): pass'], [{'filename': self.source, 'symbol': 'a'}],
+                                     namespace='alpha')
+        self.assertEqual(found(namespace='alpha'), ['a'])
+
+class LegacyEmbeddingFunction(EmbeddingFunction):
+    # Stand-in for the embedding function of collections built before Gemini
+    def __init__(self):
+        pass
+    
+    def __call__(self, input):
+        return [np.ones(3, dtype=np.float32) for _ in input]
+    
+    @staticmethod
+    def name():
+        return "legacy"
+    
+    def get_config(self):
+        return {}
+    
+    @staticmethod
+    def build_from_config(config):
+        return LegacyEmbeddingFunction()
+
+class FailingModels:
+    # Fake genai models API whose embedding calls fail
+    def embed_content(self, model, contents, config=None):
+        raise RuntimeError("network down")
+
+class TestChromaVectorStore(VectorStoreIdCases, unittest.TestCase):
+    def make_backend(self, embedder):
+        return ChromaBackend(embedder, path=os.path.join(self.tmp.name, 'db'))
+    
+    def test_failed_migration_keeps_legacy_entries(self):
+        client = self.store.backend.client
+        legacy = client.create_collection('code_patterns', embedding_function=LegacyEmbeddingFunction())
+        legacy.add(ids=['a', 'b'], documents=['def a(): pass', 'def b(): pass'],
+                   metadatas=[{'symbol': 'a'}, {'symbol': 'b'}])
+        failing = EmbeddingGenerator(client=SimpleNamespace(models=FailingModels()),
+                                     cache=EmbeddingCache(':memory:'))
+        with self.assertRaises(RuntimeError):
+            ChromaBackend(failing, client=client).collection('code_patterns')
+        self.assertEqual(client.get_collection('code_patterns').count(), 2)
+        
+        migrated = self.store.backend.collection('code_patterns')
+        self.assertEqual(sorted(migrated.get()['ids']), ['a', 'b'])
+        self.assertEqual(self.store.backend.list_collections(), ['code_patterns'])
+    
+    def test_drop_missing_collection_without_not_found_error(self):
+        # chromadb 0.4 has no NotFoundError and raises ValueError instead
+        def delete_collection(name):
+            raise ValueError(f"Collection {name} does not exist.")
+        backend = ChromaBackend(SimpleNamespace(), client=SimpleNamespace(delete_collection=delete_collection))
+        with mock.patch.dict(chromadb.errors.__dict__):
+            del chromadb.errors.NotFoundError
+            backend.drop_collection('code_patterns__gone')
+
+class TestFlatVectorStore(VectorStoreIdCases, unittest.TestCase):
+    def make_backend(self, embedder):
+        return FlatBackend(embedder, path=os.path.join(self.tmp.name, 'flat'))
+    
+    def tearDown(self):
+        self.store.backend.close()
+        super().tearDown()
+    
+    def test_query_returns_nearest_by_cosine(self):
+        collection = self.store.code_collection
+        collection.add(ids=['x', 'y', 'z'], documents=['x', 'y', 'z'],
+                       embeddings=[[1, 0, 0], [0, 1, 0], [1, 1, 0]])
+        result = collection.query(query_embeddings=[[1, 0.1, 0]], n_results=2)
+        self.assertEqual(result['ids'], [['x', 'z']])
+        self.assertAlmostEqual(result['distances'][0][0], 1 - 1 / np.sqrt(1.01), places=3)
+        self.assertEqual(collection.query(query_embeddings=[[0, 0, 1]], n_results=9)['ids'][0][2], 'z')
+    
+    def test_deleted_rows_are_reused_and_matrix_grows(self):
+        collection = self.store.code_collection
+        rng = np.random.default_rng(0)
+        ids = [f'u{i}' for i in range(1500)]
+        vectors = rng.normal(size=(1500, 3))
+        metadatas = [{'filename': f'f{i % 3}'} for i in range(1500)]
+        for part in (slice(0, 1000), slice(1000, 1500)):
+            # The second batch outgrows the first file and moves to a new one
+            collection.upsert(ids=ids[part], documents=ids[part], metadatas=metadatas[part],
+                              embeddings=vectors[part])
+        self.assertEqual(collection.count(), 1500)
+        collection.delete(where={'filename': 'f0'})
+        self.assertEqual(collection.count(), 1000)
+        self.assertNotIn('u0', collection.query(query_embeddings=[vectors[0]], n_results=5)['ids'][0])
+        
+        collection.upsert(ids=['new'], documents=['new'], embeddings=[vectors[0]])
+        self.assertEqual(collection.query(query_embeddings=[vectors[0]], n_results=1)['ids'], [['new']])
+        files = [name for name in os.listdir(self.store.backend.path) if name.endswith('.npy')]
+        self.assertEqual(files, ['code_patterns.2.npy'])
+        
+        # A second handle on the same files (another process) sees the writes
+        other = FlatBackend(self.store.embedder, path=self.store.backend.path).collection('code_patterns')
+        self.assertEqual(other.count(), 1001)
+        self.assertEqual(other.get(ids=['new'], include=['embeddings'])['embeddings'][0].shape, (3,))
+        collection.delete(ids=['new'])
+        self.assertNotEqual(other.query(query_embeddings=[vectors[0]], n_results=1)['ids'], [['new']])
+        other.backend.close()
+    
+    def test_flat_backend_skips_chromadb(self):
+        code = ("import sys\n"
+                "from waycode.rag.vector_store import VectorStore\n"
+                "VectorStore(embedder=object()).code_collection.count()\n"
+                "print('chromadb' in sys.modules)")
+        env = dict(os.environ, HOME=self.tmp.name, PYTHONPATH=ROOT, WAYCODE_VECTOR_BACKEND='flat')
+        result = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                text=True, timeout=60)
+        self.assertEqual(result.stdout.strip(), 'False', result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
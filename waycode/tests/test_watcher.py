@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import unittest
+from waycode.rag.watcher import IndexWatcher
+from waycode.utils.gitignore import IgnoreRules
+
+class RecordingIndexer:
+    # Stand-in for ProjectIndexer recording the batches it is given
+    def __init__(self):
+        self.batches = []
+    
+    def index_files(self, paths, on_file=None):
+        self.batches.append(paths)
+        return {'files': len(paths), 'deleted': 0, 'chunks': 0, 'elapsed': 0.0}
+
+class TestIgnoreRules(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'pkg', 'gen'))
+        self.write('.gitignore', "# build output\n/out\n*.gen.py\n!keep.gen.py\ngen/\ndocs/**/*.py\n")
+        self.write('pkg/.gitignore', "local_*.py\n")
+        self.rules = IgnoreRules(self.root)
+    
+    def tearDown(self):
+        shutil.rmtree(self.root)
+    
+    def write(self, name, text=''):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+    
+    def ignored(self, name, is_dir=False):
+        return self.rules.ignored(os.path.join(self.root, name), is_dir)
+    
+    def test_gitignore_patterns(self):
+        self.assertTrue(self.ignored('out', True))
+        self.assertFalse(self.ignored('pkg/out', True))
+        self.assertTrue(self.ignored('pkg/api.gen.py'))
+        self.assertFalse(self.ignored('pkg/keep.gen.py'))
+        self.assertTrue(self.ignored('pkg/gen', True))
+        self.assertFalse(self.ignored('pkg/gen.py'))
+        self.assertTrue(self.ignored('docs/a/b/conf.py'))
+        self.assertTrue(self.ignored('node_modules', True))
+    
+    def test_nested_gitignore_applies_below_its_directory(self):
+        self.assertTrue(self.ignored('pkg/local_settings.py'))
+        self.assertFalse(self.ignored('local_settings.py'))
+
+class TestIndexWatcher(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'src', 'build'))
+        self.write('.gitignore', "*.gen.py\n")
+        self.write('src/a.py', "a = 1\n")
+        self.indexer = RecordingIndexer()
+        self.watcher = IndexWatcher(self.indexer, self.root, debounce=0.5, max_delay=2.0)
+    
+    def tearDown(self):
+        shutil.rmtree(self.root)
+    
+    def write(self, name, text):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+    
+    def test_scan_skips_ignored_files(self):
+        self.write('src/b.gen.py', "b = 1\n")
+        self.write('src/build/c.py', "c = 1\n")
+        self.write('src/notes.txt', "")
+        self.assertEqual(list(self.watcher.scan()), [os.path.join(self.root, 'src', 'a.py')])
+    
+    def test_subdirectory_uses_repository_rules(self):
+        # Watching below the git root still applies the root's anchored
+        # patterns and .git/info/exclude
+        os.makedirs(os.path.join(self.root, '.git', 'info'))
+        os.makedirs(os.path.join(self.root, 'src', 'vendor'))
+        self.write('.git/info/exclude', "scratch.py\n")
+        self.write('.gitignore', "*.gen.py\n/src/vendor/\n")
+        self.write('src/b.gen.py', "b = 1\n")
+        self.write('src/scratch.py', "s = 1\n")
+        self.write('src/vendor/lib.py', "v = 1\n")
+        watcher = IndexWatcher(self.indexer, os.path.join(self.root, 'src'))
+        self.assertEqual(sorted(watcher.scan()), [os.path.join(self.root, 'src', 'a.py')])
+    
+    def test_bursts_are_debounced_into_one_batch(self):
+        a = self.write('src/a.py', "a = 2\n")
+        self.assertIsNone(self.watcher.poll(now=10.0))
+        b = self.write('src/b.py', "b = 1\n")
+        self.assertIsNone(self.watcher.poll(now=10.3))
+        self.assertIsNone(self.watcher.poll(now=10.6))
+        self.assertEqual(self.watcher.poll(now=10.9), [a, b])
+        self.assertIsNone(self.watcher.poll(now=20.0))
+        
+        os.remove(b)
+        self.assertEqual(self.watcher.poll(now=21.0), None)
+        self.assertEqual(self.watcher.poll(now=21.5), [b])
+    
+    def test_continuous_changes_flush_after_max_delay(self):
+        for step in range(5):
+            path = self.write(f'src/f{step}.py', "x = 1\n")
+            self.assertIsNone(self.watcher.poll(now=10.0 + step * 0.4))
+        self.assertEqual(len(self.watcher.poll(now=12.0)), 5)
+        
+        self.watcher.run_batch([path])
+        self.assertEqual(self.indexer.batches, [[path]])
+
+if __name__ == '__main__':
+    unittest.main()
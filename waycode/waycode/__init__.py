@@ -1,11 +1,27 @@
-"""
-WayCode - AI-Powered Code Refactoring Assistant
-"""
-
-__version__ = "1.0.0"
-__author__ = "Your Name"
-
-from .refactor_agent import RefactorAgent
-from .config import *
-
-__all__ = ['RefactorAgent']
\ No newline at end of file
+"""
+WayCode - AI-Powered Code Refactoring Assistant
+"""
+
+import importlib
+
+__version__ = "1.0.0"
+__author__ = "Your Name"
+
+__all__ = ['RefactorAgent']
+
+def __getattr__(name):
+    # Import the agent (and its model/vector store dependencies) on first use
+    # so `import waycode` and the CLI's --help/--version stay fast
+    if name == 'RefactorAgent':
+        return importlib.import_module('.refactor_agent', __name__).RefactorAgent
+    if name.startswith('_'):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    # Configuration constants used to be re-exported at package level
+    config = importlib.import_module('.config', __name__)
+    if name == 'config':
+        return config
+    try:
+        return getattr(config, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -0,0 +1,89 @@
+import asyncio
+import glob
+import os
+import time
+from waycode.config import INDEXED_EXTENSIONS, REFACTOR_CONCURRENCY
+from waycode.utils.code_analyzer import CodeAnalyzer
+
+class BatchRefactorer:
+    # Refactor many files concurrently, mirroring the source tree under the
+    # output directory. At most `concurrency` files are in flight; model
+    # calls (several per split file) are bounded by the agent's limiter.
+    
+    def __init__(self, agent, concurrency=REFACTOR_CONCURRENCY, output_dir='./output'):
+        self.agent = agent
+        self.concurrency = max(1, concurrency)
+        self.output_dir = output_dir
+        self.analyzer = CodeAnalyzer()
+    
+    def collect_files(self, target):
+        # Resolve a directory or glob pattern to (base_dir, [files])
+        if glob.has_magic(target):
+            files = sorted(
+                f for f in glob.glob(target, recursive=True)
+                if os.path.isfile(f)
+            )
+            base = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files]) \
+                if files else os.getcwd()
+            return base, [os.path.abspath(f) for f in files]
+        
+        if os.path.isfile(target):
+            return os.path.dirname(os.path.abspath(target)), [os.path.abspath(target)]
+        
+        files = []
+        for root, _, names in os.walk(target):
+            for name in sorted(names):
+                if os.path.splitext(name)[1] in INDEXED_EXTENSIONS:
+                    files.append(os.path.abspath(os.path.join(root, name)))
+        return os.path.abspath(target), sorted(files)
+    
+    def output_path(self, base, filepath):
+        # Output location preserving the file's path relative to base
+        return os.path.join(self.output_dir, os.path.relpath(filepath, base))
+    
+    def run(self, target, on_result=None):
+        # Refactor every file matched by target and return an aggregate summary
+        base, files = self.collect_files(target)
+        return asyncio.run(self._run(base, files, on_result))
+    
+    async def _run(self, base, files, on_result):
+        # Drive every file through a shared semaphore
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summary = {"succeeded": 0, "failed": 0, "cached": 0, "results": []}
+        
+        async def worker(filepath):
+            async with semaphore:
+                result = await self._refactor_file(base, filepath)
+            summary[result["status"]] += 1
+            summary["results"].append(result)
+            if on_result:
+                on_result(result)
+        
+        await asyncio.gather(*(worker(f) for f in files))
+        summary["elapsed"] = time.perf_counter() - started
+        return summary
+    
+    async def _refactor_file(self, base, filepath):
+        # Refactor a single file and write its output; never raises
+        result = {"file": filepath, "output": None, "error": None}
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                code = f.read()
+            
+            language = self.analyzer.detect_language(filepath)
+            refactored = await self.agent.arefactor_code(code, language, filepath)
+            
+            if not refactored:
+                result.update(status="failed", error="Could not parse refactored code")
+                return result
+            
+            output = self.output_path(base, filepath)
+            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(refactored['code'])
+            
+            result.update(status="cached" if refactored['cached'] else "succeeded", output=output)
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+        return result
@@ -1,78 +1,622 @@
-import click
-import os
-import sys
-from pathlib import Path
-
-# Add current directory to sys.path for local imports
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from refactor_agent import RefactorAgent
-from utils.code_analyzer import CodeAnalyzer
-from rag.memory_manager import MemoryManager
-
-@click.group()
-@click.version_option(version='1.0.0')
-def cli():
-    # WayCode - AI-Powered Code Refactoring Assistant
-    pass
-
-@cli.command()
-@click.argument('filepath', type=click.Path(exists=True))
-@click.option('--output', '-o', help='Output file path')
-@click.option('--show-diff/--no-diff', default=True, help='Show diff comparison')
-def refactor(filepath, output, show_diff):
-    # Refactor a code file with AI suggestions
-    try:
-        click.echo(click.style("\nWayCode AI Refactor", fg='cyan', bold=True))
-        
-        agent = RefactorAgent()
-        analyzer = CodeAnalyzer()
-        
-        with open(filepath, 'r', encoding='utf-8') as f:
-            code = f.read()
-        
-        language = analyzer.detect_language(filepath)
-        refactored = agent.refactor_code(code, language, filepath)
-        
-        if refactored:
-            if not output:
-                output = f"./output/{os.path.basename(filepath)}"
-            
-            os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
-            with open(output, 'w', encoding='utf-8') as f:
-                f.write(refactored)
-            
-            click.echo(click.style(f"Saved to: {output}", fg='green'))
-        else:
-            click.echo(click.style("Refactoring failed", fg='red'))
-            sys.exit(1)
-            
-    except Exception as e:
-        click.echo(click.style(f"Error: {str(e)}", fg='red'))
-        sys.exit(1)
-
-@cli.command()
-@click.argument('path', type=click.Path(exists=True))
-@click.option('--recursive', '-r', is_flag=True, help='Index all files')
-def index(path, recursive):
-    # Index files to learn coding patterns
-    try:
-        agent = RefactorAgent()
-        path_obj = Path(path)
-        files_indexed = 0
-        
-        pattern = '**/*' if recursive else '*'
-        # Iterate through directory or single file
-        for file_path in path_obj.glob(pattern) if path_obj.is_dir() else [path_obj]:
-            if file_path.is_file() and file_path.suffix in ['.py', '.js', '.ts']:
-                agent.analyze_project_file(str(file_path))
-                files_indexed += 1
-                click.echo(f"Indexed: {file_path.name}")
-        
-        click.echo(click.style(f"\nTotal Indexed: {files_indexed}", fg='green'))
-    except Exception as e:
-        click.echo(click.style(f"Error: {str(e)}", fg='red'))
-        sys.exit(1)
-
-if __name__ == '__main__':
-    cli()
+import click
+import functools
+import os
+import sys
+import time
+from waycode.config import (
+    INDEX_WORKERS, INDEX_BATCH_SIZE, LLM_CACHE_ENABLED, REFACTOR_CONCURRENCY, DAEMON_HOST,
+    DAEMON_PORT, DAEMON_STATE_PATH, DAEMON_DISABLED, DIFF_CONTEXT_LINES, RETRIEVAL_MODES,
+    WATCH_POLL_INTERVAL
+)
+
+# Commands import their dependencies when they run: the agent pulls in
+# google.genai and the vector store pulls in chromadb, which would otherwise
+# dominate the startup time of every invocation, including --help.
+
+@click.group()
+@click.version_option(version='1.0.0')
+@click.option('--no-daemon', is_flag=True, help='Run in-process even if `waycode serve` is running')
+@click.pass_context
+def cli(ctx, no_daemon):
+    # WayCode - AI-Powered Code Refactoring Assistant
+    ctx.obj = {'no_daemon': no_daemon or DAEMON_DISABLED}
+
+def profile_options(command):
+    # Add --profile/--trace-file to a command and report its stage timings
+    @click.option('--profile', is_flag=True, help='Print a per-stage timing breakdown')
+    @click.option('--trace-file', type=click.Path(dir_okay=False),
+                  help='Append per-stage timings to this file as JSON lines')
+    @functools.wraps(command)
+    def wrapper(*args, profile=False, trace_file=None, **kwargs):
+        if not (profile or trace_file):
+            return command(*args, **kwargs)
+        
+        from waycode.utils.profiler import Profiler, activate, deactivate
+        name = command.__name__.replace('_', '-')
+        profiler = activate(Profiler())
+        try:
+            with profiler.span(f"cli.{name}"):
+                return command(*args, **kwargs)
+        finally:
+            deactivate()
+            if profile:
+                click.echo(click.style("\nProfile", fg='cyan', bold=True), err=True)
+                click.echo(profiler.format_table(), err=True)
+            if trace_file:
+                profiler.write_trace(trace_file, command=name, argv=sys.argv[1:])
+    return wrapper
+
+def daemon_client():
+    # Client for a running `waycode serve`, or None to work in-process
+    options = click.get_current_context().find_root().obj or {}
+    if options.get('no_daemon') or not os.path.exists(DAEMON_STATE_PATH):
+        return None
+    from waycode.daemon import DaemonClient
+    return DaemonClient.discover()
+
+def write_output(path, code):
+    # Save refactored code, creating the output directory as needed
+    if not code:
+        return
+    from waycode.utils.profiler import span
+    with span("write_output") as stage:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        stage["bytes_written"] = len(code.encode('utf-8'))
+
+def resolve_diff_mode(show_diff, diff_stat):
+    # Map the diff flags to RefactorAgent's diff_mode
+    return 'stat' if diff_stat else 'unified' if show_diff else 'none'
+
+def print_refactor_result(result, diff_mode='unified', color=False):
+    # Print a refactor result returned by the daemon like RefactorAgent does
+    from waycode.utils.diff_generator import DiffGenerator
+    diff = DiffGenerator().colorize(result['diff']) if color else result['diff']
+    click.echo("\nRefactoring complete!")
+    sections = [("EXPLANATION:", result.get('explanation') or 'No explanation provided'),
+                ("DIFF STAT:" if diff_mode == 'stat' else "DIFF:", diff),
+                ("REFACTORED CODE:", result['code'])]
+    for title, body in sections:
+        if title.startswith("DIFF") and diff_mode == 'none':
+            continue
+        click.echo("\n" + "="*60)
+        click.echo(title)
+        click.echo("="*60)
+        click.echo(body, color=color)
+
+@cli.command()
+@click.argument('filepath', type=click.Path(exists=True))
+@click.option('--output', '-o', help='Output file path')
+@click.option('--show-diff/--no-diff', default=True, help='Show diff comparison')
+@click.option('--diff-stat', is_flag=True, help='Show changed line counts instead of the diff')
+@click.option('--color/--no-color', default=None, help='Colour the diff (default: when on a terminal)')
+@click.option('--cache/--no-cache', default=LLM_CACHE_ENABLED,
+              help='Reuse cached model responses for identical prompts')
+@click.option('--stream', is_flag=True, help='Print and save output while the model responds')
+@click.option('--memory/--no-memory', default=True,
+              help='Use project memory for context (--no-memory skips the vector DB)')
+@click.option('--split/--no-split', default=True,
+              help='Refactor files larger than the model context in segments')
+@click.option('--retrieval', type=click.Choice(RETRIEVAL_MODES), default=None,
+              help='Context retrieval: identifier index, embeddings or both (default: hybrid)')
+@click.option('--project', default=None,
+              help='Memory namespace to use (default: the git repository of the file)')
+@profile_options
+def refactor(filepath, output, show_diff, diff_stat, color, cache, stream, memory, split, retrieval,
+             project):
+    # Refactor a code file with AI suggestions
+    from waycode.utils.code_analyzer import CodeAnalyzer
+    try:
+        click.echo(click.style("\nWayCode AI Refactor", fg='cyan', bold=True))
+        
+        analyzer = CodeAnalyzer()
+        
+        with open(filepath, 'r', encoding='utf-8') as f:
+            code = f.read()
+        
+        if not output:
+            output = f"./output/{os.path.basename(filepath)}"
+        
+        language = analyzer.detect_language(filepath)
+        mode = resolve_diff_mode(show_diff, diff_stat)
+        color = sys.stdout.isatty() if color is None else color
+        # The daemon retrieves with its own mode and namespaces, so explicit
+        # ones run locally
+        local = stream or retrieval or project
+        client = daemon_client() if memory and split and not local else None
+        
+        if client:
+            # The daemon already holds a warm agent; don't import one here
+            click.echo(click.style("Using waycode serve", dim=True))
+            result = client.refactor(code, language, os.path.abspath(filepath), cache=cache,
+                                     diff_mode=mode)
+            if result:
+                print_refactor_result(result, mode, color)
+            refactored = result['code'] if result else None
+            write_output(output, refactored)
+        else:
+            from waycode.refactor_agent import RefactorAgent
+            agent = RefactorAgent(use_cache=cache, use_memory=memory, split_large_files=split,
+                                  diff_mode=mode, color=color, retrieval_mode=retrieval,
+                                  project=project)
+            if stream:
+                # The streaming path writes the output file as code lines arrive
+                refactored = agent.refactor_code_stream(code, language, filepath, output_path=output)
+            else:
+                refactored = agent.refactor_code(code, language, filepath)
+                write_output(output, refactored)
+        
+        if refactored:
+            click.echo(click.style(f"Saved to: {output}", fg='green'))
+        else:
+            click.echo(click.style("Refactoring failed", fg='red'))
+            sys.exit(1)
+            
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'))
+        sys.exit(1)
+
+@cli.command('refactor-dir')
+@click.argument('target')
+@click.option('--output-dir', '-o', default='./output', show_default=True,
+              help='Directory receiving refactored files')
+@click.option('--concurrency', '-c', type=int, default=REFACTOR_CONCURRENCY, show_default=True,
+              help='Maximum concurrent model calls')
+@click.option('--cache/--no-cache', default=LLM_CACHE_ENABLED,
+              help='Reuse cached model responses for identical prompts')
+@click.option('--split/--no-split', default=True,
+              help='Refactor files larger than the model context in segments')
+@click.option('--project', default=None,
+              help='Memory namespace to use (default: the git repository of each file)')
+@profile_options
+def refactor_dir(target, output_dir, concurrency, cache, split, project):
+    # Refactor every file in a directory or matching a glob pattern
+    from waycode.refactor_agent import RefactorAgent
+    from waycode.batch_refactor import BatchRefactorer
+    try:
+        click.echo(click.style("\nWayCode AI Refactor (batch)", fg='cyan', bold=True))
+        
+        agent = RefactorAgent(use_cache=cache, split_large_files=split, project=project,
+                              concurrency=concurrency)
+        batch = BatchRefactorer(agent, concurrency=concurrency, output_dir=output_dir)
+        
+        def report(result):
+            name = os.path.basename(result['file'])
+            if result['status'] == 'failed':
+                click.echo(click.style(f"Failed: {name} ({result['error']})", fg='red'))
+            else:
+                click.echo(f"{result['status'].capitalize()}: {name} -> {result['output']}")
+        
+        summary = batch.run(target, on_result=report)
+        
+        click.echo(click.style(
+            f"\nSucceeded: {summary['succeeded']}  Cached: {summary['cached']}  "
+            f"Failed: {summary['failed']}  ({summary['elapsed']:.1f}s)",
+            fg='green' if not summary['failed'] else 'yellow'
+        ))
+        if summary['failed']:
+            sys.exit(1)
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'))
+        sys.exit(1)
+
+@cli.command()
+@click.argument('original', type=click.Path(exists=True, dir_okay=False))
+@click.argument('refactored', type=click.Path(exists=True, dir_okay=False))
+@click.option('--side-by-side', '-y', is_flag=True, help='Show aligned columns instead of hunks')
+@click.option('--diff-stat', is_flag=True, help='Only count changed lines')
+@click.option('--color/--no-color', default=None, help='Colour the output (default: when on a terminal)')
+@click.option('--context', '-U', type=int, default=DIFF_CONTEXT_LINES, show_default=True,
+              help='Unchanged lines around each hunk')
+def diff(original, refactored, side_by_side, diff_stat, color, context):
+    # Compare two files, printing hunks as they are produced
+    from waycode.utils.diff_generator import DiffGenerator
+    with open(original, 'r', encoding='utf-8') as f:
+        before = f.read()
+    with open(refactored, 'r', encoding='utf-8') as f:
+        after = f.read()
+    
+    differ = DiffGenerator(context=context, color=sys.stdout.isatty() if color is None else color)
+    if diff_stat:
+        click.echo(differ.format_stat(differ.stat(before, after), os.path.basename(refactored)),
+                   color=differ.color)
+        return
+    lines = (differ.iter_side_by_side(before, after) if side_by_side else
+             differ.iter_diff(before, after, fromfile=original, tofile=refactored))
+    for line in lines:
+        click.echo(line, color=differ.color)
+
+def print_quantize_report(store, dtype, dim, k):
+    # Convert the vector store layout and show what it costs in recall for
+    # the code collection of every namespace
+    from waycode.rag.namespaces import split_collection_name
+    converted = store.quantize(dtype, dim)
+    click.echo(click.style(f"\nStored as {dtype}" + (f", at most {dim} dims" if dim else ""),
+                           fg='green'))
+    for entry in converted:
+        dims = f", {entry['dim']} dims" if entry['dim'] else ""
+        click.echo(f"  {entry['collection']:<20} {entry['count']:>7} vectors{dims} "
+                   f"({entry['from_cache']} at full precision from the embedding cache)")
+    
+    for entry in converted:
+        base, namespace = split_collection_name(entry['collection'])
+        if base != 'code_patterns' or not entry['count']:
+            continue
+        click.echo(click.style(f"\n{entry['collection']}", bold=True))
+        try:
+            report = store.recall_report(dtype, entry['dim'], k, namespace=namespace)
+        except ValueError as e:
+            click.echo(f"  Recall not measured: {e}")
+            continue
+        ratio = report['bytes_full'] / max(1, report['bytes_quantized'])
+        click.echo(f"  Code vectors: {report['bytes_full'] / 1e6:.2f} MB at float32 -> "
+                   f"{report['bytes_quantized'] / 1e6:.2f} MB ({ratio:.1f}x smaller)")
+        click.echo(f"  Recall@{report['k']} vs full precision over {report['queries']} queries: "
+                   f"{report['recall']:.3f} ({report['recall_rescored']:.3f} with re-scoring)")
+
+@cli.command()
+@click.argument('path', type=click.Path(exists=True))
+@click.option('--recursive', '-r', is_flag=True, help='Index all files')
+@click.option('--workers', '-w', type=int, default=INDEX_WORKERS, show_default=True,
+              help='Threads used to read and chunk files')
+@click.option('--batch-size', type=int, default=INDEX_BATCH_SIZE, show_default=True,
+              help='Code units per vector store write')
+@click.option('--quantize', type=click.Choice(['float32', 'float16', 'int8']), default=None,
+              help='Convert the flat index to this vector type and report recall against full precision')
+@click.option('--dim', type=int, default=None,
+              help='With --quantize, keep only the leading DIM embedding components')
+@click.option('--recall-k', type=int, default=10, show_default=True,
+              help='Neighbours compared when measuring recall')
+@click.option('--project', default=None,
+              help='Memory namespace to index into (default: the git repository of each file)')
+@click.option('--watch', is_flag=True,
+              help='Keep re-indexing changed files (not ignored by git) until interrupted')
+@click.option('--interval', type=float, default=WATCH_POLL_INTERVAL, show_default=True,
+              help='With --watch, seconds between scans for changes')
+@profile_options
+def index(path, recursive, workers, batch_size, quantize, dim, recall_k, project, watch, interval):
+    # Index files to learn coding patterns, skipping unchanged ones
+    try:
+        client = daemon_client()
+        memory = None
+        if client:
+            click.echo(click.style("Using waycode serve", dim=True))
+            summary = client.index(os.path.abspath(path), recursive, workers, batch_size, project)
+            stats = summary.pop('embedding_stats')
+        else:
+            from waycode.rag.memory_manager import MemoryManager
+            from waycode.rag.indexer import ProjectIndexer
+            memory = MemoryManager()
+            indexer = ProjectIndexer(memory, project=project)
+            
+            def report(file_path, status):
+                click.echo(f"{status.capitalize()}: {os.path.basename(file_path)}")
+            
+            summary = indexer.index_path(path, recursive, workers=workers,
+                                         batch_size=batch_size, on_file=report)
+            stats = memory.vector_store.embedding_stats()
+        
+        elapsed = max(summary['elapsed'], 1e-9)
+        click.echo(click.style(
+            f"\nAdded: {summary['added']}  Updated: {summary['updated']}  "
+            f"Unchanged: {summary['unchanged']}  Deleted: {summary['deleted']}",
+            fg='green'
+        ))
+        click.echo(
+            f"Indexed {summary['files']} files / {summary['chunks']} chunks / "
+            f"{summary['symbols']} symbols in {elapsed:.2f}s "
+            f"({summary['files'] / elapsed:.1f} files/s, {summary['chunks'] / elapsed:.1f} chunks/s)"
+        )
+        click.echo(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
+        
+        if quantize:
+            if memory is None:
+                from waycode.rag.memory_manager import MemoryManager
+                memory = MemoryManager()
+            print_quantize_report(memory.vector_store, quantize, dim, recall_k)
+        
+        if watch and client:
+            watching = client.watch(os.path.abspath(path), recursive, project)['watching']
+            click.echo(click.style(f"waycode serve is watching: {', '.join(watching)}", fg='cyan'))
+        elif watch:
+            watch_index(indexer, path, recursive, interval)
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'))
+        sys.exit(1)
+
+def watch_index(indexer, path, recursive, interval):
+    # Re-index changes under path in the background until Ctrl+C
+    from waycode.rag.watcher import IndexWatcher
+    
+    def report_file(file_path, status):
+        click.echo(f"{status.capitalize()}: {os.path.basename(file_path)}")
+    
+    def report_batch(summary):
+        if 'error' in summary:
+            click.echo(click.style(f"Re-index of {summary['paths']} paths failed: {summary['error']}",
+                                   fg='red'))
+        elif summary['files'] or summary['deleted']:
+            click.echo(click.style(
+                f"Re-indexed {summary['files']} files ({summary['chunks']} units written, "
+                f"{summary['deleted']} deleted) in {summary['elapsed']:.2f}s", fg='green'))
+    
+    watcher = IndexWatcher(indexer, path, recursive, interval=interval,
+                           on_batch=report_batch, on_file=report_file).start()
+    click.echo(click.style(f"\nWatching {os.path.abspath(path)} (Ctrl+C to stop)", fg='cyan'))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo("\nStopping...")
+    finally:
+        watcher.stop()
+
+@cli.command('stats')
+@click.argument('path', type=click.Path(exists=True), default='.')
+@click.option('--by', type=click.Choice(['file', 'function']), default='file', show_default=True,
+              help='Report one row per file or per function')
+@click.option('--sort', '-s', default=None,
+              help='Column to rank by (file: max_complexity, total_complexity, nesting_level, '
+                   'function_count, code_lines, file; function: complexity, nesting, lines, name)')
+@click.option('--limit', '-n', type=int, default=20, show_default=True, help='Rows to show (0 for all)')
+@click.option('--workers', '-w', type=int, default=INDEX_WORKERS, show_default=True,
+              help='Processes used to analyze files')
+@click.option('--json', 'as_json', is_flag=True, help='Print the full report as JSON')
+@profile_options
+def repo_stats(path, by, sort, limit, workers, as_json):
+    # Rank files or functions by complexity to pick refactor targets
+    import json
+    from waycode.repo_stats import RepoStats, FILE_SORT_KEYS, FUNCTION_SORT_KEYS
+    keys = FILE_SORT_KEYS if by == 'file' else FUNCTION_SORT_KEYS
+    sort = sort or keys[0]
+    if sort not in keys:
+        raise click.BadParameter(f"choose from {', '.join(keys)}", param_hint='--sort')
+    
+    stats = RepoStats(workers=workers)
+    reports, elapsed = stats.collect(path)
+    if by == 'file':
+        rows = stats.file_rows(reports, sort)
+    else:
+        rows = stats.function_rows(reports, sort)
+    shown = rows[:limit] if limit else rows
+    
+    if as_json:
+        click.echo(json.dumps({'analyzed': len(reports), 'elapsed': elapsed, by + 's': shown},
+                              indent=2))
+        return
+    click.echo(stats.format_files(shown) if by == 'file' else stats.format_functions(shown))
+    unreadable = sum(1 for r in reports if 'total_lines' not in r)
+    click.echo(click.style(
+        f"\n{len(reports)} files, {sum(len(r['functions']) for r in reports)} functions "
+        f"analyzed in {elapsed:.2f}s" + (f" ({unreadable} unreadable)" if unreadable else ""),
+        fg='green'
+    ))
+
+@cli.command()
+@click.argument('query')
+@click.option('--collection', type=click.Choice(['code', 'refactor', 'style']), default='code',
+              show_default=True, help='Memory collection to search')
+@click.option('--limit', '-n', type=int, default=5, show_default=True, help='Results to show')
+@click.option('--project', default=None,
+              help='Namespace to search (default: the git repository of the working directory)')
+@click.option('--language', default=None, help='Only return code in this language')
+@click.option('--path', 'path_prefix', type=click.Path(), default=None,
+              help='Only return code from files under this path')
+@profile_options
+def search(query, collection, limit, project, language, path_prefix):
+    # Search project memory for code similar to QUERY
+    from waycode.rag.namespaces import resolve_namespace
+    try:
+        namespace = resolve_namespace(os.getcwd(), project)
+        path_prefix = os.path.abspath(path_prefix) if path_prefix else None
+        client = daemon_client()
+        if client:
+            hits = client.search(query, collection, limit, namespace, language, path_prefix)
+        else:
+            from waycode.daemon import search_results
+            from waycode.rag.memory_manager import MemoryManager
+            hits = search_results(MemoryManager().vector_store, query, collection, limit,
+                                  namespace, language, path_prefix)
+        
+        if not hits:
+            click.echo("No matches")
+        for hit in hits:
+            metadata = hit['metadata'] or {}
+            label = metadata.get('filename', collection)
+            if 'symbol' in metadata:
+                label += f"::{metadata['symbol']} (lines {metadata.get('start_line')}-{metadata.get('end_line')})"
+            distance = f"{hit['distance']:.3f}" if hit['distance'] is not None else "-"
+            click.echo(click.style(f"[{distance}] {label}", fg='cyan'))
+            click.echo(hit['document'])
+            click.echo()
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'))
+        sys.exit(1)
+
+@cli.command()
+@click.option('--dry-run', is_flag=True, help='Report what would be removed without changing anything')
+def gc(dry_run):
+    # Remove duplicate and orphaned vector store entries
+    try:
+        client = daemon_client()
+        if client:
+            report = client.gc(dry_run=dry_run)
+        else:
+            from waycode.rag.memory_manager import MemoryManager
+            report = MemoryManager().gc(dry_run=dry_run)
+        
+        click.echo(click.style("Vector store" + (" (dry run)" if dry_run else ""), fg='cyan', bold=True))
+        width = max([18] + [len(name) for name in report['before']])
+        for name, before in report['before'].items():
+            converted = report['converted'].get(name)
+            click.echo(f"  {name:<{width}} {before:>7} -> {report['after'][name]:>7}  "
+                       f"({report['removed'][name]} removed"
+                       + (f", {converted} split into diff hunks)" if converted else ")"))
+        click.echo(f"  Unreferenced refactoring texts: {report['blobs_removed']} removed")
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'))
+        sys.exit(1)
+
+@cli.group()
+def namespace():
+    # List or delete per-repository memory namespaces
+    pass
+
+@namespace.command('list')
+def list_namespaces():
+    # Show every namespace with its indexed files and stored entries
+    from waycode.rag.manifest import IndexManifest
+    from waycode.rag.memory_manager import MemoryManager
+    memory = MemoryManager()
+    files = IndexManifest().namespaces()
+    stored = memory.vector_store.namespaces()
+    current = memory.namespace_for()
+    names = sorted(set(files) | set(stored))
+    if not names:
+        click.echo("No namespaces")
+        return
+    for name in names:
+        counts = stored.get(name, {})
+        marker = '*' if name == current else ' '
+        click.echo(f"{marker} {name:<40} {files.get(name, 0):>6} files "
+                   f"{counts.get('code_patterns', 0):>7} units "
+                   f"{counts.get('refactor_history', 0):>5} refactorings")
+
+@namespace.command('drop')
+@click.argument('name')
+@click.option('--yes', '-y', is_flag=True, help='Do not ask for confirmation')
+def drop_namespace(name, yes):
+    # Delete the indexed code and refactorings of one namespace
+    from waycode.rag.manifest import IndexManifest
+    from waycode.rag.memory_manager import MemoryManager
+    if daemon_client():
+        click.echo(click.style("Stop waycode serve before dropping a namespace", fg='red'))
+        sys.exit(1)
+    if not yes:
+        click.confirm(f"Delete all indexed code and refactorings in '{name}'?", abort=True)
+    MemoryManager().drop_namespace(name)
+    manifest = IndexManifest()
+    removed = manifest.remove_namespace(name)
+    manifest.save()
+    click.echo(click.style(f"Dropped {name} ({removed} indexed files)", fg='green'))
+
+@cli.command()
+@click.option('--host', default=DAEMON_HOST, show_default=True, help='Interface to bind')
+@click.option('--port', '-p', type=int, default=DAEMON_PORT, show_default=True, help='Port to listen on')
+def serve(host, port):
+    # Keep the agent, memory and vector store warm for other CLI invocations
+    from waycode.daemon import DaemonClient, DaemonServer, DaemonService
+    running = DaemonClient.discover()
+    if running:
+        click.echo(click.style(f"waycode serve is already running at {running.url}", fg='yellow'))
+        sys.exit(1)
+    
+    click.echo("Loading agent and project memory...")
+    try:
+        service = DaemonService()
+        service.warm()
+        server = DaemonServer(service, host, port)
+    except Exception as e:
+        click.echo(click.style(f"Error: {str(e)}", fg='red'))
+        sys.exit(1)
+    click.echo(click.style(
+        f"Serving on http://{host}:{server.server_address[1]} (Ctrl+C to stop)", fg='green'
+    ))
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        click.echo("\nStopped")
+
+@cli.group()
+def cache():
+    # Inspect or clear the on-disk caches
+    pass
+
+@cache.command()
+def stats():
+    # Show response and embedding cache statistics
+    from waycode.utils.response_cache import ResponseCache
+    from waycode.rag.embedding_cache import EmbeddingCache
+    responses = ResponseCache().stats()
+    embeddings = EmbeddingCache().stats()
+    
+    click.echo(click.style("LLM response cache", fg='cyan', bold=True))
+    click.echo(f"  Entries: {responses['entries']}")
+    click.echo(f"  Size:    {responses['bytes'] / 1024:.1f} KiB")
+    click.echo(f"  Hits:    {responses['hits']}")
+    click.echo(f"  Misses:  {responses['misses']}")
+    click.echo(click.style("Embedding cache", fg='cyan', bold=True))
+    click.echo(f"  Entries: {embeddings['entries']}")
+
+@cache.command()
+@click.option('--all', 'clear_all', is_flag=True, help='Also clear cached embeddings')
+def clear(clear_all):
+    # Remove cached model responses
+    from waycode.utils.response_cache import ResponseCache
+    from waycode.rag.embedding_cache import EmbeddingCache
+    ResponseCache().clear()
+    if clear_all:
+        EmbeddingCache().clear()
+    click.echo(click.style("Cache cleared", fg='green'))
+
+@cli.group()
+def history():
+    # Browse or compact the refactor history log
+    pass
+
+@history.command('list')
+@click.option('--limit', '-n', type=int, default=20, show_default=True, help='Records to show')
+@click.option('--offset', type=int, default=0, help='Skip this many of the newest records')
+def list_history(limit, offset):
+    # Show refactor history, newest first
+    from waycode.rag.history_store import HistoryStore
+    records = HistoryStore().page(offset=offset, limit=limit)
+    if not records:
+        click.echo("No refactor history")
+        return
+    for record in records:
+        click.echo(click.style(f"{record.get('timestamp', '')[:19]}  {record.get('filename')}", fg='cyan'))
+        summary = (record.get('changes_summary') or '').splitlines()
+        if summary:
+            click.echo(f"  {summary[0]}")
+
+@history.command('show')
+@click.argument('index', type=int, default=0)
+@click.option('--color/--no-color', default=None, help='Colour the diff (default: when on a terminal)')
+def show_history(index, color):
+    # Show the explanation and diff of one refactoring (0 is the newest)
+    from waycode.rag.blob_store import BlobStore
+    from waycode.rag.history_store import HistoryStore
+    from waycode.utils.diff_generator import DiffGenerator
+    records = HistoryStore().page(offset=index, limit=1)
+    if not records:
+        click.echo("No such refactoring")
+        sys.exit(1)
+    record = records[0]
+    click.echo(click.style(f"{record.get('timestamp', '')[:19]}  {record.get('filename')}", fg='cyan'))
+    stored = BlobStore().get(record['blob']) if record.get('blob') else None
+    if stored is None:
+        # Recorded before full texts were kept, or pruned by `waycode gc`
+        click.echo(record.get('changes_summary') or '')
+        return
+    differ = DiffGenerator(color=sys.stdout.isatty() if color is None else color)
+    click.echo(stored['explanation'])
+    click.echo()
+    for line in differ.iter_diff(stored['original'], stored['refactored'],
+                                 fromfile=record.get('filename') or 'original'):
+        click.echo(line, color=differ.color)
+
+@history.command()
+def compact():
+    # Apply the retention policy to the history log
+    from waycode.rag.history_store import HistoryStore
+    removed = HistoryStore().compact()
+    click.echo(click.style(f"Removed {removed} record(s)", fg='green'))
+
+def main():
+    # Console script entry point (see setup.py)
+    cli()
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,196 @@
-import os
-from dotenv import load_dotenv
-from pathlib import Path
-
-load_dotenv()
-
-# API Configuration
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_MODEL = "gemini-2.5-flash"
-
-# System path configuration
-HOME = Path.home()
-DATA_DIR = HOME / ".waycode" / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Storage paths for vector data and history
-VECTOR_DB_PATH = str(DATA_DIR / "vector_db")
-PROJECT_MEMORY_PATH = str(DATA_DIR / "project_memory.json")
-REFACTOR_HISTORY_PATH = str(DATA_DIR / "refactor_history.json")
-
-# Model parameters
-EMBEDDING_MODEL = "models/text-embedding-004"
-MAX_CONTEXT_TOKENS = 30000
-TEMPERATURE = 0.3
-
-# Prompt template for code refactoring logic
-REFACTOR_PROMPT = """You are an expert code refactoring assistant with access to the latest programming best practices.
-
-Context from project memory:
-{memory_context}
-
-Analyze this code and provide refactoring suggestions:
-
-Language: {language}
-Code:
+import os
+from pathlib import Path
+
+# API Configuration (GEMINI_API_KEY is resolved from the environment or
+# .env on first access, so importing this module stays cheap)
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# System path configuration; stores create DATA_DIR when they first write
+HOME = Path.home()
+DATA_DIR = HOME / ".waycode" / "data"
+
+# Storage paths for vector data and history
+VECTOR_DB_PATH = str(DATA_DIR / "vector_db")
+PROJECT_MEMORY_PATH = str(DATA_DIR / "project_memory.json")
+REFACTOR_HISTORY_PATH = str(DATA_DIR / "refactor_history.jsonl")
+LEGACY_REFACTOR_HISTORY_PATH = str(DATA_DIR / "refactor_history.json")
+EMBEDDING_CACHE_PATH = str(DATA_DIR / "embedding_cache.sqlite")
+LLM_CACHE_PATH = str(DATA_DIR / "llm_cache.sqlite")
+DAEMON_STATE_PATH = str(DATA_DIR / "daemon.json")
+LEXICAL_INDEX_PATH = str(DATA_DIR / "lexical_index.sqlite")
+REFACTOR_BLOB_PATH = str(DATA_DIR / "refactor_blobs.sqlite")
+SYMBOL_INDEX_PATH = str(DATA_DIR / "symbol_index.sqlite")
+FLAT_INDEX_PATH = str(DATA_DIR / "flat_index")
+
+# Vector store backend: 'chroma' (SQLite + HNSW) or 'flat' (memory-mapped
+# NumPy matrix with exact search, no chromadb import). WAYCODE_VECTOR_BACKEND
+# overrides the default; each backend keeps its own index manifest so
+# switching backends re-indexes into the new store.
+VECTOR_BACKEND = os.getenv("WAYCODE_VECTOR_BACKEND", "chroma")
+VECTOR_BACKENDS = ('chroma', 'flat')
+INDEX_MANIFEST_PATH = str(DATA_DIR / ("index_manifest.json" if VECTOR_BACKEND == "chroma"
+                                      else f"index_manifest.{VECTOR_BACKEND}.json"))
+# Flat backend layout for new collections: 'float32', 'float16' (half the
+# size) or 'int8' (a quarter), optionally truncated to the leading
+# WAYCODE_FLAT_DIM components. `waycode index --quantize` converts existing
+# collections. int8 and truncated layouts re-score FLAT_RESCORE_FACTOR * k
+# candidates at full precision.
+FLAT_INDEX_DTYPE = os.getenv("WAYCODE_FLAT_DTYPE", "float16")
+FLAT_INDEX_DIM = int(os.getenv("WAYCODE_FLAT_DIM", "0")) or None
+FLAT_RESCORE_FACTOR = 4
+FLAT_INDEX_INITIAL_ROWS = 1024
+FLAT_QUERY_BLOCK_ROWS = 8192
+FLAT_MAX_BATCH_SIZE = 5000
+
+# Code and refactoring memory is kept per repository namespace (see
+# waycode/rag/namespaces.py). Chroma has no prefix operator, so path-prefix
+# searches fetch PATH_FILTER_OVERFETCH times the hits and filter them.
+PATH_FILTER_OVERFETCH = 4
+
+# File types picked up by `waycode index`
+INDEXED_EXTENSIONS = ('.py', '.js', '.ts')
+INDEX_WORKERS = os.cpu_count() or 4
+INDEX_BATCH_SIZE = 64
+
+# Directories never walked by `waycode stats` or `waycode index --watch`
+IGNORED_DIRS = ('.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv',
+                'dist', 'build', 'output')
+
+# `waycode index --watch`: seconds between scans, quiet time before a burst
+# of changes is re-indexed, and the longest a busy burst is held back
+WATCH_POLL_INTERVAL = 1.0
+WATCH_DEBOUNCE = 0.5
+WATCH_MAX_DELAY = 5.0
+
+# Model parameters
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_CACHE_MAX_ENTRIES = 200000
+QUERY_CACHE_SIZE = 128
+MAX_CONTEXT_TOKENS = 30000
+TEMPERATURE = 0.3
+
+# Retrieved-context packing (ContextBuilder)
+CONTEXT_TOKEN_BUDGET = 4000
+CONTEXT_CANDIDATES = 8
+CONTEXT_MAX_DISTANCE = 0.6
+CONTEXT_DEDUP_THRESHOLD = 0.85
+# Definitions of the names the code imports, looked up in the symbol index
+# and packed ahead of retrieved code; docs are cut to SYMBOL_DOC_CHARS and
+# re-exports (e.g. a package __init__) are followed this many hops
+CONTEXT_MAX_DEFINITIONS = 12
+SYMBOL_DOC_CHARS = 300
+SYMBOL_REEXPORT_DEPTH = 3
+
+# Code retrieval: 'hybrid' fuses the local identifier index with vector
+# search, 'vector' uses embeddings only and 'lexical' makes no network calls
+# (WAYCODE_RETRIEVAL overrides the default)
+RETRIEVAL_MODE = os.getenv("WAYCODE_RETRIEVAL", "hybrid")
+RETRIEVAL_MODES = ('hybrid', 'vector', 'lexical')
+RRF_K = 60
+LEXICAL_QUERY_TERMS = 64
+# Hybrid retrieval skips the embedding round trip when this many lexical
+# hits define names the query code uses
+LEXICAL_SUFFICIENT_HITS = 3
+# Relevance given to lexical-only hits, on the vector distance scale
+LEXICAL_DISTANCE = 0.4
+
+# Opt-in cache of raw model responses (WAYCODE_LLM_CACHE=1 or --cache)
+LLM_CACHE_ENABLED = os.getenv("WAYCODE_LLM_CACHE", "0") == "1"
+LLM_CACHE_TTL = 7 * 24 * 3600
+LLM_CACHE_MAX_BYTES = 100 * 1024 * 1024
+
+# Split-and-stitch refactoring of files too large for one prompt
+LARGE_FILE_TOKENS = 6000
+SEGMENT_MAX_TOKENS = 2000
+MODULE_CONTEXT_TOKENS = 1000
+
+# Diff output (unified diff context and side-by-side column width)
+DIFF_CONTEXT_LINES = 3
+# Edit-cost cutoff of the Myers search (like git's, the larger of this and
+# the square root of the combined length); a range that needs more edits
+# is reported as one replace instead
+DIFF_MIN_COST_LIMIT = 256
+SIDE_BY_SIDE_WIDTH = 50
+
+# Refactor history retention
+HISTORY_MAX_RECORDS = 10000
+HISTORY_MAX_AGE_DAYS = 365
+HISTORY_COMPACT_BYTES = 8 * 1024 * 1024
+
+# Refactorings are stored in the vector store as one entry per diff hunk,
+# each carrying the first REFACTOR_SUMMARY_CHARS of the model's explanation;
+# the full before/after text is kept zlib-compressed in REFACTOR_BLOB_PATH
+REFACTOR_SUMMARY_CHARS = 300
+BLOB_COMPRESSION_LEVEL = 6
+
+# Multi-file refactoring (`waycode refactor-dir`)
+REFACTOR_CONCURRENCY = 4
+REFACTOR_MAX_RETRIES = 5
+REFACTOR_RETRY_BASE_DELAY = 2.0
+
+# Long-lived `waycode serve` daemon (localhost HTTP; set WAYCODE_NO_DAEMON=1
+# to make the CLI ignore a running daemon)
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+DAEMON_CONNECT_TIMEOUT = 0.5
+DAEMON_DISABLED = os.getenv("WAYCODE_NO_DAEMON", "0") == "1"
+
+# Prompt template for code refactoring logic
+REFACTOR_PROMPT = """You are an expert code refactoring assistant with access to the latest programming best practices.
+
+Context from project memory:
+{memory_context}
+
+Analyze this code and provide refactoring suggestions:
+
+Language: {language}
+Code:
+```{language}
+{code}
+```
+
+First explain the changes you are making, then return the complete refactored code
+in a single fenced code block."""
+
+# Prompt template for one segment of a large file (see SplitRefactorer)
+SEGMENT_PROMPT = """You are an expert code refactoring assistant with access to the latest programming best practices.
+
+You are refactoring part {index} of {total} of a larger {language} file ({filename}). The other
+parts are refactored separately and stitched back together, so:
+- keep the names, signatures and behaviour of every top-level definition in this part
+- do not add code that belongs to other parts of the file
+- put any new imports this part needs at the top of your code block
+
+Context from project memory:
+{memory_context}
+
+Module-level context (imports, globals and the other top-level definitions):
+```{language}
+{module_context}
+```
+
+Part to refactor:
+```{language}
+{code}
+```
+
+First explain the changes you are making, then return the complete refactored part
+in a single fenced code block."""
+
+_dotenv_loaded = False
+
+def get_api_key():
+    # Load .env once, on the first call that actually needs the key
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
+    return os.getenv("GEMINI_API_KEY")
+
+def __getattr__(name):
+    # Keep `from waycode.config import GEMINI_API_KEY` working lazily
+    if name == "GEMINI_API_KEY":
+        return get_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
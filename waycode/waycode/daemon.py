@@ -0,0 +1,343 @@
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import error as urlerror
+from urllib import request as urlrequest
+from waycode.utils.profiler import span
+from waycode.config import (
+    DAEMON_STATE_PATH, DAEMON_HOST, DAEMON_PORT, DAEMON_CONNECT_TIMEOUT, DAEMON_DISABLED,
+    GEMINI_MODEL, TEMPERATURE, INDEX_WORKERS, INDEX_BATCH_SIZE
+)
+
+# Operations exposed by `waycode serve`, each a POST /<name> with a JSON body
+ENDPOINTS = ('health', 'refactor', 'index', 'watch', 'search', 'gc')
+
+# Collection names accepted by search, mapped to VectorStore query methods
+SEARCH_COLLECTIONS = {
+    'code': 'search_similar_code',
+    'refactor': 'search_refactor_history',
+    'style': 'search_style_patterns',
+}
+
+class DaemonError(Exception):
+    # Raised by DaemonClient when the daemon rejects or fails a request
+    pass
+
+class ReadWriteLock:
+    # Many concurrent readers or a single writer. Waiting writers block new
+    # readers so a stream of queries cannot starve indexing.
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+    
+    @contextmanager
+    def reading(self):
+        # Shared section for vector store queries
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def writing(self):
+        # Exclusive section for vector store writes
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+def search_results(vector_store, query, collection='code', n_results=5, namespace=None,
+                   language=None, path_prefix=None):
+    # Run a similarity search and flatten the Chroma result into hit dicts.
+    # Namespace, language and path filters apply to code and history only;
+    # style preferences are shared.
+    if collection not in SEARCH_COLLECTIONS:
+        raise ValueError(f"Unknown collection '{collection}'")
+    search = getattr(vector_store, SEARCH_COLLECTIONS[collection])
+    if collection == 'style':
+        result = search(query, n_results)
+    else:
+        result = search(query, n_results, namespace=namespace, language=language,
+                        path_prefix=path_prefix)
+    documents = (result.get('documents') or [[]])[0] or []
+    metadatas = (result.get('metadatas') or [[]])[0] or []
+    distances = (result.get('distances') or [[]])[0] or []
+    return [
+        {
+            'document': doc,
+            'metadata': metadatas[i] if i < len(metadatas) else None,
+            'distance': distances[i] if i < len(distances) else None
+        }
+        for i, doc in enumerate(documents)
+    ]
+
+class DaemonService:
+    # Warm agent, memory and vector store shared by every daemon request.
+    # Queries run concurrently under a read lock; indexing and history
+    # writes are serialized under the write lock.
+    
+    def __init__(self, agent=None):
+        if agent is None:
+            from waycode.refactor_agent import RefactorAgent
+            agent = RefactorAgent(use_cache=False)
+        self.agent = agent
+        self.lock = ReadWriteLock()
+        self.started = time.time()
+        self._response_cache = None
+        # IndexWatchers started by `waycode index --watch`, keyed by path and project
+        self.watchers = {}
+        self._watchers_lock = threading.Lock()
+    
+    def warm(self):
+        # Open the model client and every collection before the first request
+        self.agent.client
+        store = self.agent.memory.vector_store
+        store.code_collection, store.refactor_collection, store.style_collection
+    
+    def health(self):
+        # Liveness probe used by clients to discover the daemon
+        return {'status': 'ok', 'pid': os.getpid(), 'uptime': time.time() - self.started}
+    
+    def search(self, query, collection='code', n_results=5, namespace=None, language=None,
+               path_prefix=None):
+        # Similarity search over one memory collection
+        with self.lock.reading():
+            hits = search_results(self.agent.memory.vector_store, query, collection, n_results,
+                                  namespace, language, path_prefix)
+        return {'results': hits}
+    
+    def index(self, path, recursive=False, workers=INDEX_WORKERS, batch_size=INDEX_BATCH_SIZE,
+              project=None):
+        # Incrementally index a path on the daemon's warm store
+        from waycode.rag.indexer import ProjectIndexer
+        memory = self.agent.memory
+        with self.lock.writing():
+            summary = ProjectIndexer(memory, project=project).index_path(
+                path, recursive, workers=workers, batch_size=batch_size
+            )
+        summary['embedding_stats'] = memory.vector_store.embedding_stats()
+        return summary
+    
+    def watch(self, path, recursive=True, project=None):
+        # Keep a path indexed from now on. Each re-index batch holds the
+        # write lock only while it runs, so queries continue in between.
+        from waycode.rag.indexer import ProjectIndexer
+        from waycode.rag.watcher import IndexWatcher
+        key = (os.path.abspath(path), project)
+        with self._watchers_lock:
+            if key not in self.watchers:
+                indexer = ProjectIndexer(self.agent.memory, project=project)
+                self.watchers[key] = IndexWatcher(indexer, key[0], recursive,
+                                                  lock=self.lock.writing).start()
+            return {'watching': sorted(path for path, _ in self.watchers)}
+    
+    def close(self):
+        # Stop every watcher, letting a running batch finish
+        with self._watchers_lock:
+            for watcher in self.watchers.values():
+                watcher.stop()
+            self.watchers.clear()
+    
+    def gc(self, dry_run=False):
+        # Compact the vector store while no queries are running
+        with self.lock.writing():
+            return self.agent.memory.gc(dry_run=dry_run)
+    
+    def refactor(self, code, language, filename=None, cache=False, diff_mode='unified'):
+        # Same pipeline as RefactorAgent.refactor_code, without printing and
+        # with retrieval and history writes under the store lock
+        agent = self.agent
+        if agent._should_split(code, language):
+            # Large files: segments retrieve context and call the model concurrently
+            from waycode.split_refactor import SplitRefactorer
+            with self.lock.reading():
+                parsed = SplitRefactorer(agent).refactor(code, language, filename)
+            with self.lock.writing():
+                result = agent._finalize(code, language, filename, parsed, False, diff_mode)
+            return {'result': result}
+        
+        with self.lock.reading():
+            prompt = agent._build_prompt(code, language, filename)
+        
+        response_cache = self._cache() if cache else None
+        cache_key = response = None
+        if response_cache:
+            from waycode.utils.response_cache import ResponseCache
+            cache_key = ResponseCache.make_key(prompt, GEMINI_MODEL, TEMPERATURE)
+            response = response_cache.get(cache_key)
+        cached = response is not None
+        
+        if not cached:
+            response = agent.generate(prompt)
+        
+        refactored = agent._parse_refactored_code(response or '')
+        if refactored and response_cache and not cached:
+            response_cache.put(cache_key, response)
+        with self.lock.writing():
+            result = agent._finalize(code, language, filename, refactored, cached, diff_mode)
+        return {'result': result}
+    
+    def _cache(self):
+        # Response cache opened for the first request that asks for it
+        if self._response_cache is None:
+            from waycode.utils.response_cache import ResponseCache
+            self._response_cache = ResponseCache()
+        return self._response_cache
+
+class DaemonServer(ThreadingHTTPServer):
+    # Localhost HTTP front end for a DaemonService. Every request must carry
+    # the token published in the state file, which is readable only by the
+    # user who started the daemon.
+    daemon_threads = True
+    
+    def __init__(self, service, host=DAEMON_HOST, port=DAEMON_PORT, token=None):
+        super().__init__((host, port), _DaemonHandler)
+        self.service = service
+        self.token = token or secrets.token_hex(16)
+    
+    def write_state(self, path=DAEMON_STATE_PATH):
+        # Publish address and token so CLI invocations can find the daemon
+        host, port = self.server_address[:2]
+        state = {'pid': os.getpid(), 'host': host, 'port': port, 'token': self.token}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    
+    def serve(self, state_path=DAEMON_STATE_PATH):
+        # Serve until interrupted, removing the state file on the way out
+        self.write_state(state_path)
+        try:
+            self.serve_forever()
+        finally:
+            self.service.close()
+            self.server_close()
+            self._remove_state(state_path)
+    
+    def _remove_state(self, path):
+        # Delete the state file unless another daemon has replaced it
+        try:
+            with open(path, 'r') as f:
+                if json.load(f).get('token') != self.token:
+                    return
+            os.remove(path)
+        except (OSError, ValueError):
+            pass
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    # Dispatch POST /<endpoint> to the matching DaemonService method
+    
+    def do_POST(self):
+        endpoint = self.path.strip('/')
+        if endpoint not in ENDPOINTS:
+            return self._reply(404, {'error': f"Unknown endpoint '{endpoint}'"})
+        if not secrets.compare_digest(self.headers.get('X-WayCode-Token', ''), self.server.token):
+            return self._reply(403, {'error': 'Invalid token'})
+        
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            result = getattr(self.server.service, endpoint)(**payload)
+        except (TypeError, ValueError) as e:
+            return self._reply(400, {'error': str(e)})
+        except Exception as e:
+            return self._reply(500, {'error': str(e)})
+        self._reply(200, result)
+    
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        # Keep the daemon's terminal quiet; errors are returned to clients
+        pass
+
+class DaemonClient:
+    # Thin JSON-over-HTTP client used by the CLI to forward commands
+    
+    def __init__(self, host, port, token):
+        self.url = f"http://{host}:{port}"
+        self.token = token
+    
+    @classmethod
+    def discover(cls, path=DAEMON_STATE_PATH):
+        # Client for a live daemon, or None when none is running
+        if DAEMON_DISABLED or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+            client = cls(state['host'], state['port'], state['token'])
+            client.health(timeout=DAEMON_CONNECT_TIMEOUT)
+        except (OSError, ValueError, KeyError, DaemonError):
+            return None
+        return client
+    
+    def call(self, endpoint, timeout=None, **payload):
+        # POST a request and return the decoded JSON response
+        req = urlrequest.Request(
+            f"{self.url}/{endpoint}",
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'X-WayCode-Token': self.token}
+        )
+        try:
+            with span(f"daemon.{endpoint}"), urlrequest.urlopen(req, timeout=timeout) as response:
+                return json.loads(response.read())
+        except urlerror.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error')
+            except ValueError:
+                message = None
+            raise DaemonError(message or f"HTTP {e.code}") from None
+    
+    def health(self, timeout=None):
+        return self.call('health', timeout=timeout)
+    
+    def search(self, query, collection='code', n_results=5, namespace=None, language=None,
+               path_prefix=None):
+        return self.call('search', query=query, collection=collection, n_results=n_results,
+                         namespace=namespace, language=language,
+                         path_prefix=path_prefix)['results']
+    
+    def index(self, path, recursive=False, workers=INDEX_WORKERS, batch_size=INDEX_BATCH_SIZE,
+              project=None):
+        return self.call('index', path=path, recursive=recursive, workers=workers,
+                         batch_size=batch_size, project=project)
+    
+    def watch(self, path, recursive=True, project=None):
+        return self.call('watch', path=path, recursive=recursive, project=project)
+    
+    def refactor(self, code, language, filename=None, cache=False, diff_mode='unified'):
+        return self.call('refactor', code=code, language=language, filename=filename,
+                         cache=cache, diff_mode=diff_mode)['result']
+    
+    def gc(self, dry_run=False):
+        return self.call('gc', dry_run=dry_run)
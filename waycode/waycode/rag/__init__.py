@@ -1,7 +1,28 @@
-from .vector_store import VectorStore
-from .embeddings import EmbeddingGenerator
-from .memory_manager import MemoryManager
-from .context_builder import ContextBuilder
-
-# Define public classes for the RAG package
-__all__ = ['VectorStore', 'EmbeddingGenerator', 'MemoryManager', 'ContextBuilder']
+import importlib
+
+# Public classes for the RAG package, mapped to their submodules. They are
+# imported on first access so that loading one submodule (e.g. the manifest)
+# does not pull in chromadb or google.genai.
+_EXPORTS = {
+    'VectorStore': 'vector_store',
+    'ChromaBackend': 'chroma_backend',
+    'FlatBackend': 'flat_index',
+    'EmbeddingGenerator': 'embeddings',
+    'EmbeddingCache': 'embedding_cache',
+    'MemoryManager': 'memory_manager',
+    'ContextBuilder': 'context_builder',
+    'CodeChunker': 'chunker',
+    'IndexManifest': 'manifest',
+    'ProjectIndexer': 'indexer',
+    'HistoryStore': 'history_store',
+    'SymbolIndex': 'symbol_index',
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    # Resolve a public class from its submodule
+    if name in _EXPORTS:
+        module = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
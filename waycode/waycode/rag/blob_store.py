@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from waycode.config import REFACTOR_BLOB_PATH, BLOB_COMPRESSION_LEVEL
+
+class BlobStore:
+    # Content-addressed store for large records that are only read on
+    # demand, such as the full before/after text of a refactoring. Values
+    # are JSON, zlib-compressed into SQLite; storing the same value twice
+    # keeps one copy.
+    
+    def __init__(self, path=REFACTOR_BLOB_PATH, level=BLOB_COMPRESSION_LEVEL):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connection(self):
+        # Open the SQLite database on first use
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL)"
+            )
+        return self._conn
+    
+    def put(self, value):
+        # Store a JSON-serializable value and return its key
+        raw = json.dumps(value, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        key = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO blobs (key, data, size) VALUES (?, ?, ?)",
+                             (key, zlib.compress(raw, self.level), len(raw)))
+        return key
+    
+    def get(self, key):
+        # The value stored under key, or None
+        with self._lock:
+            row = self._connection().execute("SELECT data FROM blobs WHERE key = ?",
+                                             (key,)).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+    
+    def keys(self):
+        # Every stored key
+        with self._lock:
+            return [key for (key,) in self._connection().execute("SELECT key FROM blobs")]
+    
+    def delete(self, keys):
+        # Remove values by key
+        keys = list(keys)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    conn.execute(f"DELETE FROM blobs WHERE key IN ({','.join('?' * len(part))})", part)
+    
+    def stats(self):
+        # Entry count plus stored and uncompressed sizes in bytes
+        with self._lock:
+            entries, stored, raw = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(size), 0) FROM blobs"
+            ).fetchone()
+        return {'entries': entries, 'bytes': stored, 'raw_bytes': raw}
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,112 @@
+import chromadb
+import os
+import threading
+from chromadb.api.types import EmbeddingFunction
+from waycode.config import VECTOR_DB_PATH, EMBEDDING_MODEL
+from waycode.rag.embeddings import EmbeddingGenerator
+
+class GeminiEmbeddingFunction(EmbeddingFunction):
+    # Adapter exposing EmbeddingGenerator as a Chroma embedding function
+    def __init__(self, generator=None):
+        self.generator = generator or EmbeddingGenerator()
+    
+    def __call__(self, input):
+        return self.generator.embed_documents(input)
+    
+    def embed_query(self, input):
+        return self.generator.embed_queries(input)
+    
+    @staticmethod
+    def name():
+        return "waycode_gemini"
+    
+    def get_config(self):
+        return {"model": EMBEDDING_MODEL}
+    
+    @staticmethod
+    def build_from_config(config):
+        return GeminiEmbeddingFunction()
+
+class ChromaBackend:
+    # VectorStore backend on a persistent Chroma client (SQLite + HNSW).
+    # Collections are Chroma's own, so VectorStore calls them directly.
+    name = "chroma"
+    
+    def __init__(self, embedder, path=VECTOR_DB_PATH, client=None):
+        self.embedding_function = GeminiEmbeddingFunction(embedder)
+        self.path = path
+        self._client = client
+        self._lock = threading.Lock()
+    
+    @property
+    def client(self):
+        # Persistent Chroma client, creating the storage directory if missing
+        with self._lock:
+            if self._client is None:
+                os.makedirs(self.path, exist_ok=True)
+                self._client = chromadb.PersistentClient(path=self.path)
+        return self._client
+    
+    def collection(self, name):
+        # Helper to retrieve or initialize a ChromaDB collection
+        client = self.client
+        try:
+            return client.get_or_create_collection(
+                name=name,
+                embedding_function=self.embedding_function,
+                metadata={"hnsw:space": "cosine"}
+            )
+        except ValueError as e:
+            if "embedding function" not in str(e).lower():
+                raise
+            return self._migrate_collection(name, client)
+    
+    def _migrate_collection(self, name, client):
+        # Re-embed a collection created with Chroma's default embedding
+        # function. Entries are re-embedded into a temporary collection that
+        # replaces the legacy one only once every batch is stored, so a
+        # failing embedder (no API key, network, quota) loses nothing.
+        legacy = client.get_collection(name)
+        records = legacy.get(include=["documents", "metadatas"])
+        staging = f"{name}-migrating"
+        self.drop_collection(staging)
+        collection = client.create_collection(
+            name=staging,
+            embedding_function=self.embedding_function,
+            metadata={"hnsw:space": "cosine"}
+        )
+        try:
+            step = self.max_batch_size()
+            for start in range(0, len(records["ids"]), step):
+                collection.add(
+                    ids=records["ids"][start:start + step],
+                    documents=records["documents"][start:start + step],
+                    metadatas=records["metadatas"][start:start + step]
+                )
+        except Exception:
+            self.drop_collection(staging)
+            raise
+        
+        client.delete_collection(name)
+        collection.modify(name=name)
+        return collection
+    
+    def list_collections(self):
+        # Names of every collection in the Chroma database (older clients
+        # return collection objects, newer ones names)
+        return [getattr(c, "name", c) for c in self.client.list_collections()]
+    
+    def drop_collection(self, name):
+        # Delete a collection if it exists (chromadb 0.4 raises ValueError
+        # for a missing one and has no NotFoundError)
+        try:
+            self.client.delete_collection(name)
+        except (ValueError, getattr(chromadb.errors, "NotFoundError", ValueError)):
+            pass
+    
+    def max_batch_size(self):
+        # Largest batch the Chroma client accepts in a single add call
+        try:
+            return self.client.get_max_batch_size()
+        except AttributeError:
+            return 5000
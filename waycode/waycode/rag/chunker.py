@@ -0,0 +1,406 @@
+import ast
+from collections import Counter
+from waycode.utils.js_lexer import JSLexer
+
+MODULE_SYMBOL = '<module>'
+
+# Tokens that may precede a top-level JS/TS declaration
+JS_DECLARATION_PREFIXES = {'export', 'default', 'async', 'declare', 'abstract'}
+# Tokens that may precede a class member name
+JS_MEMBER_MODIFIERS = {
+    'static', 'async', 'get', 'set', 'public', 'private', 'protected',
+    'readonly', 'override', 'abstract', 'declare', '*', '#',
+}
+JS_STATEMENT_KEYWORDS = {'const', 'let', 'var', 'function', 'class', 'export', 'import'}
+
+class CodeChunker:
+    # Split source files into semantic units (functions, classes, methods)
+    # so each unit can be embedded and retrieved on its own.
+    
+    def __init__(self):
+        self.lexer = JSLexer()
+    
+    def chunk(self, code, language):
+        # Return a list of unit dicts covering the interesting parts of a file
+        units = None
+        if language == 'python':
+            units = self._chunk_python(code)
+        elif language in ('javascript', 'typescript'):
+            units = self._chunk_js(code)
+        
+        if not units:
+            # Unsupported or unparseable source is indexed as a single unit
+            if not code.strip():
+                return []
+            units = [self._make_unit(code.splitlines(), MODULE_SYMBOL, 'module',
+                                     1, max(1, len(code.splitlines())))]
+        
+        for unit in units:
+            unit['language'] = language
+        self._dedupe_symbols(units)
+        return units
+    
+    def _make_unit(self, lines, symbol, kind, start, end, skip=None):
+        # Build a unit from a 1-based inclusive line span, minus skipped lines
+        if skip:
+            content = '\n'.join(
+                lines[i - 1] for i in range(start, end + 1) if i not in skip
+            )
+        else:
+            content = '\n'.join(lines[start - 1:end])
+        return {
+            'content': content.strip('\n'),
+            'symbol': symbol,
+            'kind': kind,
+            'start_line': start,
+            'end_line': end,
+        }
+    
+    def _dedupe_symbols(self, units):
+        # Suffix repeated symbol names (overloads, getter/setter pairs)
+        counts = Counter(u['symbol'] for u in units)
+        seen = Counter()
+        for unit in units:
+            if counts[unit['symbol']] > 1:
+                seen[unit['symbol']] += 1
+                if seen[unit['symbol']] > 1:
+                    unit['symbol'] = f"{unit['symbol']}#{seen[unit['symbol']]}"
+    
+    # Python
+    
+    def _chunk_python(self, code):
+        # Use the ast module to find top-level definitions and methods
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            return None
+        
+        lines = code.splitlines()
+        units = []
+        covered = set()
+        
+        for node in tree.body:
+            start, end = self._python_span(node)
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                units.append(self._make_unit(lines, node.name, 'function', start, end))
+                covered.update(range(start, end + 1))
+            elif isinstance(node, ast.ClassDef):
+                units.extend(self._chunk_python_class(lines, node, start, end))
+                covered.update(range(start, end + 1))
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                # Imports carry little meaning on their own
+                covered.update(range(start, end + 1))
+        
+        module_unit = self._remainder_unit(lines, covered)
+        if module_unit:
+            units.insert(0, module_unit)
+        return units
+    
+    def _python_span(self, node):
+        # Line span of a node including its decorators
+        start = node.lineno
+        for decorator in getattr(node, 'decorator_list', []):
+            start = min(start, decorator.lineno)
+        return start, getattr(node, 'end_lineno', None) or node.lineno
+    
+    def _chunk_python_class(self, lines, node, start, end):
+        # Emit one unit per method plus a unit for the rest of the class body
+        methods = []
+        method_lines = set()
+        for child in node.body:
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                m_start, m_end = self._python_span(child)
+                methods.append(self._make_unit(
+                    lines, f"{node.name}.{child.name}", 'method', m_start, m_end
+                ))
+                method_lines.update(range(m_start, m_end + 1))
+        
+        header = self._make_unit(lines, node.name, 'class', start, end, skip=method_lines)
+        return [header] + methods
+    
+    def _remainder_unit(self, lines, covered):
+        # Collect module-level code that is not part of any other unit
+        remaining = [i for i in range(1, len(lines) + 1)
+                     if i not in covered and lines[i - 1].strip()]
+        if not remaining:
+            return None
+        unit = self._make_unit(lines, MODULE_SYMBOL, 'module', remaining[0], remaining[-1])
+        unit['content'] = '\n'.join(lines[i - 1] for i in remaining)
+        return unit
+    
+    # JavaScript / TypeScript
+    
+    def _chunk_js(self, code):
+        # Walk lexer tokens and pick out declarations at the top level
+        tokens = self.lexer.tokenize(code)
+        lines = code.splitlines()
+        units = []
+        covered = set()
+        depth = 0
+        i = 0
+        n = len(tokens)
+        
+        while i < n:
+            tok = tokens[i]
+            if depth == 0 and tok.kind == 'ident':
+                if tok.value == 'import' and i + 1 < n and tokens[i + 1].value not in ('(', '.'):
+                    end = self._skip_import(tokens, i)
+                    covered.update(range(tok.line, tokens[end].end_line + 1))
+                    i = end + 1
+                    continue
+                
+                decl = self._match_js_declaration(tokens, i)
+                if decl:
+                    kind, name, end, body = decl
+                    start_line = tok.line
+                    end_line = tokens[end].end_line
+                    if kind == 'class' and body:
+                        units.extend(self._chunk_js_class(lines, tokens, name, start_line,
+                                                          end_line, body))
+                    else:
+                        units.append(self._make_unit(lines, name, kind, start_line, end_line))
+                    covered.update(range(start_line, end_line + 1))
+                    i = end + 1
+                    continue
+            
+            if tok.kind == 'punct':
+                if tok.value in ('{', '(', '['):
+                    depth += 1
+                elif tok.value in ('}', ')', ']'):
+                    depth = max(0, depth - 1)
+            i += 1
+        
+        module_unit = self._remainder_unit(lines, covered)
+        if module_unit:
+            units.insert(0, module_unit)
+        return units
+    
+    def _skip_import(self, tokens, i):
+        # Return the index of the last token of an import statement
+        n = len(tokens)
+        j = i + 1
+        while j < n:
+            tok = tokens[j]
+            if tok.kind == 'string':
+                if j + 1 < n and tokens[j + 1].value == ';':
+                    return j + 1
+                return j
+            if tok.value == ';':
+                return j
+            j += 1
+        return n - 1
+    
+    def _match_close(self, tokens, i):
+        # Index of the bracket closing the one at position i
+        pairs = {'{': '}', '(': ')', '[': ']'}
+        opener = tokens[i].value
+        closer = pairs[opener]
+        depth = 0
+        for j in range(i, len(tokens)):
+            tok = tokens[j]
+            if tok.kind != 'punct':
+                continue
+            if tok.value == opener:
+                depth += 1
+            elif tok.value == closer:
+                depth -= 1
+                if depth == 0:
+                    return j
+        return len(tokens) - 1
+    
+    def _body_after(self, tokens, j):
+        # From j, find the '{' opening a body, stopping at statement ends
+        n = len(tokens)
+        while j < n:
+            tok = tokens[j]
+            if tok.kind == 'punct':
+                if tok.value == '{':
+                    return j
+                if tok.value in (';', '}'):
+                    return None
+                if tok.value in ('(', '['):
+                    j = self._match_close(tokens, j)
+            j += 1
+        return None
+    
+    def _match_js_declaration(self, tokens, i):
+        # Recognise function, class, interface, enum and arrow declarations
+        n = len(tokens)
+        j = i
+        while j < n and tokens[j].value in JS_DECLARATION_PREFIXES:
+            j += 1
+        if j >= n:
+            return None
+        keyword = tokens[j].value
+        
+        if keyword == 'function':
+            j += 1
+            if j < n and tokens[j].value == '*':
+                j += 1
+            name = 'default'
+            if j < n and tokens[j].kind == 'ident':
+                name = tokens[j].value
+            brace = self._body_after(tokens, j)
+            if brace is None:
+                return None
+            return 'function', name, self._match_close(tokens, brace), None
+        
+        if keyword in ('class', 'interface', 'enum'):
+            j += 1
+            name = 'default'
+            if j < n and tokens[j].kind == 'ident' and tokens[j].value not in ('extends', 'implements'):
+                name = tokens[j].value
+            brace = self._body_after(tokens, j)
+            if brace is None:
+                return None
+            close = self._match_close(tokens, brace)
+            return keyword, name, close, (brace, close) if keyword == 'class' else None
+        
+        if keyword in ('const', 'let', 'var'):
+            if j + 2 >= n or tokens[j + 1].kind != 'ident':
+                return None
+            name = tokens[j + 1].value
+            k = j + 2
+            # Skip a TypeScript type annotation up to '='
+            while k < n and tokens[k].value not in ('=', ';'):
+                if tokens[k].value in ('(', '[', '{'):
+                    k = self._match_close(tokens, k)
+                k += 1
+            if k >= n or tokens[k].value != '=':
+                return None
+            return self._match_js_value(tokens, k + 1, name)
+        
+        return None
+    
+    def _match_js_value(self, tokens, k, name):
+        # Recognise `function`, `class` and arrow-function initialisers
+        n = len(tokens)
+        if k < n and tokens[k].value == 'async':
+            k += 1
+        if k >= n:
+            return None
+        
+        if tokens[k].value == 'function':
+            brace = self._body_after(tokens, k)
+            if brace is None:
+                return None
+            return 'function', name, self._match_close(tokens, brace), None
+        
+        if tokens[k].value == 'class':
+            brace = self._body_after(tokens, k)
+            if brace is None:
+                return None
+            close = self._match_close(tokens, brace)
+            return 'class', name, close, (brace, close)
+        
+        arrow = None
+        if tokens[k].value == '(':
+            close = self._match_close(tokens, k)
+            m = close + 1
+            # Allow a return type annotation before the arrow
+            while m < n and tokens[m].value not in ('=>', ';', '{', '}'):
+                m += 1
+            if m < n and tokens[m].value == '=>':
+                arrow = m
+        elif tokens[k].kind == 'ident' and k + 1 < n and tokens[k + 1].value == '=>':
+            arrow = k + 1
+        
+        if arrow is None or arrow + 1 >= n:
+            return None
+        if tokens[arrow + 1].value == '{':
+            return 'function', name, self._match_close(tokens, arrow + 1), None
+        return 'function', name, self._expression_end(tokens, arrow + 1), None
+    
+    def _expression_end(self, tokens, k):
+        # Last token of an expression-bodied arrow function
+        n = len(tokens)
+        start_line = tokens[k].line
+        last = k
+        while k < n:
+            tok = tokens[k]
+            if tok.value == ';':
+                return k
+            if tok.value in ('}', ')', ']'):
+                return last
+            if tok.line > start_line and tok.value in JS_STATEMENT_KEYWORDS:
+                return last
+            if tok.value in ('(', '[', '{'):
+                k = self._match_close(tokens, k)
+            last = k
+            k += 1
+        return n - 1
+    
+    def _chunk_js_class(self, lines, tokens, class_name, start_line, end_line, body):
+        # Emit one unit per method plus a unit for the rest of the class body
+        open_idx, close_idx = body
+        methods = []
+        method_lines = set()
+        k = open_idx + 1
+        member_start = k
+        
+        while k < close_idx:
+            tok = tokens[k]
+            
+            if tok.value == '@' and k + 1 < close_idx:
+                # Decorators are attached to the member that follows them
+                k += 2
+                if k < close_idx and tokens[k].value == '(':
+                    k = self._match_close(tokens, k) + 1
+                continue
+            
+            if tok.value in (';', '}', ','):
+                k += 1
+                member_start = k
+                continue
+            
+            is_name = tok.kind in ('ident', 'string') and (
+                tok.value not in JS_MEMBER_MODIFIERS
+                or (k + 1 < close_idx and tokens[k + 1].value in ('(', '<', '='))
+            )
+            if is_name:
+                name = tok.value.strip('\'"')
+                nxt = k + 1
+                if nxt < close_idx and tokens[nxt].value == '<':
+                    while nxt < close_idx and tokens[nxt].value != '>':
+                        nxt += 1
+                    nxt += 1
+                end = None
+                if nxt < close_idx and tokens[nxt].value == '(':
+                    brace = self._body_after(tokens, nxt)
+                    if brace is not None and brace < close_idx:
+                        end = self._match_close(tokens, brace)
+                elif nxt < close_idx and tokens[nxt].value == '=':
+                    decl = self._match_js_value(tokens, nxt + 1, name)
+                    if decl and decl[0] == 'function':
+                        end = decl[2]
+                
+                if end is not None:
+                    m_start = tokens[member_start].line
+                    m_end = tokens[end].end_line
+                    methods.append(self._make_unit(
+                        lines, f"{class_name}.{name}", 'method', m_start, m_end
+                    ))
+                    method_lines.update(range(m_start, m_end + 1))
+                    k = end + 1
+                    member_start = k
+                    continue
+                
+                # Field declaration: skip to ';' or the end of its last line
+                while k < close_idx and tokens[k].value != ';':
+                    if tokens[k].value in ('(', '[', '{'):
+                        k = self._match_close(tokens, k)
+                    if k + 1 < close_idx and tokens[k + 1].line > tokens[k].end_line \
+                            and tokens[k].value not in ('=', ',', ':', '=>'):
+                        break
+                    k += 1
+                k += 1
+                member_start = k
+                continue
+            
+            if tok.value in ('(', '[', '{'):
+                k = self._match_close(tokens, k)
+            k += 1
+        
+        header = self._make_unit(lines, class_name, 'class', start_line, end_line,
+                                 skip=method_lines)
+        return [header] + methods
@@ -1,39 +1,199 @@
-class ContextBuilder:
-    def __init__(self, memory_manager):
-        # Initialize with a memory manager for context retrieval
-        self.memory = memory_manager
-    
-    def build_context(self, code, language):
-        # Assemble string of relevant project context for the AI prompt
-        context_parts = []
-        
-        # Retrieve cross-referenced memories from vector store
-        relevant = self.memory.get_relevant_context(code, language)
-        
-        context_parts.append(f"Language: {language}")
-        
-        # Include high-level project patterns
-        if relevant["project_patterns"]:
-            context_parts.append("\nProject Patterns:")
-            for pattern in relevant["project_patterns"]:
-                context_parts.append(f"- {pattern}")
-        
-        # Include similar code snippets from the codebase
-        if relevant["similar_code"]["documents"]:
-            context_parts.append("\nSimilar code in your project:")
-            for i, doc in enumerate(relevant["similar_code"]["documents"][0][:2]):
-                context_parts.append(f"Example {i+1}: {doc[:200]}...")
-        
-        # Include insights from past refactoring operations
-        if relevant["refactor_history"]["documents"]:
-            context_parts.append("\nPrevious refactoring patterns:")
-            for i, doc in enumerate(relevant["refactor_history"]["documents"][0][:2]):
-                context_parts.append(f"- {doc[:150]}...")
-        
-        # Include specific detected coding style preferences
-        if relevant["style_patterns"]["documents"]:
-            context_parts.append("\nYour coding style preferences:")
-            for doc in relevant["style_patterns"]["documents"][0]:
-                context_parts.append(f"- {doc}")
-        
-        return "\n".join(context_parts)
+import re
+from waycode.config import (
+    MAX_CONTEXT_TOKENS, REFACTOR_PROMPT, CONTEXT_TOKEN_BUDGET, CONTEXT_CANDIDATES,
+    CONTEXT_MAX_DISTANCE, CONTEXT_DEDUP_THRESHOLD, LEXICAL_DISTANCE
+)
+from waycode.utils.tokens import estimate_tokens
+from waycode.utils.profiler import span
+
+# Render order and headings of the retrieved sections
+SECTIONS = (
+    ("definition", "\nDefinitions this code uses:"),
+    ("code", "\nSimilar code in your project:"),
+    ("refactor", "\nPrevious refactoring patterns:"),
+    ("style", "\nYour coding style preferences:"),
+)
+
+class ContextBuilder:
+    def __init__(self, memory_manager, token_budget=CONTEXT_TOKEN_BUDGET,
+                 max_distance=CONTEXT_MAX_DISTANCE, n_candidates=CONTEXT_CANDIDATES):
+        # Initialize with a memory manager for context retrieval
+        self.memory = memory_manager
+        self.token_budget = token_budget
+        self.max_distance = max_distance
+        self.n_candidates = n_candidates
+    
+    def build_context(self, code, language, filename=None):
+        # Assemble string of relevant project context for the AI prompt,
+        # packing whole retrieved units into a token budget by relevance.
+        # Definitions the code imports come first; they are exact matches
+        # resolved from the symbol index. filename selects the repository
+        # namespace to retrieve from.
+        with span("context") as stage:
+            context = self._build_context(code, language, filename)
+            stage["tokens_out"] = estimate_tokens(context)
+        return context
+    
+    def _build_context(self, code, language, filename=None):
+        context_parts = []
+        
+        # Retrieve cross-referenced memories from vector store
+        relevant = self.memory.get_relevant_context(code, language, self.n_candidates, filename)
+        with span("context.definitions") as stage:
+            definitions = self.memory.get_definitions(code, language, filename)
+            stage["definitions"] = len(definitions)
+        
+        context_parts.append(f"Language: {language}")
+        
+        # Include high-level project patterns
+        if relevant["project_patterns"]:
+            context_parts.append("\nProject Patterns:")
+            for pattern in relevant["project_patterns"]:
+                context_parts.append(f"- {pattern}")
+        
+        budget = self._budget(code) - estimate_tokens("\n".join(context_parts))
+        with span("context.pack") as stage:
+            candidates = self._definition_candidates(definitions) + self._candidates(relevant, code)
+            selected = self._pack(candidates, budget)
+            stage.update(candidates=len(candidates), selected=len(selected))
+        
+        for section, heading in SECTIONS:
+            entries = [entry for entry in selected if entry["section"] == section]
+            if entries:
+                context_parts.append(heading)
+                context_parts.extend(entry["text"] for entry in entries)
+        
+        return "\n".join(context_parts)
+    
+    def _budget(self, code):
+        # Tokens available for context: the configured budget, capped so the
+        # whole prompt stays within MAX_CONTEXT_TOKENS
+        fixed = estimate_tokens(REFACTOR_PROMPT) + estimate_tokens(code)
+        return max(0, min(self.token_budget, MAX_CONTEXT_TOKENS - fixed))
+    
+    def _candidates(self, relevant, code):
+        # Flatten query results into scored entries, dropping weak matches
+        # and units that are part of the code being refactored
+        target = self._normalize(code)
+        candidates = []
+        
+        sources = (
+            ("code", relevant.get("similar_code")),
+            ("refactor", relevant.get("refactor_history")),
+            ("style", relevant.get("style_patterns")),
+        )
+        for section, result in sources:
+            for doc, metadata, distance in self._rows(result):
+                if not doc or not doc.strip():
+                    continue
+                if distance is None:
+                    # Lexical-only hit: an exact identifier match
+                    distance = LEXICAL_DISTANCE
+                elif distance > self.max_distance:
+                    continue
+                if section == "code" and self._normalize(doc) in target:
+                    continue
+                
+                text = self._format(section, doc, metadata)
+                candidates.append({
+                    "section": section,
+                    "doc": doc,
+                    "text": text,
+                    "distance": distance,
+                    "tokens": estimate_tokens(text)
+                })
+        
+        candidates.sort(key=lambda entry: entry["distance"])
+        return candidates
+    
+    def _definition_candidates(self, definitions):
+        # Resolved definitions as entries ranked ahead of any retrieved unit
+        candidates = []
+        for definition in definitions:
+            doc = definition["signature"]
+            if definition.get("doc"):
+                doc += "\n" + "\n".join("    " + line for line in definition["doc"].splitlines())
+            text = f"Definition{self._describe_unit(definition)}:\n{doc}"
+            candidates.append({
+                "section": "definition",
+                "doc": doc,
+                "text": text,
+                "distance": 0.0,
+                "tokens": estimate_tokens(text)
+            })
+        return candidates
+    
+    def _rows(self, result):
+        # Yield (document, metadata, distance) from a Chroma query result
+        if not result or not result.get("documents"):
+            return
+        documents = result["documents"][0] or []
+        metadatas = (result.get("metadatas") or [[]])[0] or []
+        distances = (result.get("distances") or [[]])[0] or []
+        for i, doc in enumerate(documents):
+            yield (
+                doc,
+                metadatas[i] if i < len(metadatas) else None,
+                distances[i] if i < len(distances) else None
+            )
+    
+    def _pack(self, candidates, budget):
+        # Greedily take whole entries in relevance order while they fit,
+        # skipping near-duplicates of entries already taken
+        selected = []
+        shingles = []
+        remaining = budget
+        
+        for entry in candidates:
+            if entry["tokens"] > remaining:
+                continue
+            entry_shingles = self._shingles(entry["doc"])
+            if any(self._similarity(entry_shingles, other) >= CONTEXT_DEDUP_THRESHOLD
+                   for other in shingles):
+                continue
+            selected.append(entry)
+            shingles.append(entry_shingles)
+            remaining -= entry["tokens"]
+        
+        return selected
+    
+    def _format(self, section, doc, metadata):
+        # Render a single retrieved entry
+        if section == "code":
+            return f"Example{self._describe_unit(metadata)}:\n{doc}"
+        if section == "refactor" and metadata and "hunk" in metadata:
+            return f"Change{self._describe_change(metadata)}:\n{doc}"
+        return f"- {doc}"
+    
+    def _normalize(self, text):
+        # Whitespace-insensitive form used for containment checks
+        return " ".join(text.split())
+    
+    def _shingles(self, text):
+        # Word 3-grams used for near-duplicate detection
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < 3:
+            return {tuple(words)}
+        return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+    
+    def _similarity(self, a, b):
+        # Jaccard similarity of two shingle sets
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+    
+    def _describe_change(self, metadata):
+        # Label a past refactoring hunk with its file, symbol and the first
+        # line of the model's explanation
+        label = metadata.get("filename") or "unknown"
+        if metadata.get("symbol"):
+            label += f"::{metadata['symbol']}"
+        summary = (metadata.get("changes") or "").strip().splitlines()
+        return f" ({label})" + (f" - {summary[0]}" if summary else "")
+    
+    def _describe_unit(self, metadata):
+        # Label a retrieved code unit with its file, symbol and line span
+        if not metadata or "symbol" not in metadata:
+            return ""
+        return (f" ({metadata.get('filename')}::{metadata['symbol']}, "
+                f"lines {metadata.get('start_line')}-{metadata.get('end_line')})")
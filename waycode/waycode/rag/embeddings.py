@@ -1,24 +1,80 @@
-from google import genai
-from waycode.config import GEMINI_API_KEY, EMBEDDING_MODEL
-
-class EmbeddingGenerator:
-    def __init__(self):
-        # Initialize the GenAI client with project configuration
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.model = EMBEDDING_MODEL
-    
-    def generate_embedding(self, text):
-        # Convert text content into vector embeddings for indexing
-        result = self.client.models.embed_content(
-            model=self.model,
-            content=text
-        )
-        return result.embeddings[0].values
-    
-    def generate_query_embedding(self, query):
-        # Convert search queries into vector embeddings for retrieval
-        result = self.client.models.embed_content(
-            model=self.model,
-            content=query
-        )
-        return result.embeddings[0].values
+from google import genai
+from google.genai import types
+from waycode.config import get_api_key, EMBEDDING_MODEL, EMBEDDING_BATCH_SIZE
+from waycode.rag.embedding_cache import EmbeddingCache
+from waycode.utils.profiler import span
+from waycode.utils.tokens import estimate_tokens
+
+class EmbeddingGenerator:
+    def __init__(self, client=None, cache=None, batch_size=EMBEDDING_BATCH_SIZE):
+        # The GenAI client is created on first use unless one is injected
+        self._client = client
+        self.model = EMBEDDING_MODEL
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = batch_size
+    
+    @property
+    def client(self):
+        # GenAI client configured from the environment
+        if self._client is None:
+            self._client = genai.Client(api_key=get_api_key())
+        return self._client
+    
+    def generate_embedding(self, text):
+        # Convert text content into vector embeddings for indexing
+        return self.embed_documents([text])[0]
+    
+    def generate_query_embedding(self, query):
+        # Convert search queries into vector embeddings for retrieval
+        return self.embed_queries([query])[0]
+    
+    def embed_documents(self, texts):
+        # Embed a list of documents, reusing cached vectors where possible
+        return self._embed(list(texts), "RETRIEVAL_DOCUMENT")
+    
+    def embed_queries(self, texts):
+        # Embed a list of search queries, reusing cached vectors where possible
+        return self._embed(list(texts), "RETRIEVAL_QUERY")
+    
+    def cached_documents(self, texts):
+        # Cached document vectors for texts (None where missing), without
+        # calling the API; used to re-score quantized search results
+        cache_model = f"{self.model}:RETRIEVAL_DOCUMENT"
+        keys = [self.cache.key(cache_model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        return [vectors.get(key) for key in keys]
+    
+    def stats(self):
+        # Expose cache hit and miss counters
+        return self.cache.stats()
+    
+    def _embed(self, texts, task_type):
+        # Look up every text in the cache and batch-embed only the misses
+        cache_model = f"{self.model}:{task_type}"
+        keys = [self.cache.key(cache_model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        
+        if missing:
+            missing_keys = list(missing)
+            computed = []
+            for start in range(0, len(missing_keys), self.batch_size):
+                batch = [missing[key] for key in missing_keys[start:start + self.batch_size]]
+                with span("embed.api", texts=len(batch)) as stage:
+                    result = self.client.models.embed_content(
+                        model=self.model,
+                        contents=batch,
+                        config=types.EmbedContentConfig(task_type=task_type)
+                    )
+                    stage["tokens_in"] = sum(estimate_tokens(text) for text in batch)
+                computed.extend(embedding.values for embedding in result.embeddings)
+            
+            new_items = list(zip(missing_keys, computed))
+            self.cache.put_many(new_items)
+            vectors.update(new_items)
+        
+        return [vectors[key] for key in keys]
@@ -0,0 +1,546 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+from waycode.config import (
+    FLAT_INDEX_PATH, FLAT_INDEX_DTYPE, FLAT_INDEX_DIM, FLAT_INDEX_INITIAL_ROWS,
+    FLAT_QUERY_BLOCK_ROWS, FLAT_MAX_BATCH_SIZE, FLAT_RESCORE_FACTOR
+)
+from waycode.rag.quantization import (
+    QUANTIZED_DTYPES, normalize, truncate, quantize, dequantize, top_k
+)
+from waycode.utils.file_lock import FileLock
+
+# SQLite allows at most 999 bound parameters per statement on older builds
+SQL_CHUNK = 500
+
+def _chunks(items):
+    for start in range(0, len(items), SQL_CHUNK):
+        yield items[start:start + SQL_CHUNK]
+
+def _remove(paths):
+    # Delete replaced generation files
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            # Still mapped by a reader on a platform that cannot delete
+            # open files; it only costs disk space
+            pass
+
+class FlatBackend:
+    # VectorStore backend keeping each collection's vectors in a memory-mapped
+    # .npy matrix and ids, documents and metadata in a SQLite sidecar.
+    # Searches are exact (one matrix product and argpartition), which at
+    # tens of thousands of chunks is as fast as an HNSW lookup. Opening only
+    # maps files, and processes share the mapped pages through the OS cache.
+    #
+    # dtype and dim set the layout of new collections: float32, float16 or
+    # int8 vectors, optionally truncated to their leading dim components.
+    # Lossy layouts (int8 or truncated) re-score the top candidates with
+    # full-precision vectors from the embedding cache.
+    name = "flat"
+    
+    def __init__(self, embedder, path=FLAT_INDEX_PATH, dtype=FLAT_INDEX_DTYPE, dim=FLAT_INDEX_DIM,
+                 rescore_factor=FLAT_RESCORE_FACTOR):
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unsupported flat index dtype '{dtype}'")
+        self.embedder = embedder
+        self.path = path
+        self.dtype = dtype
+        self.dim = dim
+        self.rescore_factor = rescore_factor
+        # Serializes writers across threads and processes
+        self.write_lock = FileLock(os.path.join(path, "write.lock"))
+        self._conn = None
+        self._db_lock = threading.RLock()
+    
+    @contextmanager
+    def db(self):
+        # Shared SQLite connection, opened and migrated on first use
+        with self._db_lock:
+            if self._conn is None:
+                os.makedirs(self.path, exist_ok=True)
+                conn = sqlite3.connect(os.path.join(self.path, "metadata.sqlite"),
+                                       check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS collections ("
+                    "name TEXT PRIMARY KEY, dim INTEGER, dtype TEXT NOT NULL, "
+                    "size INTEGER NOT NULL DEFAULT 0, capacity INTEGER NOT NULL DEFAULT 0, "
+                    "generation INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL DEFAULT 0, "
+                    "source_dim INTEGER, dim_limit INTEGER)"
+                )
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(collections)")}
+                for column in ('source_dim', 'dim_limit'):
+                    if column not in columns:
+                        # Indexes written before quantization support
+                        conn.execute(f"ALTER TABLE collections ADD COLUMN {column} INTEGER")
+                conn.execute("UPDATE collections SET source_dim = dim WHERE source_dim IS NULL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                    "id TEXT NOT NULL, row INTEGER NOT NULL, document TEXT, metadata TEXT, "
+                    "filename TEXT, UNIQUE (collection, id), UNIQUE (collection, row))"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_filename "
+                             "ON entries (collection, filename)")
+                conn.commit()
+                self._conn = conn
+            yield self._conn
+    
+    def collection(self, name):
+        # Chroma-compatible handle on one collection
+        return FlatCollection(self, name)
+    
+    def list_collections(self):
+        # Names of every collection created in this index
+        with self.db() as conn:
+            return [name for (name,) in conn.execute("SELECT name FROM collections ORDER BY name")]
+    
+    def drop_collection(self, name):
+        # Delete a collection's entries and vector files
+        self.collection(name).drop()
+    
+    def max_batch_size(self):
+        return FLAT_MAX_BATCH_SIZE
+    
+    def close(self):
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class FlatCollection:
+    # The subset of Chroma's collection API VectorStore uses (add, upsert,
+    # get, delete, query, count) over a FlatBackend. Vector rows freed by
+    # deletes are reused by later writes; growing the matrix or changing
+    # its layout writes a new generation of the .npy files so readers never
+    # see a half-copied one. int8 rows keep a float32 scale each in a
+    # second .npy file.
+    
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+        self._lock = threading.Lock()
+        self._version = None
+        self._generation = None
+        self._vectors = None
+        self._scales = None
+        self._live = np.zeros(0, dtype=bool)
+        self._state = None
+        with backend.db() as conn, conn:
+            conn.execute("INSERT OR IGNORE INTO collections (name, dtype, dim_limit) VALUES (?, ?, ?)",
+                         (name, backend.dtype, backend.dim))
+    
+    def _files(self, generation, dtype):
+        # Matrix file of a generation, plus the scale file for int8
+        base = os.path.join(self.backend.path, f"{self.name}.{generation}")
+        return [f"{base}.npy"] + ([f"{base}.scales.npy"] if dtype == 'int8' else [])
+    
+    def _open_generation(self, generation, dtype):
+        files = self._files(generation, dtype)
+        self._vectors = np.load(files[0], mmap_mode='r+')
+        self._scales = np.load(files[1], mmap_mode='r+') if len(files) > 1 else None
+        self._generation = generation
+    
+    def _create_generation(self, generation, dtype, capacity, dim):
+        files = self._files(generation, dtype)
+        vectors = np.lib.format.open_memmap(files[0], mode='w+', dtype=dtype, shape=(capacity, dim))
+        scales = None
+        if len(files) > 1:
+            scales = np.lib.format.open_memmap(files[1], mode='w+', dtype=np.float32,
+                                               shape=(capacity,))
+        return vectors, scales
+    
+    def _sync(self):
+        # Reload the row mask (and remap the matrix) if another writer,
+        # possibly in another process, changed the collection. Caller holds
+        # self._lock.
+        with self.backend.db() as conn:
+            dim, dtype, size, capacity, generation, version, source_dim, dim_limit = conn.execute(
+                "SELECT dim, dtype, size, capacity, generation, version, source_dim, dim_limit "
+                "FROM collections WHERE name = ?", (self.name,)
+            ).fetchone()
+            self._state = {'dim': dim, 'dtype': dtype, 'size': size, 'capacity': capacity,
+                           'generation': generation, 'source_dim': source_dim,
+                           'dim_limit': dim_limit}
+            if version == self._version:
+                return
+            rows = [r for (r,) in conn.execute(
+                "SELECT row FROM entries WHERE collection = ?", (self.name,))]
+        
+        if not capacity:
+            # Empty, or dropped by another handle
+            self._vectors = self._scales = None
+            self._generation = None
+        elif generation != self._generation:
+            self._open_generation(generation, dtype)
+        live = np.zeros(size, dtype=bool)
+        live[rows] = True
+        self._live = live
+        self._version = version
+    
+    def _reserve(self, size, dim):
+        # Make room for `size` rows, moving to larger files if needed.
+        # Returns the files replaced, to delete once the change is committed.
+        state = self._state
+        if state['capacity'] >= size and self._vectors is not None:
+            return []
+        capacity = max(FLAT_INDEX_INITIAL_ROWS, state['capacity'])
+        while capacity < size:
+            capacity *= 2
+        generation = state['generation'] + 1
+        vectors, scales = self._create_generation(generation, state['dtype'], capacity, dim)
+        used = state['size']
+        if used:
+            vectors[:used] = self._vectors[:used]
+            if scales is not None:
+                scales[:used] = self._scales[:used]
+        replaced = []
+        if self._vectors is not None:
+            replaced = self._files(state['generation'], state['dtype'])
+        self._vectors, self._scales = vectors, scales
+        self._generation = generation
+        state.update(capacity=capacity, generation=generation)
+        return replaced
+    
+    def _reduce(self, vectors):
+        # Bring unit vectors to the stored dimension: full embeddings are
+        # truncated, vectors already at the stored dimension pass through
+        state = self._state
+        if state['source_dim'] is None:
+            state['source_dim'] = vectors.shape[1]
+            state['dim'] = min(state['dim_limit'] or vectors.shape[1], vectors.shape[1])
+        if vectors.shape[1] == state['source_dim']:
+            return truncate(vectors, state['dim'])
+        if vectors.shape[1] == state['dim']:
+            return vectors
+        raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match "
+                         f"collection dimension {state['source_dim']}")
+    
+    def _lossy(self):
+        # Whether stored scores only approximate full-precision cosine
+        # (float16 error is far below ranking noise and is not re-scored)
+        state = self._state
+        return state['dtype'] == 'int8' or (state['dim'] or 0) < (state['source_dim'] or 0)
+    
+    def count(self):
+        # Number of entries
+        with self.backend.db() as conn:
+            return conn.execute("SELECT COUNT(*) FROM entries WHERE collection = ?",
+                                (self.name,)).fetchone()[0]
+    
+    def drop(self):
+        # Remove every entry and the vector files. The row is reset rather
+        # than deleted so other open handles see an empty collection, and
+        # the generation number is kept so their mapped files are never
+        # reused.
+        with self.backend.write_lock, self._lock:
+            self._sync()
+            state = self._state
+            replaced = self._files(state['generation'], state['dtype']) if state['capacity'] else []
+            with self.backend.db() as conn, conn:
+                conn.execute("DELETE FROM entries WHERE collection = ?", (self.name,))
+                conn.execute("UPDATE collections SET size = 0, capacity = 0, dim = NULL, "
+                             "source_dim = NULL, version = version + 1 WHERE name = ?", (self.name,))
+            self._vectors = self._scales = None
+            self._generation = None
+            self._version = None
+        _remove(replaced)
+    
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        self.upsert(ids, documents, metadatas, embeddings)
+    
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        # Insert or replace entries, embedding the documents when no
+        # vectors are given. The last occurrence of a repeated id wins.
+        ids = list(ids)
+        if not ids:
+            return
+        documents = list(documents) if documents is not None else [None] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [None] * len(ids)
+        if embeddings is None:
+            embeddings = self.backend.embedder.embed_documents(documents)
+        vectors = normalize(embeddings)
+        latest = list({entry_id: i for i, entry_id in enumerate(ids)}.values())
+        
+        with self.backend.write_lock, self._lock:
+            self._sync()
+            vectors = self._reduce(vectors)
+            dim = self._state['dim']
+            
+            with self.backend.db() as conn:
+                existing = {}
+                for chunk in _chunks([ids[i] for i in latest]):
+                    existing.update(conn.execute(
+                        f"SELECT id, row FROM entries WHERE collection = ? AND id IN "
+                        f"({','.join('?' * len(chunk))})", [self.name, *chunk]))
+            
+            free = iter(np.flatnonzero(~self._live).tolist())
+            size = self._state['size']
+            rows = []
+            for i in latest:
+                row = existing.get(ids[i])
+                if row is None:
+                    row = next(free, None)
+                    if row is None:
+                        row, size = size, size + 1
+                rows.append(row)
+            
+            replaced = self._reserve(size, dim)
+            codes, scales = quantize(vectors[latest], self._state['dtype'])
+            self._vectors[rows] = codes
+            self._vectors.flush()
+            if scales is not None:
+                self._scales[rows] = scales
+                self._scales.flush()
+            
+            state = self._state
+            with self.backend.db() as conn, conn:
+                conn.executemany(
+                    "INSERT INTO entries (collection, id, row, document, metadata, filename) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (collection, id) DO UPDATE SET "
+                    "document = excluded.document, metadata = excluded.metadata, "
+                    "filename = excluded.filename",
+                    [(self.name, ids[i], row, documents[i], json.dumps(metadatas[i]),
+                      (metadatas[i] or {}).get('filename'))
+                     for i, row in zip(latest, rows)]
+                )
+                conn.execute(
+                    "UPDATE collections SET dim = ?, source_dim = ?, size = ?, capacity = ?, "
+                    "generation = ?, version = version + 1 WHERE name = ?",
+                    (dim, state['source_dim'], size, state['capacity'], state['generation'], self.name)
+                )
+                self._version = conn.execute("SELECT version FROM collections WHERE name = ?",
+                                             (self.name,)).fetchone()[0]
+            
+            live = np.zeros(size, dtype=bool)
+            live[:len(self._live)] = self._live
+            live[rows] = True
+            self._live = live
+            state['size'] = size
+        
+        _remove(replaced)
+    
+    def _where(self, where):
+        # SQL for Chroma-style equality filters on metadata fields
+        clauses, params = [], []
+        for key, value in (where or {}).items():
+            if key.startswith('$') or isinstance(value, dict):
+                raise ValueError("Flat index filters support only field equality")
+            if key == 'filename':
+                clauses.append("filename = ?")
+            else:
+                clauses.append("json_extract(metadata, ?) = ?")
+                params.append(f'$."{key}"')
+            params.append(value)
+        return ''.join(f" AND {c}" for c in clauses), params
+    
+    def _select(self, columns, ids=None, where=None, limit=None, offset=None):
+        # Entry rows in insertion order, optionally filtered
+        sql = f"SELECT {columns} FROM entries WHERE collection = ?"
+        params = [self.name]
+        clause, extra = self._where(where)
+        sql += clause
+        params += extra
+        with self.backend.db() as conn:
+            if ids is not None:
+                rows = []
+                for chunk in _chunks(list(ids)):
+                    rows += conn.execute(
+                        f"{sql} AND id IN ({','.join('?' * len(chunk))}) ORDER BY seq",
+                        params + chunk).fetchall()
+                return rows
+            sql += " ORDER BY seq"
+            if limit is not None or offset:
+                sql += " LIMIT ? OFFSET ?"
+                params += [-1 if limit is None else limit, offset or 0]
+            return conn.execute(sql, params).fetchall()
+    
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None, offset=None):
+        # Entries by id or filter, in insertion order
+        rows = self._select("id, row, document, metadata", ids, where, limit, offset)
+        result = {
+            "ids": [r[0] for r in rows],
+            "documents": [r[2] for r in rows] if "documents" in include else None,
+            "metadatas": [json.loads(r[3]) for r in rows] if "metadatas" in include else None,
+            "embeddings": None
+        }
+        if "embeddings" in include:
+            with self._lock:
+                self._sync()
+                vectors, scales = self._vectors, self._scales
+            stored = [r[1] for r in rows]
+            decoded = dequantize(vectors[stored], scales[stored] if scales is not None else None)
+            result["embeddings"] = list(decoded)
+        return result
+    
+    def delete(self, ids=None, where=None):
+        # Remove entries by id or filter; their vector rows become free
+        if ids is None and not where:
+            raise ValueError("delete needs ids or a where filter")
+        with self.backend.write_lock, self._lock:
+            self._sync()
+            rows = self._select("id, row", ids, where)
+            if not rows:
+                return
+            with self.backend.db() as conn, conn:
+                for chunk in _chunks([r[0] for r in rows]):
+                    conn.execute(
+                        f"DELETE FROM entries WHERE collection = ? AND id IN "
+                        f"({','.join('?' * len(chunk))})", [self.name, *chunk])
+                conn.execute("UPDATE collections SET version = version + 1 WHERE name = ?",
+                             (self.name,))
+                self._version = conn.execute("SELECT version FROM collections WHERE name = ?",
+                                             (self.name,)).fetchone()[0]
+            self._live[[r[1] for r in rows]] = False
+    
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None):
+        # Cosine top-k for each query: the matrix is scored block by block
+        # (stored rows are widened to float32 per block, not all at once),
+        # then lossy layouts re-score a larger candidate pool
+        if query_embeddings is None:
+            query_embeddings = self.backend.embedder.embed_queries(query_texts)
+        queries = normalize(query_embeddings)
+        with self._lock:
+            self._sync()
+            vectors, scales, live = self._vectors, self._scales, self._live.copy()
+            dim, source_dim, lossy = self._state['dim'], self._state['source_dim'], self._lossy()
+        
+        if where:
+            allowed = np.zeros(len(live), dtype=bool)
+            allowed[[r for (r,) in self._select("row", where=where)]] = True
+            live &= allowed
+        k = min(n_results, int(live.sum()))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [],
+                  "embeddings": None}
+        if k <= 0:
+            for key in ("ids", "documents", "metadatas", "distances"):
+                result[key] = [[] for _ in queries]
+            return result
+        if queries.shape[1] == source_dim:
+            reduced = truncate(queries, dim)
+        elif queries.shape[1] == dim:
+            # Already reduced, so there is nothing to re-score against
+            reduced, lossy = queries, False
+        else:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match "
+                             f"collection dimension {source_dim}")
+        
+        size = len(live)
+        scores = np.empty((size, len(queries)), dtype=np.float32)
+        for start in range(0, size, FLAT_QUERY_BLOCK_ROWS):
+            stop = min(size, start + FLAT_QUERY_BLOCK_ROWS)
+            np.matmul(np.asarray(vectors[start:stop], dtype=np.float32), reduced.T,
+                      out=scores[start:stop])
+            if scales is not None:
+                scores[start:stop] *= scales[start:stop, None]
+        scores[~live] = -np.inf
+        
+        pool = min(int(live.sum()), k * self.backend.rescore_factor) if lossy else k
+        for query, column in zip(queries, scores.T):
+            best = top_k(column, pool)
+            with self.backend.db() as conn:
+                entries = {row: (entry_id, document, metadata) for entry_id, row, document, metadata
+                           in conn.execute(
+                               f"SELECT id, row, document, metadata FROM entries WHERE collection = ? "
+                               f"AND row IN ({','.join('?' * len(best))})",
+                               [self.name, *best.tolist()])}
+            # Rows freed by a concurrent delete drop out here
+            best = [row for row in best.tolist() if row in entries]
+            final = {row: float(column[row]) for row in best}
+            if lossy:
+                final.update(self._rescore(best, entries, query))
+                best = sorted(best, key=final.get, reverse=True)[:k]
+            result["ids"].append([entries[row][0] for row in best])
+            result["documents"].append([entries[row][1] for row in best])
+            result["metadatas"].append([json.loads(entries[row][2]) for row in best])
+            result["distances"].append([1.0 - final[row] for row in best])
+        return result
+    
+    def _rescore(self, rows, entries, query):
+        # Full-precision cosine for candidate rows whose document vectors
+        # are in the embedding cache; rows that are not keep their score
+        cached = self.backend.embedder.cached_documents([entries[row][1] or '' for row in rows])
+        found = [(row, vector) for row, vector in zip(rows, cached)
+                 if vector is not None and len(vector) == len(query)]
+        if not found:
+            return {}
+        exact = normalize([vector for _, vector in found]) @ query
+        return {row: float(score) for (row, _), score in zip(found, exact)}
+    
+    def layout(self):
+        # Storage layout and size of the collection
+        with self._lock:
+            self._sync()
+            state = dict(self._state)
+        files = self._files(state['generation'], state['dtype']) if state['capacity'] else []
+        state['bytes'] = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+        state['count'] = int(self._live.sum())
+        return state
+    
+    def reencode(self, dtype, dim=None):
+        # Rewrite every vector in a new layout (dtype, optionally truncated
+        # to dim). Vectors are taken at full precision from the embedding
+        # cache where possible, otherwise decoded from the current layout,
+        # which caps dim at the current stored dimension.
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unsupported flat index dtype '{dtype}'")
+        with self.backend.write_lock, self._lock:
+            self._sync()
+            state = self._state
+            with self.backend.db() as conn:
+                entries = conn.execute("SELECT row, document FROM entries WHERE collection = ? "
+                                       "ORDER BY row", (self.name,)).fetchall()
+            replaced = []
+            from_cache = 0
+            target = dim
+            if entries and state['source_dim']:
+                rows = np.array([row for row, _ in entries])
+                source_dim = state['source_dim']
+                cached = self.backend.embedder.cached_documents([doc or '' for _, doc in entries])
+                hit = [i for i, v in enumerate(cached) if v is not None and len(v) == source_dim]
+                miss = np.setdiff1d(np.arange(len(entries)), hit)
+                target = min(dim or source_dim, source_dim)
+                if len(miss):
+                    target = min(target, state['dim'])
+                
+                vectors = np.empty((len(entries), target), dtype=np.float32)
+                if hit:
+                    vectors[hit] = truncate([cached[i] for i in hit], target)
+                if len(miss):
+                    current = dequantize(self._vectors[rows[miss]], None if self._scales is None
+                                         else self._scales[rows[miss]])
+                    vectors[miss] = truncate(current, target)
+                from_cache = len(hit)
+                
+                generation = state['generation'] + 1
+                new_vectors, new_scales = self._create_generation(
+                    generation, dtype, state['capacity'], target)
+                codes, scales = quantize(vectors, dtype)
+                new_vectors[rows] = codes
+                new_vectors.flush()
+                if new_scales is not None:
+                    new_scales[rows] = scales
+                    new_scales.flush()
+                replaced = self._files(state['generation'], state['dtype'])
+                with self.backend.db() as conn, conn:
+                    conn.execute(
+                        "UPDATE collections SET dtype = ?, dim = ?, dim_limit = ?, generation = ?, "
+                        "version = version + 1 WHERE name = ?",
+                        (dtype, target, dim, generation, self.name))
+            else:
+                # Nothing stored yet: the first write uses the new layout
+                with self.backend.db() as conn, conn:
+                    conn.execute("UPDATE collections SET dtype = ?, dim_limit = ?, "
+                                 "version = version + 1 WHERE name = ?", (dtype, dim, self.name))
+            # Remap on next access
+            self._version = self._generation = None
+            self._vectors = self._scales = None
+        
+        _remove(replaced)
+        return {'collection': self.name, 'count': len(entries), 'dtype': dtype, 'dim': target,
+                'from_cache': from_cache}
@@ -0,0 +1,158 @@
+import json
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from waycode.config import (
+    REFACTOR_HISTORY_PATH, LEGACY_REFACTOR_HISTORY_PATH, HISTORY_MAX_RECORDS,
+    HISTORY_MAX_AGE_DAYS, HISTORY_COMPACT_BYTES
+)
+from waycode.utils.file_lock import FileLock
+
+class HistoryStore:
+    # Append-only JSON Lines log of refactor operations. Appends are O(1),
+    # reads are streamed or paged from the end of the file, and a retention
+    # policy compacts the log once it grows past HISTORY_COMPACT_BYTES.
+    
+    def __init__(self, path=REFACTOR_HISTORY_PATH, legacy_path=LEGACY_REFACTOR_HISTORY_PATH,
+                 max_records=HISTORY_MAX_RECORDS, max_age_days=HISTORY_MAX_AGE_DAYS,
+                 compact_bytes=HISTORY_COMPACT_BYTES):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.max_records = max_records
+        self.max_age_days = max_age_days
+        self.compact_bytes = compact_bytes
+        self.lock = FileLock(f"{path}.lock")
+        self._migrated = False
+        # Size that triggers the next compaction; grows if retention keeps
+        # the log above compact_bytes so appends don't compact every time
+        self._compact_at = compact_bytes
+    
+    def append(self, record):
+        # Add one record and return the bytes written; safe for concurrent
+        # writers in several processes
+        self._migrate()
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        with self.lock:
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            size = os.path.getsize(self.path)
+        
+        if self._compact_at and size > self._compact_at:
+            self.compact()
+            if os.path.exists(self.path):
+                self._compact_at = max(self.compact_bytes, 2 * os.path.getsize(self.path))
+        return len(data)
+    
+    def iter_records(self):
+        # Stream records oldest first without loading the whole file
+        self._migrate()
+        yield from self._read_raw()
+    
+    def iter_recent(self, block_size=65536):
+        # Stream records newest first by reading the file backwards in blocks
+        self._migrate()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b''
+            while position > 0:
+                read = min(block_size, position)
+                position -= read
+                f.seek(position)
+                lines = (f.read(read) + remainder).split(b'\n')
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    record = self._decode(line)
+                    if record is not None:
+                        yield record
+            record = self._decode(remainder)
+            if record is not None:
+                yield record
+    
+    def page(self, offset=0, limit=20):
+        # Return a page of records, newest first
+        records = []
+        for i, record in enumerate(self.iter_recent()):
+            if i >= offset + limit:
+                break
+            if i >= offset:
+                records.append(record)
+        return records
+    
+    def compact(self):
+        # Apply the retention policy: drop records older than max_age_days
+        # and keep at most max_records of the newest ones
+        self._migrate()
+        cutoff = None
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+        
+        with self.lock:
+            if not os.path.exists(self.path):
+                return 0
+            kept = deque(maxlen=self.max_records or None)
+            total = 0
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    record = self._decode(line)
+                    if record is None:
+                        continue
+                    total += 1
+                    if cutoff and record.get("timestamp", cutoff) < cutoff:
+                        continue
+                    kept.append(record)
+            
+            self._write_all(kept)
+            return total - len(kept)
+    
+    def _write_all(self, records):
+        # Atomically replace the log with the given records
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+    
+    def _migrate(self):
+        # Convert a legacy refactor_history.json array into the JSONL log once
+        if self._migrated:
+            return
+        self._migrated = True
+        if not self.legacy_path or not os.path.exists(self.legacy_path):
+            return
+        
+        with self.lock:
+            if not os.path.exists(self.legacy_path):
+                return
+            try:
+                with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except (ValueError, OSError):
+                return
+            
+            existing = list(self._read_raw())
+            self._write_all(list(legacy) + existing)
+            os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+    
+    def _read_raw(self):
+        # Records currently in the log, without triggering migration
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = self._decode(line)
+                if record is not None:
+                    yield record
+    
+    def _decode(self, line):
+        # Parse one log line, skipping blanks and torn writes
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
@@ -0,0 +1,176 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from waycode.config import INDEXED_EXTENSIONS, INDEX_WORKERS, INDEX_BATCH_SIZE
+from waycode.rag.manifest import IndexManifest
+from waycode.utils.code_analyzer import CodeAnalyzer
+from waycode.utils.profiler import span
+
+class UnitBatcher:
+    # Accumulate prepared code units and write them to the store in bulk
+    
+    def __init__(self, memory, batch_size=INDEX_BATCH_SIZE):
+        self.memory = memory
+        self.batch_size = max(1, batch_size)
+        self.documents = []
+        self.metadatas = []
+    
+    def add(self, documents, metadatas):
+        # Queue units, flushing every time a full batch is available
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+        while len(self.documents) >= self.batch_size:
+            self._write(self.batch_size)
+    
+    def flush(self):
+        # Write whatever is still queued
+        if self.documents:
+            self._write(len(self.documents))
+    
+    def _write(self, count):
+        self.memory.add_code_units(self.documents[:count], self.metadatas[:count])
+        del self.documents[:count]
+        del self.metadatas[:count]
+
+class ProjectIndexer:
+    # Incrementally index a directory: only new or modified files are
+    # re-embedded and entries for changed or removed files are purged.
+    # Files are discovered lazily, read and chunked on a thread pool, and
+    # their units are written to the store in batches. A modified file
+    # only rewrites the units that changed, and a file whose namespace
+    # changed (e.g. indexed again with --project) is moved. Every written
+    # file also replaces its definitions and imports in the symbol index.
+    
+    def __init__(self, memory, manifest=None, project=None):
+        self.memory = memory
+        self.manifest = manifest or IndexManifest()
+        # Namespace override (None: each file's git repository)
+        self.project = project
+        self.analyzer = CodeAnalyzer()
+    
+    def discover(self, path, recursive=False):
+        # Yield absolute paths of indexable files under path
+        path_obj = Path(path)
+        if path_obj.is_file():
+            candidates = [path_obj]
+        else:
+            candidates = path_obj.glob('**/*' if recursive else '*')
+        
+        for file_path in candidates:
+            if file_path.is_file() and file_path.suffix in INDEXED_EXTENSIONS:
+                yield os.path.abspath(str(file_path))
+    
+    def index_path(self, path, recursive=False, workers=INDEX_WORKERS,
+                   batch_size=INDEX_BATCH_SIZE, on_file=None):
+        # Index a file or directory and return counts per outcome and timing
+        def deleted(seen):
+            # Files that disappeared since the last run
+            return [p for p in self.manifest.files_under(path, recursive) if p not in seen]
+        return self._index(self.discover(path, recursive), deleted, workers, batch_size, on_file)
+    
+    def index_files(self, paths, workers=INDEX_WORKERS, batch_size=INDEX_BATCH_SIZE,
+                    on_file=None):
+        # Index an explicit set of changed paths (see IndexWatcher): existing
+        # files are indexed like index_path does, recorded ones that no
+        # longer exist are purged
+        paths = [os.path.abspath(p) for p in paths]
+        files = [p for p in paths if os.path.isfile(p) and os.path.splitext(p)[1] in INDEXED_EXTENSIONS]
+        
+        def deleted(seen):
+            return [p for p in paths if p not in seen and p in self.manifest.entries]
+        return self._index(files, deleted, workers, batch_size, on_file)
+    
+    def _index(self, files, find_deleted, workers, batch_size, on_file):
+        # Index files, then purge the paths find_deleted(seen) returns
+        started = time.perf_counter()
+        summary = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0, "chunks": 0,
+                   "symbols": 0}
+        seen = set()
+        batcher = UnitBatcher(self.memory, batch_size)
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for result in self._prepare_all(pool, files, max(1, workers)):
+                seen.add(result["filepath"])
+                self._apply(result, batcher, summary, on_file)
+        
+        batcher.flush()
+        
+        for filepath in find_deleted(seen):
+            self.memory.remove_file(filepath, self.manifest.namespace_of(filepath))
+            self.manifest.remove(filepath)
+            summary["deleted"] += 1
+            if on_file:
+                on_file(filepath, "deleted")
+        
+        # Persist once per run rather than once per file
+        with span("index.persist"):
+            self.memory.persist()
+            self.manifest.save()
+        
+        summary["files"] = summary["added"] + summary["updated"]
+        summary["elapsed"] = time.perf_counter() - started
+        return summary
+    
+    def _apply(self, result, batcher, summary, on_file):
+        # Write one prepared file to the stores and the manifest
+        filepath = result["filepath"]
+        if result["status"] == "unchanged":
+            summary["unchanged"] += 1
+            return
+        
+        prepared = result["prepared"]
+        summary["symbols"] += len(prepared["symbols"]["symbols"])
+        self.memory.record_symbols(filepath, prepared)
+        if result["status"] == "backfill":
+            # Indexed before the lexical or symbol index existed; vectors are current
+            self.memory.lexical.add_units(prepared["documents"], prepared["metadatas"])
+            summary["unchanged"] += 1
+            return
+        
+        if result["status"] == "modified":
+            # Rewrite only the units that changed; unchanged ones keep their vectors
+            summary["chunks"] += self.memory.update_file(filepath, prepared)
+        else:
+            if result["status"] == "moved":
+                # Drop the units from the namespace the file was indexed into
+                self.memory.remove_file(filepath, self.manifest.namespace_of(filepath))
+            batcher.add(prepared["documents"], prepared["metadatas"])
+            summary["chunks"] += len(prepared["documents"])
+        self.memory.record_patterns(prepared["patterns"], result["language"])
+        self.manifest.update(filepath, dict(result["record"], namespace=prepared["namespace"]))
+        
+        summary["added" if result["status"] == "new" else "updated"] += 1
+        if on_file:
+            on_file(filepath, result["status"])
+    
+    def _prepare_all(self, pool, files, workers):
+        # Run _prepare on the pool with a bounded number of files in flight
+        pending = deque()
+        for filepath in files:
+            pending.append(pool.submit(self._prepare, filepath))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    
+    def _prepare(self, filepath):
+        # Worker stage: fingerprint, read and chunk a single file
+        with span("index.prepare"):
+            status, code, record = self.manifest.check(filepath)
+            namespace = self.memory.namespace_for(filepath, self.project)
+            if status != "new" and namespace != self.manifest.namespace_of(filepath):
+                status = "moved"
+            elif status == "unchanged" and not (self.memory.lexical.has_file(filepath, namespace) and
+                                                self.memory.symbols.has_file(filepath, namespace)):
+                status = "backfill"
+            if code is None and status != "unchanged":
+                with open(filepath, 'rb') as f:
+                    code = f.read().decode('utf-8', errors='replace')
+            result = {"filepath": filepath, "status": status, "record": record}
+            if status != "unchanged":
+                result["language"] = self.analyzer.detect_language(filepath)
+                result["prepared"] = self.memory.prepare_file(filepath, code, result["language"],
+                                                              namespace)
+        return result
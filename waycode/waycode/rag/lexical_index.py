@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from waycode.config import LEXICAL_INDEX_PATH, LEXICAL_QUERY_TERMS, RRF_K
+from waycode.rag.namespaces import DEFAULT_NAMESPACE, prefix_directory
+from waycode.utils.profiler import span
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_$][A-Za-z0-9_$]*')
+# Boundaries inside camelCase / PascalCase / ACRONYMWords identifiers
+CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+# Keywords and ubiquitous names that say nothing about which unit is relevant
+STOPWORDS = {
+    'def', 'class', 'return', 'if', 'else', 'elif', 'for', 'while', 'in', 'is', 'not', 'and',
+    'or', 'import', 'from', 'as', 'with', 'try', 'except', 'finally', 'raise', 'pass', 'self',
+    'none', 'true', 'false', 'lambda', 'yield', 'async', 'await', 'const', 'let', 'var',
+    'function', 'new', 'this', 'null', 'undefined', 'export', 'default', 'extends', 'static',
+    'public', 'private', 'protected', 'typeof', 'instanceof', 'void', 'break', 'continue',
+    'switch', 'case', 'catch', 'throw', 'str', 'int', 'string', 'number', 'boolean', 'any',
+}
+
+def identifier_terms(text):
+    # Search terms of a piece of code: every identifier in lower case plus
+    # its snake_case and camelCase parts, without keywords
+    terms = []
+    for identifier in IDENTIFIER_RE.findall(text):
+        lowered = identifier.lower()
+        if lowered in STOPWORDS or len(lowered) < 2:
+            continue
+        terms.append(lowered)
+        parts = [p.lower() for piece in identifier.split('_') for p in CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if len(p) > 1 and p not in STOPWORDS)
+    return terms
+
+def unit_key(document, metadata):
+    # Identity of a code unit shared by lexical and vector results
+    metadata = metadata or {}
+    return (metadata.get('filename'), metadata.get('symbol'), document)
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    # Merge ranked key lists: each list contributes 1 / (k + rank) per key.
+    # Returns [(key, score)] best first.
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndex:
+    # Local inverted index over the identifiers of indexed code units,
+    # kept in SQLite FTS5 next to the vector store and ranked with BM25.
+    # Queries never leave the machine. If the SQLite build lacks FTS5 the
+    # index stays empty and retrieval falls back to vectors alone. Units
+    # carry their repository namespace; rows written before namespaces
+    # existed belong to the default one.
+    
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        self.available = True
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connection(self):
+        # Open the database and create the tables on first use
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS units ("
+                "id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, filename TEXT, "
+                "language TEXT, document TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            if 'namespace' not in {row[1] for row in conn.execute("PRAGMA table_info(units)")}:
+                conn.execute("ALTER TABLE units ADD COLUMN namespace TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS units_filename ON units (filename)")
+            try:
+                conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS units_fts USING fts5("
+                    "symbol, terms, tokenize=\"unicode61 tokenchars '_$'\")"
+                )
+            except sqlite3.OperationalError:
+                self.available = False
+            self._conn = conn
+        return self._conn
+    
+    def add_units(self, documents, metadatas):
+        # Index code units; units already present are left as they are
+        with self._lock, span("lexical.add") as stage:
+            conn = self._connection()
+            if not self.available:
+                return
+            added = 0
+            with conn:
+                for document, metadata in zip(documents, metadatas):
+                    metadata = metadata or {}
+                    namespace = metadata.get('namespace') or DEFAULT_NAMESPACE
+                    key = json.dumps(unit_key(document, metadata))
+                    if namespace != DEFAULT_NAMESPACE:
+                        key = json.dumps([namespace, key])
+                    key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO units (key, filename, language, document, metadata, "
+                        "namespace) VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, metadata.get('filename'), metadata.get('language'), document,
+                         json.dumps(metadata), namespace)
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    symbol = metadata.get('symbol') or ''
+                    conn.execute(
+                        "INSERT INTO units_fts (rowid, symbol, terms) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, ' '.join(identifier_terms(symbol)),
+                         ' '.join(identifier_terms(document)))
+                    )
+                    added += 1
+            stage["units"] = added
+    
+    def _delete(self, condition, params):
+        # Drop the units matching an SQL condition on the units table
+        with self._lock:
+            conn = self._connection()
+            if not self.available:
+                return
+            with conn:
+                conn.execute(f"DELETE FROM units_fts WHERE rowid IN "
+                             f"(SELECT id FROM units WHERE {condition})", params)
+                conn.execute(f"DELETE FROM units WHERE {condition}", params)
+    
+    def delete_file(self, filename, namespace=None):
+        # Drop every unit of a file in a namespace
+        self._delete("filename = ? AND COALESCE(namespace, ?) = ?",
+                     (filename, DEFAULT_NAMESPACE, namespace or DEFAULT_NAMESPACE))
+    
+    def drop_namespace(self, namespace):
+        # Drop every unit of a namespace
+        self._delete("COALESCE(namespace, ?) = ?", (DEFAULT_NAMESPACE, namespace))
+    
+    def has_file(self, filename, namespace=None):
+        # True when the file has at least one indexed unit in the namespace
+        # (always True without FTS5, so indexing never tries to backfill)
+        with self._lock:
+            conn = self._connection()
+            if not self.available:
+                return True
+            return conn.execute(
+                "SELECT 1 FROM units WHERE filename = ? AND COALESCE(namespace, ?) = ? LIMIT 1",
+                (filename, DEFAULT_NAMESPACE, namespace or DEFAULT_NAMESPACE)
+            ).fetchone() is not None
+    
+    def count(self, namespace=None):
+        # Number of indexed units, in one namespace or overall
+        with self._lock:
+            conn = self._connection()
+            if namespace is None:
+                return conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM units WHERE COALESCE(namespace, ?) = ?",
+                                (DEFAULT_NAMESPACE, namespace)).fetchone()[0]
+    
+    def search(self, code, n_results=3, language=None, namespace=None, path_prefix=None):
+        # BM25 search for units sharing identifiers with code, optionally
+        # limited to a namespace, language and filename prefix. Returns hit
+        # dicts (document, metadata, score, symbol_match), best first.
+        counts = Counter(identifier_terms(code))
+        if not counts:
+            return []
+        terms = [term for term, _ in counts.most_common(LEXICAL_QUERY_TERMS)]
+        query = ' OR '.join('"' + term.replace('"', '') + '"' for term in terms)
+        
+        with self._lock, span("lexical.search") as stage:
+            conn = self._connection()
+            if not self.available:
+                return []
+            sql = ("SELECT units.document, units.metadata, bm25(units_fts, 4.0, 1.0) AS rank "
+                   "FROM units_fts JOIN units ON units.id = units_fts.rowid "
+                   "WHERE units_fts MATCH ?")
+            params = [query]
+            if language:
+                sql += " AND units.language = ?"
+                params.append(language)
+            if namespace:
+                sql += " AND COALESCE(units.namespace, ?) = ?"
+                params.extend([DEFAULT_NAMESPACE, namespace])
+            if path_prefix:
+                directory = prefix_directory(path_prefix)
+                sql += " AND (units.filename = ? OR substr(units.filename, 1, length(?)) = ?)"
+                params.extend([path_prefix, directory, directory])
+            sql += " ORDER BY rank LIMIT ?"
+            params.append(n_results)
+            rows = conn.execute(sql, params).fetchall()
+            stage["results"] = len(rows)
+        
+        query_identifiers = set(counts)
+        hits = []
+        for document, metadata, rank in rows:
+            metadata = json.loads(metadata)
+            name = (metadata.get('symbol') or '').rsplit('.', 1)[-1].lower()
+            hits.append({
+                'document': document,
+                'metadata': metadata,
+                'score': -rank,
+                # The unit defines a name the query code uses
+                'symbol_match': name in query_identifiers
+            })
+        return hits
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
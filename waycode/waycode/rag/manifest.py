@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from waycode.config import INDEX_MANIFEST_PATH
+from waycode.rag.namespaces import DEFAULT_NAMESPACE
+
+class IndexManifest:
+    # Persistent record of indexed files (size, mtime, content hash) used to
+    # skip unchanged files and find stale entries on re-index. Records also
+    # hold the namespace the file was indexed into (missing for files
+    # indexed before namespaces existed, which live in the default one).
+    
+    def __init__(self, path=INDEX_MANIFEST_PATH):
+        self.path = path
+        self.entries = self._load()
+    
+    def _load(self):
+        # Load the manifest from disk, tolerating a missing or corrupt file
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f).get("files", {})
+            except (ValueError, OSError):
+                return {}
+        return {}
+    
+    def save(self):
+        # Atomically persist the manifest to disk
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "files": self.entries}, f)
+        os.replace(tmp_path, self.path)
+    
+    @staticmethod
+    def content_hash(data):
+        # Hash raw file bytes
+        return hashlib.sha256(data).hexdigest()
+    
+    def check(self, filepath):
+        # Classify a file as 'new', 'modified' or 'unchanged'.
+        # Returns (status, code, record); code is None when unchanged.
+        stat = os.stat(filepath)
+        entry = self.entries.get(filepath)
+        
+        # Fast path: identical size and mtime means the file was not touched
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return "unchanged", None, entry
+        
+        with open(filepath, 'rb') as f:
+            data = f.read()
+        record = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": self.content_hash(data)
+        }
+        
+        if entry and entry["hash"] == record["hash"]:
+            # Touched but not edited; refresh the stat fields only
+            if "namespace" in entry:
+                record["namespace"] = entry["namespace"]
+            self.entries[filepath] = record
+            return "unchanged", None, record
+        
+        status = "modified" if entry else "new"
+        return status, data.decode('utf-8', errors='replace'), record
+    
+    def update(self, filepath, record):
+        # Record a successfully indexed file
+        self.entries[filepath] = record
+    
+    def remove(self, filepath):
+        # Forget a file that no longer exists
+        self.entries.pop(filepath, None)
+    
+    def namespace_of(self, filepath):
+        # Namespace a recorded file was indexed into
+        return (self.entries.get(filepath) or {}).get("namespace", DEFAULT_NAMESPACE)
+    
+    def namespaces(self):
+        # {namespace: number of recorded files}
+        return dict(Counter(entry.get("namespace", DEFAULT_NAMESPACE)
+                            for entry in self.entries.values()))
+    
+    def remove_namespace(self, namespace):
+        # Forget every file of a namespace; returns how many were recorded
+        paths = [path for path in self.entries if self.namespace_of(path) == namespace]
+        for path in paths:
+            del self.entries[path]
+        return len(paths)
+    
+    def files_under(self, root, recursive=True):
+        # Manifest paths inside root (direct children only when not recursive)
+        root = os.path.abspath(root)
+        if os.path.isfile(root):
+            return [root] if root in self.entries else []
+        prefix = root.rstrip(os.sep) + os.sep
+        return [
+            path for path in self.entries
+            if path.startswith(prefix)
+            and (recursive or os.path.dirname(path) == root.rstrip(os.sep))
+        ]
@@ -1,115 +1,333 @@
-import json
-import os
-from datetime import datetime
-from waycode.rag.vector_store import VectorStore
-from waycode.config import PROJECT_MEMORY_PATH, REFACTOR_HISTORY_PATH
-
-class MemoryManager:
-    def __init__(self):
-        # Initialize storage engines and load persistent data
-        self.vector_store = VectorStore()
-        self.project_memory = self._load_project_memory()
-        self.refactor_history = self._load_refactor_history()
-    
-    def _load_project_memory(self):
-        # Load project-wide patterns and styles from JSON
-        if os.path.exists(PROJECT_MEMORY_PATH):
-            with open(PROJECT_MEMORY_PATH, 'r') as f:
-                return json.load(f)
-        return {
-            "style_preferences": {},
-            "common_patterns": [],
-            "dependencies": [],
-            "architecture": {}
-        }
-    
-    def _load_refactor_history(self):
-        # Load transformation history logs
-        if os.path.exists(REFACTOR_HISTORY_PATH):
-            with open(REFACTOR_HISTORY_PATH, 'r') as f:
-                return json.load(f)
-        return []
-    
-    def _save_project_memory(self):
-        # Persist project patterns to disk
-        os.makedirs(os.path.dirname(PROJECT_MEMORY_PATH), exist_ok=True)
-        with open(PROJECT_MEMORY_PATH, 'w') as f:
-            json.dump(self.project_memory, f, indent=2)
-    
-    def _save_refactor_history(self):
-        # Persist refactoring logs to disk
-        os.makedirs(os.path.dirname(REFACTOR_HISTORY_PATH), exist_ok=True)
-        with open(REFACTOR_HISTORY_PATH, 'w') as f:
-            json.dump(self.refactor_history, f, indent=2)
-    
-    def index_file(self, filepath, code, language):
-        # Add file content to vector search and extract coding patterns
-        metadata = {
-            "filename": filepath,
-            "language": language,
-            "indexed_at": datetime.now().isoformat()
-        }
-        
-        self.vector_store.add_code_pattern(code, metadata)
-        self._extract_patterns(code, language)
-    
-    def store_refactoring(self, original, refactored, language, filename, changes):
-        # Log successful refactors to vector store and history file
-        metadata = {
-            "language": language,
-            "filename": filename,
-            "timestamp": datetime.now().isoformat(),
-            "changes": changes
-        }
-        
-        self.vector_store.add_refactoring(original, refactored, metadata)
-        
-        self.refactor_history.append({
-            "filename": filename,
-            "language": language,
-            "timestamp": metadata["timestamp"],
-            "changes_summary": changes[:200]
-        })
-        
-        self._save_refactor_history()
-    
-    def _extract_patterns(self, code, language):
-        # Analyze code for preferred syntax and architectural patterns
-        patterns = []
-        
-        # Detect concurrency preferences
-        if 'async' in code and 'await' in code:
-            patterns.append("prefers_async_await")
-        
-        # Detect JS/TS specific component styles
-        if language in ('javascript', 'typescript'):
-            if 'const ' in code and '=>' in code:
-                patterns.append("prefers_functional_components")
-            if 'class ' in code and 'extends' in code:
-                patterns.append("uses_class_components")
-            if 'const ' in code or 'let ' in code:
-                patterns.append("modern_js_syntax")
-        
-        # Update project memory and vector style store
-        for pattern in patterns:
-            if pattern not in self.project_memory["common_patterns"]:
-                self.project_memory["common_patterns"].append(pattern)
-                self.vector_store.add_style_preference(
-                    pattern,
-                    {"language": language, "type": "syntax_preference"}
-                )
-        
-        self._save_project_memory()
-    
-    def get_relevant_context(self, code, language, n_results=3):
-        # Retrieve cross-referenced context for RAG-based refactoring
-        similar_code = self.vector_store.search_similar_code(code, n_results)
-        similar_refactors = self.vector_store.search_refactor_history(code, n_results)
-        styles = self.vector_store.search_style_patterns(code, n_results)
-        
-        return {
-            "similar_code": similar_code,
-            "refactor_history": similar_refactors,
-            "style_patterns": styles,
-            "project_patterns": self.project_memory["common_patterns"]
-        }
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from waycode.rag.chunker import CodeChunker
+from waycode.rag.history_store import HistoryStore
+from waycode.rag.lexical_index import LexicalIndex, reciprocal_rank_fusion, unit_key
+from waycode.rag.namespaces import DEFAULT_NAMESPACE, resolve_namespace
+from waycode.rag.symbol_index import SymbolIndex, extract_symbols
+from waycode.utils.profiler import span
+from waycode.config import (
+    PROJECT_MEMORY_PATH, QUERY_CACHE_SIZE, RETRIEVAL_MODE, RETRIEVAL_MODES, LEXICAL_SUFFICIENT_HITS
+)
+from waycode.utils.tokens import estimate_tokens
+
+class MemoryManager:
+    # Code units and refactorings are stored per repository namespace
+    # (an explicit project name, else the file's git repository), so
+    # retrieval for one repository never returns another's code. Style
+    # preferences and project patterns are shared. Indexed files also feed
+    # a symbol index, which resolves the definitions code imports.
+    
+    def __init__(self, retrieval_mode=None, project=None):
+        # Initialize storage engines and load persistent data
+        self.retrieval_mode = retrieval_mode or RETRIEVAL_MODE
+        self.project = project
+        if self.retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{self.retrieval_mode}'")
+        self._vector_store = None
+        self._vector_store_lock = threading.Lock()
+        self.lexical = LexicalIndex()
+        self.symbols = SymbolIndex()
+        self.chunker = CodeChunker()
+        self.project_memory = self._load_project_memory()
+        self.history = HistoryStore()
+        
+        # Per-session cache of query embeddings keyed by code hash
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._query_pool = None
+    
+    @property
+    def vector_store(self):
+        # Chroma-backed store, imported and opened only when first needed
+        with self._vector_store_lock:
+            if self._vector_store is None:
+                from waycode.rag.vector_store import VectorStore
+                self._vector_store = VectorStore()
+        return self._vector_store
+    
+    def _load_project_memory(self):
+        # Load project-wide patterns and styles from JSON
+        if os.path.exists(PROJECT_MEMORY_PATH):
+            with open(PROJECT_MEMORY_PATH, 'r') as f:
+                return json.load(f)
+        return {
+            "style_preferences": {},
+            "common_patterns": [],
+            "dependencies": [],
+            "architecture": {}
+        }
+    
+    def _save_project_memory(self):
+        # Persist project patterns to disk
+        os.makedirs(os.path.dirname(PROJECT_MEMORY_PATH), exist_ok=True)
+        with open(PROJECT_MEMORY_PATH, 'w') as f:
+            json.dump(self.project_memory, f, indent=2)
+    
+    def namespace_for(self, path=None, project=None):
+        # Namespace of a file or directory (the working directory if none)
+        return resolve_namespace(path or os.getcwd(), project or self.project)
+    
+    @property
+    def refactor_history(self):
+        # Full refactor log, oldest first (prefer history.page() for large logs)
+        return list(self.history.iter_records())
+    
+    def index_file(self, filepath, code, language):
+        # Split file into semantic units and add each to vector search
+        prepared = self.prepare_file(filepath, code, language)
+        self.add_code_units(prepared["documents"], prepared["metadatas"])
+        self.record_symbols(filepath, prepared)
+        self.record_patterns(prepared["patterns"], language)
+        self.persist()
+    
+    def prepare_file(self, filepath, code, language, namespace=None):
+        # Chunk a file and extract its symbols and patterns without touching
+        # any store, so it can run on indexing worker threads
+        indexed_at = datetime.now().isoformat()
+        units = self.chunker.chunk(code, language)
+        namespace = namespace or self.namespace_for(filepath)
+        
+        metadatas = [{
+            "filename": filepath,
+            "namespace": namespace,
+            "language": language,
+            "symbol": unit["symbol"],
+            "kind": unit["kind"],
+            "start_line": unit["start_line"],
+            "end_line": unit["end_line"],
+            "indexed_at": indexed_at
+        } for unit in units]
+        
+        return {
+            "namespace": namespace,
+            "documents": [unit["content"] for unit in units],
+            "metadatas": metadatas,
+            "symbols": extract_symbols(code, language, filepath, units),
+            "patterns": self.detect_patterns(code, language)
+        }
+    
+    def add_code_units(self, documents, metadatas):
+        # Bulk-add prepared code units to vector and lexical search, one
+        # vector collection per namespace found in the metadata
+        groups = {}
+        for document, metadata in zip(documents, metadatas):
+            namespace = metadata.get("namespace") or DEFAULT_NAMESPACE
+            group = groups.setdefault(namespace, ([], []))
+            group[0].append(document)
+            group[1].append(metadata)
+        for namespace, (group_documents, group_metadatas) in groups.items():
+            self.vector_store.add_code_patterns(group_documents, group_metadatas, namespace)
+        self.lexical.add_units(documents, metadatas)
+    
+    def record_symbols(self, filepath, prepared):
+        # Replace a file's definitions and imports in the symbol index
+        self.symbols.replace_file(filepath, prepared["symbols"], prepared["namespace"])
+    
+    def persist(self):
+        # Write project memory to disk
+        self._save_project_memory()
+    
+    def update_file(self, filepath, prepared):
+        # Replace the units of a modified file, writing only those whose
+        # content or position changed. Returns the number of units written.
+        namespace = prepared["namespace"]
+        written = self.vector_store.sync_file(filepath, prepared["documents"],
+                                              prepared["metadatas"], namespace)
+        self.lexical.delete_file(filepath, namespace)
+        self.lexical.add_units(prepared["documents"], prepared["metadatas"])
+        return written
+    
+    def remove_file(self, filepath, namespace=None):
+        # Drop all search entries for a file that changed or was deleted
+        namespace = namespace or self.namespace_for(filepath)
+        self.vector_store.delete_file(filepath, namespace)
+        self.lexical.delete_file(filepath, namespace)
+        self.symbols.delete_file(filepath, namespace)
+    
+    def drop_namespace(self, namespace):
+        # Delete everything indexed or learned for one namespace
+        self.vector_store.drop_namespace(namespace)
+        self.lexical.drop_namespace(namespace)
+        self.symbols.drop_namespace(namespace)
+    
+    def store_refactoring(self, original, refactored, language, filename, changes):
+        # Log successful refactors to vector store and history file
+        namespace = self.namespace_for(filename if filename and filename != "unknown" else None)
+        metadata = {
+            "language": language,
+            "filename": filename,
+            "namespace": namespace,
+            "timestamp": datetime.now().isoformat(),
+            "changes": changes
+        }
+        
+        with span("history.vector_store"):
+            # Units of the original name the symbol each diff hunk touches
+            units = self.chunker.chunk(original, language)
+            blob = self.vector_store.add_refactoring(original, refactored, metadata, namespace, units)
+        
+        with span("history.append") as stage:
+            stage["bytes_written"] = self.history.append({
+                "filename": filename,
+                "language": language,
+                "timestamp": metadata["timestamp"],
+                "changes_summary": changes[:200],
+                "blob": blob
+            })
+    
+    def gc(self, dry_run=False):
+        # Compact the vector store (see VectorStore.gc), then drop stored
+        # refactoring texts that no entry or history record refers to
+        report = self.vector_store.gc(dry_run=dry_run)
+        referenced = self.vector_store.refactoring_blobs()
+        referenced.update(record.get("blob") for record in self.history.iter_records())
+        orphans = [key for key in self.vector_store.blobs.keys() if key not in referenced]
+        if not dry_run:
+            self.vector_store.blobs.delete(orphans)
+        report["blobs_removed"] = len(orphans)
+        return report
+    
+    def _extract_patterns(self, code, language):
+        # Analyze code for preferred syntax and architectural patterns
+        self.record_patterns(self.detect_patterns(code, language), language)
+        self._save_project_memory()
+    
+    def detect_patterns(self, code, language):
+        # Detect preferred syntax and architectural patterns in source code
+        patterns = []
+        
+        # Detect concurrency preferences
+        if 'async' in code and 'await' in code:
+            patterns.append("prefers_async_await")
+        
+        # Detect JS/TS specific component styles
+        if language in ('javascript', 'typescript'):
+            if 'const ' in code and '=>' in code:
+                patterns.append("prefers_functional_components")
+            if 'class ' in code and 'extends' in code:
+                patterns.append("uses_class_components")
+            if 'const ' in code or 'let ' in code:
+                patterns.append("modern_js_syntax")
+        
+        return patterns
+    
+    def record_patterns(self, patterns, language):
+        # Update project memory and vector style store (persisted by persist())
+        for pattern in patterns:
+            if pattern not in self.project_memory["common_patterns"]:
+                self.project_memory["common_patterns"].append(pattern)
+                self.vector_store.add_style_preference(
+                    pattern,
+                    {"language": language, "type": "syntax_preference"}
+                )
+    
+    def get_relevant_context(self, code, language, n_results=3, filename=None):
+        # Retrieve cross-referenced context for RAG-based refactoring.
+        # Identifier matches come from the local lexical index; the code is
+        # embedded once and the three collections are queried concurrently
+        # with the same vector, and code hits from both are fused by rank.
+        # Code and history come from the namespace of filename (or of the
+        # working directory) and are limited to the same language.
+        with span("retrieval") as stage:
+            mode = self.retrieval_mode
+            namespace = self.namespace_for(filename)
+            stage["namespace"] = namespace
+            hits = [] if mode == 'vector' else self.lexical.search(code, n_results, language,
+                                                                    namespace)
+            if mode == 'lexical' or (mode == 'hybrid' and self._lexical_sufficient(hits, n_results)):
+                # Enough exact identifier matches: skip the embedding round trip
+                stage["mode"] = "lexical"
+                return {
+                    "similar_code": self._fuse(None, hits, n_results),
+                    "refactor_history": None,
+                    "style_patterns": None,
+                    "project_patterns": self.project_memory["common_patterns"]
+                }
+            stage["mode"] = mode
+            
+            embedding = self._query_embedding(code)
+            
+            if self._query_pool is None:
+                self._query_pool = ThreadPoolExecutor(max_workers=3)
+            
+            similar_code = self._query_pool.submit(
+                self.vector_store.search_similar_code, code, n_results, embedding,
+                namespace, language)
+            similar_refactors = self._query_pool.submit(
+                self.vector_store.search_refactor_history, code, n_results, embedding,
+                namespace, language)
+            styles = self._query_pool.submit(
+                self.vector_store.search_style_patterns, code, n_results, embedding)
+            
+            return {
+                "similar_code": self._fuse(similar_code.result(), hits, n_results),
+                "refactor_history": similar_refactors.result(),
+                "style_patterns": styles.result(),
+                "project_patterns": self.project_memory["common_patterns"]
+            }
+    
+    def get_definitions(self, code, language, filename=None):
+        # Signatures and docs of the indexed definitions code imports and
+        # uses (see SymbolIndex.definitions); local lookups only
+        return self.symbols.definitions(code, language, filename, self.namespace_for(filename))
+    
+    def _lexical_sufficient(self, hits, n_results):
+        # Lexical hits alone suffice when enough of them define names the
+        # query code refers to
+        needed = min(n_results, LEXICAL_SUFFICIENT_HITS)
+        return sum(1 for hit in hits if hit['symbol_match']) >= needed
+    
+    def _fuse(self, vector_result, hits, n_results):
+        # Reciprocal-rank fusion of a Chroma code query and lexical hits,
+        # returned in Chroma's result shape. Lexical-only entries have no
+        # distance; "scores" holds the fused scores.
+        rows = {}
+        vector_ranking = []
+        if vector_result and vector_result.get("documents"):
+            documents = vector_result["documents"][0] or []
+            metadatas = (vector_result.get("metadatas") or [[]])[0] or []
+            distances = (vector_result.get("distances") or [[]])[0] or []
+            for i, doc in enumerate(documents):
+                metadata = metadatas[i] if i < len(metadatas) else None
+                key = unit_key(doc, metadata)
+                rows[key] = (doc, metadata, distances[i] if i < len(distances) else None)
+                vector_ranking.append(key)
+        
+        lexical_ranking = []
+        for hit in hits:
+            key = unit_key(hit['document'], hit['metadata'])
+            if key not in rows:
+                rows[key] = (hit['document'], hit['metadata'], None)
+            lexical_ranking.append(key)
+        
+        fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:n_results]
+        return {
+            "documents": [[rows[key][0] for key, _ in fused]],
+            "metadatas": [[rows[key][1] for key, _ in fused]],
+            "distances": [[rows[key][2] for key, _ in fused]],
+            "scores": [[score for _, score in fused]]
+        }
+    
+    def _query_embedding(self, code):
+        # Return the query embedding for code, served from a small LRU when repeated
+        key = hashlib.sha256(code.encode('utf-8', errors='replace')).hexdigest()
+        with self._query_cache_lock:
+            if key in self._query_cache:
+                self._query_cache.move_to_end(key)
+                return self._query_cache[key]
+        
+        with span("embed.query") as stage:
+            embedding = self.vector_store.embed_query(code)
+            stage["tokens_in"] = estimate_tokens(code)
+        
+        with self._query_cache_lock:
+            self._query_cache[key] = embedding
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return embedding
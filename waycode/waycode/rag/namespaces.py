@@ -0,0 +1,75 @@
+import hashlib
+import os
+import re
+from functools import lru_cache
+
+# Files outside any git repository (and indexes built before namespaces
+# existed) live in the default namespace, stored in the unsuffixed
+# collections
+DEFAULT_NAMESPACE = "default"
+
+# Collections that are split per namespace; style preferences stay global
+NAMESPACED_COLLECTIONS = ("code_patterns", "refactor_history")
+
+NAMESPACE_SEPARATOR = "__"
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+@lru_cache(maxsize=4096)
+def git_root(directory):
+    # Nearest ancestor of directory containing .git (a directory, or a file
+    # for worktrees and submodules), or None
+    current = os.path.abspath(directory)
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+def slugify(name):
+    # Lower-case name safe for collection and file names
+    slug = _SLUG_RE.sub('-', name.lower()).strip('-')
+    return slug[:30].strip('-')
+
+def project_namespace(project):
+    # Namespace of an explicit --project name
+    slug = slugify(project)
+    if not slug:
+        raise ValueError(f"Invalid project name '{project}'")
+    return slug
+
+def root_namespace(root):
+    # Namespace of a repository root: its directory name plus a hash of the
+    # full path, so two checkouts named alike stay apart
+    digest = hashlib.sha256(os.path.normcase(root).encode('utf-8')).hexdigest()[:8]
+    return f"{slugify(os.path.basename(root)) or 'repo'}-{digest}"
+
+def resolve_namespace(path, project=None):
+    # Namespace for a file or directory: the explicit project, else its
+    # git repository, else the default namespace
+    if project:
+        return project_namespace(project)
+    path = os.path.abspath(path)
+    root = git_root(path if os.path.isdir(path) else os.path.dirname(path))
+    return root_namespace(root) if root else DEFAULT_NAMESPACE
+
+def prefix_directory(prefix):
+    # Directory form of a --path prefix, so /repo/src does not also match
+    # /repo/src2
+    return prefix.rstrip(os.sep) + os.sep
+
+def under_path(filename, prefix):
+    # True when filename is the prefix itself or lies below it
+    return filename == prefix or filename.startswith(prefix_directory(prefix))
+
+def collection_name(base, namespace=None):
+    # Storage name of a collection within a namespace
+    if base not in NAMESPACED_COLLECTIONS or namespace in (None, DEFAULT_NAMESPACE):
+        return base
+    return f"{base}{NAMESPACE_SEPARATOR}{namespace}"
+
+def split_collection_name(name):
+    # (base collection, namespace) of a storage name
+    base, _, namespace = name.partition(NAMESPACE_SEPARATOR)
+    return base, namespace or DEFAULT_NAMESPACE
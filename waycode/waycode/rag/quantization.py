@@ -0,0 +1,94 @@
+import numpy as np
+
+# Storage types for the flat index, largest first
+QUANTIZED_DTYPES = ('float32', 'float16', 'int8')
+
+def normalize(vectors):
+    # Unit-length float32 rows, so cosine similarity is a dot product
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def truncate(vectors, dim):
+    # Matryoshka-style reduction: keep the leading `dim` components and
+    # renormalize (text-embedding-004 front-loads information this way)
+    vectors = normalize(vectors)
+    if dim and dim < vectors.shape[1]:
+        vectors = normalize(vectors[:, :dim])
+    return vectors
+
+def quantize(vectors, dtype):
+    # Encode unit rows for storage. Returns (codes, scales); int8 rows are
+    # scaled by their largest component so each row uses the full range,
+    # and scales is None for float types.
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    return vectors.astype(dtype), None
+
+def dequantize(codes, scales=None):
+    # Approximate float32 rows back from stored codes
+    vectors = np.asarray(codes, dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors
+
+def bytes_per_vector(dtype, dim):
+    # Stored size of one vector, including its int8 scale
+    return dim * np.dtype(dtype).itemsize + (4 if dtype == 'int8' else 0)
+
+def top_k(scores, k):
+    # Indexes of the k largest scores, best first, without a full sort
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def recall_report(vectors, dtype, dim=None, k=10, samples=200, rescore_factor=4, seed=0):
+    # Recall@k of a quantized (and optionally truncated) copy of `vectors`
+    # against exact full-precision search, with and without re-scoring the
+    # top k * rescore_factor candidates at full precision. Sampled rows act
+    # as queries and are excluded from their own results.
+    full = normalize(vectors)
+    count, full_dim = full.shape
+    if count < 2:
+        raise ValueError("Recall needs at least two indexed vectors")
+    dim = min(dim or full_dim, full_dim)
+    codes, scales = quantize(truncate(full, dim), dtype)
+    approx = dequantize(codes, scales)
+    k = max(1, min(k, count - 1))
+    
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(count, size=min(samples, count), replace=False)
+    hits = rescored_hits = 0
+    for q in queries:
+        exact = full @ full[q]
+        exact[q] = -np.inf
+        truth = set(top_k(exact, k).tolist())
+        
+        scores = approx @ truncate(full[q], dim)[0]
+        scores[q] = -np.inf
+        hits += len(truth.intersection(top_k(scores, k).tolist()))
+        candidates = top_k(scores, min(count - 1, k * rescore_factor))
+        best = candidates[top_k(exact[candidates], k)]
+        rescored_hits += len(truth.intersection(best.tolist()))
+    
+    total = max(1, len(queries) * k)
+    return {
+        'vectors': count,
+        'k': k,
+        'queries': len(queries),
+        'dtype': dtype,
+        'dim': dim,
+        'full_dim': full_dim,
+        'recall': hits / total,
+        'recall_rescored': rescored_hits / total,
+        'bytes_full': count * bytes_per_vector('float32', full_dim),
+        'bytes_quantized': count * bytes_per_vector(dtype, dim)
+    }
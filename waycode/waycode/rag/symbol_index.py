@@ -0,0 +1,500 @@
+import ast
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from waycode.config import (
+    SYMBOL_INDEX_PATH, SYMBOL_DOC_CHARS, SYMBOL_REEXPORT_DEPTH, CONTEXT_MAX_DEFINITIONS
+)
+from waycode.rag.chunker import CodeChunker, MODULE_SYMBOL
+from waycode.rag.lexical_index import IDENTIFIER_RE
+from waycode.rag.namespaces import DEFAULT_NAMESPACE
+from waycode.utils.js_lexer import JSLexer
+from waycode.utils.profiler import span
+
+# Extensions a JS/TS import may name or leave out
+JS_EXTENSIONS = ('.js', '.jsx', '.ts', '.tsx', '.mjs', '.cjs')
+SIGNATURE_CHARS = 200
+SIGNATURE_LINES = 3
+# Bound on the tokens between `import`/`export` and the module string
+JS_IMPORT_TOKENS = 256
+COMMENT_MARKERS = ('#', '//', '/*', '*')
+
+_chunker = CodeChunker()
+_lexer = JSLexer()
+
+def python_module(filepath):
+    # Dotted module name of a Python file, walking up through the
+    # directories that contain an __init__.py
+    directory, name = os.path.split(os.path.abspath(filepath))
+    stem = os.path.splitext(name)[0]
+    parts = [] if stem == '__init__' else [stem]
+    while os.path.isfile(os.path.join(directory, '__init__.py')):
+        directory, package = os.path.split(directory)
+        parts.insert(0, package)
+    return '.'.join(parts)
+
+def js_module(filepath):
+    # Module key of a JS/TS file: its path without extension (the
+    # directory for index files), the way relative imports name it
+    base = os.path.splitext(os.path.abspath(filepath))[0]
+    if os.path.basename(base) == 'index':
+        return os.path.dirname(base)
+    return base
+
+def resolve_python_import(module, level, filepath):
+    # Absolute module named by a (possibly relative) from-import, or None
+    # when a relative import cannot be placed
+    if not level:
+        return module
+    if not filepath:
+        return None
+    package = python_module(filepath).split('.')
+    if os.path.basename(filepath) != '__init__.py':
+        package = package[:-1]
+    if level - 1 > len(package):
+        return None
+    package = package[:len(package) - (level - 1)]
+    return '.'.join(package + ([module] if module else [])) or None
+
+def resolve_js_import(specifier, filepath):
+    # Module key of a relative or absolute specifier; bare package names
+    # are kept as they are and never match an indexed file
+    if not specifier.startswith(('.', '/')) or not filepath:
+        return specifier
+    target = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(filepath)), specifier))
+    root, ext = os.path.splitext(target)
+    if ext in JS_EXTENSIONS:
+        target = root
+    if os.path.basename(target) == 'index':
+        target = os.path.dirname(target)
+    return target
+
+def extract_symbols(code, language, filepath=None, units=None):
+    # Module name, definitions and imports of a source file. Definitions
+    # carry a signature and the docstring or leading comment; imports are
+    # {module, name, alias} with name None for whole-module imports and
+    # '*' for star imports and re-exports. units may pass chunks already
+    # computed for the file (JS/TS definitions come from the chunker).
+    extracted = {"module": None, "language": language, "symbols": [], "imports": []}
+    if language == 'python':
+        extracted["module"] = python_module(filepath) if filepath else None
+        _extract_python(code, filepath, extracted)
+    elif language in ('javascript', 'typescript'):
+        extracted["module"] = js_module(filepath) if filepath else None
+        _extract_js(code, filepath, units, extracted)
+    return extracted
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + '...'
+
+def _comment_text(lines):
+    # Comment lines without their markers
+    text = []
+    for line in lines:
+        line = line.strip()
+        for marker in ('/**', '/*', '//', '#', '*/', '*'):
+            if line.startswith(marker):
+                line = line[len(marker):]
+                break
+        if line.endswith('*/'):
+            line = line[:-2]
+        if line.strip():
+            text.append(line.strip())
+    return '\n'.join(text)
+
+def _comment_above(lines, start):
+    # Comment block directly above the 1-based line start
+    i = start - 1
+    while i > 0 and lines[i - 1].strip().startswith(COMMENT_MARKERS):
+        i -= 1
+    return _comment_text(lines[i:start - 1])
+
+# Python
+
+def _extract_python(code, filepath, extracted):
+    # Top-level definitions, class methods and module constants from the AST
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return
+    lines = code.splitlines()
+    symbols = extracted["symbols"]
+    
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(_python_definition(lines, node, node.name, 'function'))
+        elif isinstance(node, ast.ClassDef):
+            symbols.append(_python_definition(lines, node, node.name, 'class'))
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(_python_definition(lines, child, f"{node.name}.{child.name}",
+                                                      'method'))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    symbols.append({
+                        "symbol": target.id,
+                        "kind": "variable",
+                        "signature": _clip(lines[node.lineno - 1].strip(), SIGNATURE_CHARS),
+                        "doc": _clip(_comment_above(lines, node.lineno), SYMBOL_DOC_CHARS),
+                        "start_line": node.lineno,
+                        "end_line": node.end_lineno or node.lineno
+                    })
+    
+    # Imports anywhere in the file, including ones deferred into functions
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                extracted["imports"].append(
+                    {"module": alias.name, "name": None, "alias": alias.asname or alias.name})
+        elif isinstance(node, ast.ImportFrom):
+            module = resolve_python_import(node.module, node.level, filepath)
+            if module is None:
+                continue
+            for alias in node.names:
+                extracted["imports"].append(
+                    {"module": module, "name": alias.name, "alias": alias.asname or alias.name})
+
+def _python_definition(lines, node, name, kind):
+    # Symbol row of a def or class, its span starting at the first decorator
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+    return {
+        "symbol": name,
+        "kind": kind,
+        "signature": _python_signature(node),
+        "doc": _clip(_python_doc(lines, node, start), SYMBOL_DOC_CHARS),
+        "start_line": start,
+        "end_line": node.end_lineno or node.lineno
+    }
+
+def _python_signature(node):
+    # Decorators and the def/class line, normalised by ast.unparse
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+        header = f"class {node.name}" + (f"({', '.join(bases)})" if bases else "")
+    else:
+        prefix = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
+        header = f"{prefix} {node.name}({ast.unparse(node.args)})"
+        if node.returns:
+            header += f" -> {ast.unparse(node.returns)}"
+    decorators = [f"@{ast.unparse(d)}" for d in node.decorator_list]
+    return '\n'.join(decorators + [_clip(header, SIGNATURE_CHARS) + ':'])
+
+def _python_doc(lines, node, start):
+    # Docstring, else the comments opening the body, else those above it
+    doc = ast.get_docstring(node)
+    if doc:
+        return doc.strip()
+    body = [line for line in lines[node.lineno:node.body[0].lineno - 1]
+            if line.strip().startswith('#')]
+    return _comment_text(body) or _comment_above(lines, start)
+
+# JavaScript / TypeScript
+
+def _extract_js(code, filepath, units, extracted):
+    # Declarations found by the chunker and imports from the token stream
+    lines = code.splitlines()
+    if units is None:
+        units = _chunker.chunk(code, extracted["language"])
+    for unit in units:
+        if unit["symbol"] == MODULE_SYMBOL or unit["kind"] == 'module':
+            continue
+        extracted["symbols"].append({
+            "symbol": unit["symbol"],
+            "kind": unit["kind"],
+            "signature": _js_signature(unit["content"]),
+            "doc": _clip(_comment_above(lines, unit["start_line"]), SYMBOL_DOC_CHARS),
+            "start_line": unit["start_line"],
+            "end_line": unit["end_line"]
+        })
+    extracted["imports"] = _js_imports(_lexer.tokenize(code), filepath)
+
+def _js_signature(content):
+    # Leading lines of a declaration up to its body
+    header = []
+    for line in content.splitlines()[:SIGNATURE_LINES]:
+        header.append(line.rstrip())
+        if line.rstrip().endswith(('{', ';')) or '=>' in line:
+            break
+    signature = '\n'.join(header).strip()
+    if signature.endswith('{'):
+        signature = signature[:-1].rstrip()
+    return _clip(signature, SIGNATURE_CHARS)
+
+def _js_imports(tokens, filepath):
+    # import/export-from statements and require() calls
+    imports = []
+    n = len(tokens)
+    for i, tok in enumerate(tokens):
+        if tok.kind != 'ident' or (i and tokens[i - 1].value == '.'):
+            continue
+        if tok.value in ('import', 'export'):
+            j = i + 1
+            while j < n and j - i < JS_IMPORT_TOKENS and tokens[j].kind != 'string' \
+                    and tokens[j].value not in (';', 'import', 'export'):
+                j += 1
+            # Only `import ... from 'x'` and `export ... from 'x'` name
+            # bindings; side-effect and dynamic imports are skipped
+            if j >= n or tokens[j].kind != 'string' or tokens[j - 1].value != 'from':
+                continue
+            module = resolve_js_import(tokens[j].value[1:-1], filepath)
+            imports.extend(_js_clause([t.value for t in tokens[i + 1:j - 1]], module))
+        elif tok.value == 'require' and i + 3 < n and tokens[i + 1].value == '(' \
+                and tokens[i + 2].kind == 'string' and tokens[i + 3].value == ')':
+            module = resolve_js_import(tokens[i + 2].value[1:-1], filepath)
+            imports.extend(_js_require_bindings(tokens, i, module))
+    return imports
+
+def _js_clause(values, module):
+    # Bindings of an import/export clause: default, * as ns and { a as b }
+    imports = []
+    if values[:1] == ['type'] and values[1:2] not in (['from'], [',']):
+        values = values[1:]
+    i = 0
+    while i < len(values):
+        value = values[i]
+        if value == '*':
+            if values[i + 1:i + 2] == ['as'] and i + 2 < len(values):
+                imports.append({"module": module, "name": None, "alias": values[i + 2]})
+                i += 3
+            else:
+                imports.append({"module": module, "name": '*', "alias": '*'})
+                i += 1
+        elif value == '{':
+            close = values.index('}', i) if '}' in values[i:] else len(values)
+            imports.extend(_js_named(values[i + 1:close], module, 'as'))
+            i = close + 1
+        else:
+            if IDENTIFIER_RE.fullmatch(value):
+                imports.append({"module": module, "name": 'default', "alias": value})
+            i += 1
+    return imports
+
+def _js_named(values, module, separator):
+    # { a, b as c, type d } (or { a, b: c } when destructuring a require)
+    imports = []
+    group = []
+    for value in values + [',']:
+        if value != ',':
+            group.append(value)
+            continue
+        if group and group[0] == 'type' and len(group) > 1:
+            group = group[1:]
+        if group and IDENTIFIER_RE.fullmatch(group[0]):
+            alias = group[2] if len(group) > 2 and group[1] == separator else group[0]
+            imports.append({"module": module, "name": group[0], "alias": alias})
+        group = []
+    return imports
+
+def _js_require_bindings(tokens, i, module):
+    # `const x = require(...)` binds the module, `const { a } = require(...)`
+    # binds names
+    if i < 2 or tokens[i - 1].value != '=':
+        return []
+    before = tokens[i - 2]
+    if before.kind == 'ident':
+        return [{"module": module, "name": None, "alias": before.value}]
+    if before.value == '}':
+        k = i - 2
+        while k >= 0 and tokens[k].value != '{':
+            k -= 1
+        return _js_named([t.value for t in tokens[k + 1:i - 2]], module, ':')
+    return []
+
+class SymbolIndex:
+    # Symbol table and import graph of indexed files, kept in SQLite next
+    # to the lexical index. Each file records its module name, every name
+    # it imports and the signature and doc of its top-level definitions
+    # and methods, so the definitions a piece of code depends on are found
+    # with indexed point lookups and no embedding call. Like the lexical
+    # index, rows belong to a repository namespace.
+    
+    def __init__(self, path=SYMBOL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connection(self):
+        # Open the database and create the tables on first use
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "namespace TEXT NOT NULL, filename TEXT NOT NULL, module TEXT, language TEXT, "
+                "PRIMARY KEY (namespace, filename));"
+                "CREATE TABLE IF NOT EXISTS symbols ("
+                "namespace TEXT NOT NULL, filename TEXT NOT NULL, module TEXT, name TEXT NOT NULL, "
+                "kind TEXT, signature TEXT, doc TEXT, start_line INTEGER, end_line INTEGER);"
+                "CREATE INDEX IF NOT EXISTS symbols_lookup ON symbols (namespace, module, name);"
+                "CREATE INDEX IF NOT EXISTS symbols_file ON symbols (namespace, filename);"
+                "CREATE TABLE IF NOT EXISTS imports ("
+                "namespace TEXT NOT NULL, filename TEXT NOT NULL, importer TEXT, module TEXT, "
+                "name TEXT, alias TEXT);"
+                "CREATE INDEX IF NOT EXISTS imports_file ON imports (namespace, filename);"
+                "CREATE INDEX IF NOT EXISTS imports_alias ON imports (namespace, importer, alias);"
+            )
+            self._conn = conn
+        return self._conn
+    
+    def replace_file(self, filename, extracted, namespace=None):
+        # Store the extract_symbols() result of a file, replacing its old rows
+        namespace = namespace or DEFAULT_NAMESPACE
+        with self._lock, span("symbols.add") as stage:
+            conn = self._connection()
+            with conn:
+                self._delete(conn, "namespace = ? AND filename = ?", (namespace, filename))
+                conn.execute("INSERT INTO files (namespace, filename, module, language) "
+                             "VALUES (?, ?, ?, ?)",
+                             (namespace, filename, extracted["module"], extracted["language"]))
+                conn.executemany(
+                    "INSERT INTO symbols (namespace, filename, module, name, kind, signature, doc, "
+                    "start_line, end_line) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(namespace, filename, extracted["module"], s["symbol"], s["kind"],
+                      s["signature"], s["doc"], s["start_line"], s["end_line"])
+                     for s in extracted["symbols"]]
+                )
+                conn.executemany(
+                    "INSERT INTO imports (namespace, filename, importer, module, name, alias) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(namespace, filename, extracted["module"], i["module"], i["name"], i["alias"])
+                     for i in extracted["imports"]]
+                )
+            stage["symbols"] = len(extracted["symbols"])
+    
+    def _delete(self, conn, condition, params):
+        for table in ("files", "symbols", "imports"):
+            conn.execute(f"DELETE FROM {table} WHERE {condition}", params)
+    
+    def delete_file(self, filename, namespace=None):
+        # Drop a file's symbols and imports
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._delete(conn, "namespace = ? AND filename = ?",
+                             (namespace or DEFAULT_NAMESPACE, filename))
+    
+    def drop_namespace(self, namespace):
+        # Drop every file of a namespace
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                self._delete(conn, "namespace = ?", (namespace,))
+    
+    def has_file(self, filename, namespace=None):
+        # True when the file's symbols are recorded in the namespace
+        with self._lock:
+            return self._connection().execute(
+                "SELECT 1 FROM files WHERE namespace = ? AND filename = ?",
+                (namespace or DEFAULT_NAMESPACE, filename)
+            ).fetchone() is not None
+    
+    def count(self, namespace=None):
+        # Number of recorded symbols, in one namespace or overall
+        with self._lock:
+            conn = self._connection()
+            if namespace is None:
+                return conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM symbols WHERE namespace = ?",
+                                (namespace,)).fetchone()[0]
+    
+    def definitions(self, code, language, filename=None, namespace=None,
+                    limit=CONTEXT_MAX_DEFINITIONS):
+        # Definitions of the names code imports and uses, in import order,
+        # with the methods of imported classes that code calls. Imports are
+        # read from code itself and, when filename is indexed, from the
+        # file's recorded imports, so a fragment of a file resolves the
+        # names its module imports. Returns dicts with filename, module,
+        # symbol, kind, signature, doc, start_line and end_line.
+        namespace = namespace or DEFAULT_NAMESPACE
+        extracted = extract_symbols(code, language, filename)
+        uses = Counter(IDENTIFIER_RE.findall(code))
+        attributes = set(re.findall(r'\.\s*([A-Za-z_$][\w$]*)', code))
+        
+        with self._lock, span("symbols.resolve") as stage:
+            conn = self._connection()
+            # An import written in code names its alias once itself
+            imports = {}
+            for imp in extracted["imports"]:
+                imports.setdefault((imp["module"], imp["name"], imp["alias"]), 2)
+            if filename:
+                for row in conn.execute("SELECT module, name, alias FROM imports "
+                                        "WHERE namespace = ? AND filename = ?", (namespace, filename)):
+                    imports.setdefault(tuple(row), 1)
+            
+            found = {}
+            for (module, name, alias), needed in imports.items():
+                if len(found) >= limit:
+                    break
+                if not module or name == '*' or uses[alias.split('.')[0]] < needed:
+                    continue
+                if name is None:
+                    rows = self._module_members(conn, namespace, module, alias, code)
+                else:
+                    rows = self._lookup(conn, namespace, module, name)
+                    if not rows and name == 'default':
+                        rows = self._lookup(conn, namespace, module, alias)
+                    if not rows and language == 'python':
+                        # `from package import module`
+                        rows = self._module_members(conn, namespace, f"{module}.{name}", alias, code)
+                for row in rows:
+                    if row[0] != filename:
+                        found.setdefault((row[0], row[2]), row)
+                    if row[3] == 'class':
+                        for method in self._methods(conn, namespace, row[1], row[2], attributes):
+                            found.setdefault((method[0], method[2]), method)
+            
+            stage.update(imports=len(imports), definitions=min(len(found), limit))
+        
+        columns = ("filename", "module", "symbol", "kind", "signature", "doc",
+                   "start_line", "end_line")
+        return [dict(zip(columns, row)) for row in list(found.values())[:limit]]
+    
+    def _select(self, conn, condition, params):
+        return conn.execute(
+            "SELECT filename, module, name, kind, signature, doc, start_line, end_line "
+            f"FROM symbols WHERE {condition}", params
+        ).fetchall()
+    
+    def _lookup(self, conn, namespace, module, name, depth=0):
+        # Definition rows of module.name, following re-exports such as
+        # `from .models import User` in a package __init__ or
+        # `export { User } from './models'`
+        rows = self._select(conn, "namespace = ? AND module = ? AND name = ?",
+                            (namespace, module, name))
+        if rows or depth >= SYMBOL_REEXPORT_DEPTH:
+            return rows
+        for target, target_name in conn.execute(
+                "SELECT module, name FROM imports WHERE namespace = ? AND importer = ? "
+                "AND alias IN (?, '*')", (namespace, module, name)).fetchall():
+            if target_name is None or target == module:
+                continue
+            rows = self._lookup(conn, namespace, target, name if target_name == '*' else target_name,
+                                depth + 1)
+            if rows:
+                return rows
+        return []
+    
+    def _module_members(self, conn, namespace, module, alias, code):
+        # Definitions reached through a module binding (alias.name)
+        names = re.findall(re.escape(alias) + r'\s*\.\s*([A-Za-z_$][\w$]*)', code)
+        rows = []
+        for name in dict.fromkeys(names):
+            rows.extend(self._lookup(conn, namespace, module, name))
+        return rows
+    
+    def _methods(self, conn, namespace, module, class_name, attributes):
+        # Methods of a class that code refers to as attributes
+        rows = self._select(conn, "namespace = ? AND module = ? AND name > ? AND name < ?",
+                            (namespace, module, class_name + '.', class_name + '/'))
+        return [row for row in rows if row[2].split('.', 1)[1] in attributes]
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
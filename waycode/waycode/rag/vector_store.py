@@ -1,79 +1,461 @@
-import chromadb
-from waycode.config import VECTOR_DB_PATH
-import os
-
-class VectorStore:
-    def __init__(self):
-        # Create persistent storage directory if missing
-        if not os.path.exists(VECTOR_DB_PATH):
-            os.makedirs(VECTOR_DB_PATH, exist_ok=True)
-        
-        self.client = chromadb.PersistentClient(path=VECTOR_DB_PATH)
-        
-        # Initialize specialized memory collections
-        self.code_collection = self._get_or_create_collection("code_patterns")
-        self.refactor_collection = self._get_or_create_collection("refactor_history")
-        self.style_collection = self._get_or_create_collection("style_preferences")
-    
-    def _get_or_create_collection(self, name):
-        # Helper to retrieve or initialize a ChromaDB collection
-        try:
-            return self.client.get_collection(name)
-        except:
-            return self.client.create_collection(
-                name=name,
-                metadata={"hnsw:space": "cosine"}
-            )
-    
-    def add_code_pattern(self, code, metadata):
-        # Index raw code patterns with metadata
-        self.code_collection.add(
-            documents=[code],
-            metadatas=[metadata],
-            ids=[f"code_{metadata.get('filename', 'unknown')}_{hash(code)}"]
-        )
-    
-    def add_refactoring(self, original, refactored, metadata):
-        # Store transformation history for future learning
-        doc = f"Original:\n{original}\n\nRefactored:\n{refactored}"
-        self.refactor_collection.add(
-            documents=[doc],
-            metadatas=[metadata],
-            ids=[f"refactor_{hash(original)}"]
-        )
-    
-    def add_style_preference(self, pattern, metadata):
-        # Index specific naming or architectural style preferences
-        self.style_collection.add(
-            documents=[pattern],
-            metadatas=[metadata],
-            ids=[f"style_{hash(pattern)}"]
-        )
-    
-    def search_similar_code(self, query, n_results=3):
-        # Query existing codebase patterns
-        return self.code_collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-    
-    def search_refactor_history(self, query, n_results=3):
-        # Query past refactoring transformations
-        return self.refactor_collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-    
-    def search_style_patterns(self, query, n_results=3):
-        # Query style conventions for consistency
-        return self.style_collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-    
-    def get_all_styles(self):
-        # Retrieve all stored style preferences
-        try:
-            return self.style_collection.get()
-        except:
-            return None
+import hashlib
+import os
+import threading
+from waycode.config import (
+    VECTOR_BACKEND, VECTOR_BACKENDS, PATH_FILTER_OVERFETCH, REFACTOR_SUMMARY_CHARS
+)
+from waycode.rag.blob_store import BlobStore
+from waycode.rag.embeddings import EmbeddingGenerator
+from waycode.rag.namespaces import (
+    NAMESPACED_COLLECTIONS, collection_name, split_collection_name, under_path
+)
+from waycode.utils.diff_generator import DiffGenerator
+from waycode.utils.profiler import span
+
+def stable_id(prefix, *parts):
+    # Content-derived ID that is identical across runs and processes
+    digest = hashlib.sha256("\0".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f"{prefix}_{digest}"
+
+def _original_code(doc):
+    # Recover the original code from a stored refactoring document
+    original = (doc or "").split("\n\nRefactored:\n", 1)[0]
+    return original[len("Original:\n"):] if original.startswith("Original:\n") else original
+
+def _split_legacy_refactoring(doc):
+    # (original, refactored) of a full-text refactoring document
+    original, _, refactored = doc[len("Original:\n"):].partition("\n\nRefactored:\n")
+    return original, refactored
+
+def _hunk_symbol(hunk, units):
+    # Innermost code unit of the original containing the hunk's first
+    # changed line, or '' when none does
+    line = hunk['changed_start'] + 1
+    containing = [unit for unit in units or ()
+                  if unit['start_line'] <= line <= unit['end_line']]
+    if not containing:
+        return ''
+    return min(containing, key=lambda unit: unit['end_line'] - unit['start_line'])['symbol']
+
+# Per-hit keys of a query result; the rest (e.g. "included") are passed through
+HIT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+def _filter_path_prefix(result, prefix, n_results):
+    # Keep the first n_results hits of a query result whose filename lies
+    # under prefix
+    keep = [i for i, metadata in enumerate((result.get("metadatas") or [[]])[0] or [])
+            if under_path(str((metadata or {}).get("filename") or ""), prefix)][:n_results]
+    return {
+        key: [[value[0][i] for i in keep]] if value and key in HIT_KEYS else value
+        for key, value in result.items()
+    }
+
+def _unit_fields(metadata):
+    # Metadata that decides whether a stored unit is still current
+    if metadata is None:
+        return None
+    return {key: value for key, value in metadata.items() if key != "indexed_at"}
+
+def create_backend(name, embedder):
+    # Storage backend by name. Each backend provides collection(name),
+    # returning an object with the subset of Chroma's collection API used
+    # here (add, upsert, get, delete, query, count, name), plus
+    # max_batch_size(), list_collections() and drop_collection(name).
+    # Backends are imported only when selected, so the flat backend never
+    # loads chromadb.
+    if name == "chroma":
+        from waycode.rag.chroma_backend import ChromaBackend
+        return ChromaBackend(embedder)
+    if name == "flat":
+        from waycode.rag.flat_index import FlatBackend
+        return FlatBackend(embedder)
+    raise ValueError(f"Unknown vector backend '{name}' (expected one of {', '.join(VECTOR_BACKENDS)})")
+
+class VectorStore:
+    def __init__(self, embedder=None, backend=None, blobs=None):
+        # The backend (VECTOR_BACKEND unless one is injected) and its
+        # collections are opened on first use
+        self.embedder = embedder or EmbeddingGenerator()
+        self._backend = backend
+        # Full before/after text of refactorings, read only on demand
+        self.blobs = blobs or BlobStore()
+        self.diff_gen = DiffGenerator()
+        self._collections = {}
+        self._open_lock = threading.Lock()
+    
+    @property
+    def backend(self):
+        # Storage backend selected by configuration
+        with self._open_lock:
+            if self._backend is None:
+                self._backend = create_backend(VECTOR_BACKEND, self.embedder)
+        return self._backend
+    
+    @property
+    def code_collection(self):
+        # Indexed project code units (default namespace)
+        return self._collection("code_patterns")
+    
+    @property
+    def refactor_collection(self):
+        # Past refactorings (default namespace)
+        return self._collection("refactor_history")
+    
+    @property
+    def style_collection(self):
+        # Learned style preferences, shared by every namespace
+        return self._collection("style_preferences")
+    
+    def _collection(self, base, namespace=None):
+        # Open a specialized memory collection the first time it is needed
+        name = collection_name(base, namespace)
+        collection = self._collections.get(name)
+        if collection is None:
+            backend = self.backend
+            with self._open_lock:
+                collection = self._collections.get(name)
+                if collection is None:
+                    collection = backend.collection(name)
+                    self._collections[name] = collection
+        return collection
+    
+    def embedding_stats(self):
+        # Embedding cache hit and miss counters
+        return self.embedder.stats()
+    
+    def add_code_pattern(self, code, metadata):
+        # Index raw code patterns with metadata
+        self.add_code_patterns([code], [metadata])
+    
+    def add_code_patterns(self, codes, metadatas, namespace=None):
+        # Upsert several code units in as few calls as the client allows;
+        # re-indexing the same unit replaces it instead of adding a copy
+        units = {}
+        for code, metadata in zip(codes, metadatas):
+            units[self._code_id(code, metadata)] = (code, metadata)
+        ids = list(units)
+        codes = [units[i][0] for i in ids]
+        metadatas = [units[i][1] for i in ids]
+        
+        collection = self._collection("code_patterns", namespace)
+        step = self._max_batch_size()
+        for start in range(0, len(codes), step):
+            with span(f"{self.backend.name}.upsert.code_patterns") as stage:
+                collection.upsert(
+                    documents=codes[start:start + step],
+                    metadatas=metadatas[start:start + step],
+                    ids=ids[start:start + step]
+                )
+                stage["bytes_written"] = sum(len(c.encode('utf-8')) for c in codes[start:start + step])
+    
+    def sync_file(self, filename, codes, metadatas, namespace=None):
+        # Make a file's stored units match codes: units no longer present
+        # are deleted and only new units, or units whose metadata changed
+        # (e.g. they moved within the file), are written, so an edit costs
+        # work proportional to the units it touched. Returns the number of
+        # units written.
+        collection = self._collection("code_patterns", namespace)
+        stored = collection.get(where={"filename": filename}, include=["metadatas"])
+        current = dict(zip(stored["ids"], stored["metadatas"]))
+        
+        units = {self._code_id(code, metadata): (code, metadata)
+                 for code, metadata in zip(codes, metadatas)}
+        stale = [unit_id for unit_id in current if unit_id not in units]
+        if stale:
+            collection.delete(ids=stale)
+        changed = [unit for unit_id, unit in units.items()
+                   if _unit_fields(current.get(unit_id)) != _unit_fields(unit[1])]
+        if changed:
+            self.add_code_patterns([code for code, _ in changed],
+                                   [metadata for _, metadata in changed], namespace)
+        return len(changed)
+    
+    def _code_id(self, code, metadata):
+        # Stable ID of a code unit: file path, symbol and content
+        metadata = metadata or {}
+        return stable_id("code", metadata.get('filename', 'unknown'), metadata.get('symbol', ''), code)
+    
+    def _max_batch_size(self):
+        # Largest batch the backend accepts in a single write
+        return self.backend.max_batch_size()
+    
+    def delete_file(self, filename, namespace=None):
+        # Remove every indexed code unit belonging to a file
+        self._collection("code_patterns", namespace).delete(where={"filename": filename})
+    
+    def add_refactoring(self, original, refactored, metadata, namespace=None, units=None):
+        # Store a refactoring as one entry per diff hunk, so each entry
+        # embeds a single transformation. The full texts and explanation
+        # ("changes" in metadata) go to the blob store; entries carry its
+        # key, the first REFACTOR_SUMMARY_CHARS of the explanation and the
+        # symbol each hunk touches (from `units`, the chunker's units of the
+        # original). Refactoring the same code again replaces the entries.
+        # Returns the blob key.
+        metadata = dict(metadata or {})
+        explanation = metadata.pop("changes", None) or ""
+        refactor_id = stable_id("refactor", metadata.get('filename') or '', original)
+        blob = self.blobs.put({"original": original, "refactored": refactored,
+                               "explanation": explanation})
+        
+        hunks = list(self.diff_gen.hunks(original, refactored))
+        metadatas = [dict(
+            metadata,
+            refactor_id=refactor_id,
+            blob=blob,
+            hunk=index,
+            hunks=len(hunks),
+            symbol=_hunk_symbol(hunk, units),
+            start_line=hunk['old_start'] + 1,
+            end_line=max(hunk['old_end'], hunk['old_start'] + 1),
+            changes=explanation[:REFACTOR_SUMMARY_CHARS]
+        ) for index, hunk in enumerate(hunks)]
+        documents = [hunk['text'] for hunk in hunks]
+        
+        collection = self._collection("refactor_history", namespace)
+        # The previous version, including a full-text entry from before
+        # hunk entries, which was stored under refactor_id itself
+        collection.delete(where={"refactor_id": refactor_id})
+        collection.delete(ids=[refactor_id])
+        if documents:
+            with span(f"{self.backend.name}.upsert.refactor_history") as stage:
+                collection.upsert(
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=[self._refactor_id(d, m) for d, m in zip(documents, metadatas)]
+                )
+                stage["bytes_written"] = sum(len(d.encode('utf-8')) for d in documents)
+        return blob
+    
+    def get_refactoring(self, blob):
+        # {original, refactored, explanation} of a stored refactoring, or None
+        return self.blobs.get(blob) if blob else None
+    
+    def _refactor_id(self, doc, metadata):
+        # Stable ID of a refactoring hunk: its refactoring (file path and
+        # original code, so refactoring the same code again replaces it)
+        # and position. Full-text entries use the refactoring's own ID.
+        metadata = metadata or {}
+        if "refactor_id" in metadata:
+            return stable_id("refactor", metadata["refactor_id"], str(metadata.get("hunk", 0)))
+        return stable_id("refactor", metadata.get('filename') or '', _original_code(doc))
+    
+    def add_style_preference(self, pattern, metadata):
+        # Index specific naming or architectural style preferences
+        self.style_collection.upsert(
+            documents=[pattern],
+            metadatas=[metadata],
+            ids=[self._style_id(pattern)]
+        )
+    
+    def _style_id(self, pattern, metadata=None):
+        # Stable ID of a style preference
+        return stable_id("style", pattern)
+    
+    def counts(self, namespace=None):
+        # Number of entries in each memory collection of a namespace
+        return {
+            "code_patterns": self._collection("code_patterns", namespace).count(),
+            "refactor_history": self._collection("refactor_history", namespace).count(),
+            "style_preferences": self.style_collection.count()
+        }
+    
+    def namespaces(self):
+        # {namespace: {collection: count}} for every namespace with entries
+        found = {}
+        for name in self.backend.list_collections():
+            base, namespace = split_collection_name(name)
+            if base in NAMESPACED_COLLECTIONS:
+                count = self._collection(base, namespace).count()
+                if count:
+                    found.setdefault(namespace, {})[base] = count
+        return found
+    
+    def drop_namespace(self, namespace):
+        # Delete a namespace's code and refactoring collections
+        for base in NAMESPACED_COLLECTIONS:
+            name = collection_name(base, namespace)
+            with self._open_lock:
+                self._collections.pop(name, None)
+            self.backend.drop_collection(name)
+    
+    def _all_collections(self):
+        # (report key, collection, base name) for every stored collection
+        names = set(self.backend.list_collections()) | {
+            "code_patterns", "refactor_history", "style_preferences"}
+        for name in sorted(names):
+            base, namespace = split_collection_name(name)
+            if base in NAMESPACED_COLLECTIONS or name == "style_preferences":
+                yield name, self._collection(base, namespace), base
+    
+    def gc(self, dry_run=False):
+        # Remove duplicate entries and code units of files that no longer
+        # exist, move entries stored under legacy hash() IDs to their
+        # stable IDs (reusing stored embeddings) and split full-text
+        # refactorings into hunk entries, in every namespace. Returns
+        # collection sizes before and after plus per-collection removal and
+        # conversion counts, keyed by storage name.
+        id_fns = {"code_patterns": self._code_id, "refactor_history": self._refactor_id,
+                  "style_preferences": self._style_id}
+        before, after, removed, converted = {}, {}, {}, {}
+        for name, collection, base in self._all_collections():
+            before[name] = collection.count()
+            if base == "refactor_history":
+                converted[name] = self._convert_refactorings(
+                    collection, split_collection_name(name)[1], dry_run)
+            orphan = self._is_orphan if base == "code_patterns" else None
+            removed[name] = self._gc_collection(collection, id_fns[base], orphan, dry_run)
+            after[name] = before[name] - removed[name] if dry_run else collection.count()
+        return {"before": before, "after": after, "removed": removed, "converted": converted}
+    
+    def _pages(self, collection, include=("documents", "metadatas")):
+        # Yield every entry of a collection as (id, document, metadata), a
+        # page at a time
+        step = self._max_batch_size()
+        offset = 0
+        while True:
+            page = collection.get(include=list(include), limit=step, offset=offset)
+            if not page["ids"]:
+                return
+            documents = page.get("documents") or [None] * len(page["ids"])
+            yield from zip(page["ids"], documents, page["metadatas"])
+            offset += len(page["ids"])
+    
+    def _convert_refactorings(self, collection, namespace, dry_run):
+        # Re-store full-text refactorings (written before hunk entries) as
+        # hunks plus a blob; returns how many there were
+        legacy = [(entry_id, doc, metadata) for entry_id, doc, metadata in self._pages(collection)
+                  if "refactor_id" not in (metadata or {}) and (doc or "").startswith("Original:\n")]
+        if not dry_run:
+            for entry_id, doc, metadata in legacy:
+                original, refactored = _split_legacy_refactoring(doc)
+                self.add_refactoring(original, refactored, metadata, namespace)
+                collection.delete(ids=[entry_id])
+        return len(legacy)
+    
+    def refactoring_blobs(self):
+        # Blob keys referenced by refactor entries in any namespace
+        keys = set()
+        for _, collection, base in self._all_collections():
+            if base == "refactor_history":
+                keys.update((metadata or {}).get("blob") for _, _, metadata
+                            in self._pages(collection, include=("metadatas",)))
+        keys.discard(None)
+        return keys
+    
+    def _is_orphan(self, metadata):
+        # Code units whose (absolute) source file has been deleted; relative
+        # paths from older indexes are kept since their base is unknown
+        filename = (metadata or {}).get('filename')
+        return bool(filename) and os.path.isabs(filename) and not os.path.exists(filename)
+    
+    def _gc_collection(self, collection, id_fn, is_orphan, dry_run):
+        # Deduplicate one collection by stable ID; returns entries removed
+        groups = {}
+        doomed = []
+        step = self._max_batch_size()
+        for entry_id, doc, metadata in self._pages(collection):
+            if is_orphan and is_orphan(metadata):
+                doomed.append(entry_id)
+                continue
+            groups.setdefault(id_fn(doc, metadata), []).append((entry_id, metadata or {}))
+        
+        moves = []
+        for canonical, entries in groups.items():
+            # Keep the newest entry, preferring one already under its stable ID
+            keep = max(entries, key=lambda e: (
+                e[1].get("timestamp") or e[1].get("indexed_at") or "", e[0] == canonical))
+            doomed.extend(entry_id for entry_id, _ in entries if entry_id != keep[0])
+            if keep[0] != canonical:
+                moves.append((keep[0], canonical))
+        
+        if dry_run:
+            return len(doomed)
+        
+        for start in range(0, len(moves), step):
+            batch = moves[start:start + step]
+            old = collection.get(ids=[m[0] for m in batch],
+                                 include=["documents", "metadatas", "embeddings"])
+            rename = dict(batch)
+            collection.upsert(
+                ids=[rename[entry_id] for entry_id in old["ids"]],
+                documents=old["documents"],
+                metadatas=old["metadatas"],
+                embeddings=old["embeddings"]
+            )
+            doomed.extend(old["ids"])
+        
+        for start in range(0, len(doomed), step):
+            collection.delete(ids=doomed[start:start + step])
+        return len(doomed) - len(moves)
+    
+    def quantize(self, dtype, dim=None):
+        # Convert every collection to a compact storage layout (flat backend)
+        collections = [collection for _, collection, _ in self._all_collections()]
+        if not all(hasattr(c, "reencode") for c in collections):
+            raise ValueError("Quantized storage needs the flat vector backend "
+                             "(WAYCODE_VECTOR_BACKEND=flat)")
+        return [collection.reencode(dtype, dim) for collection in collections]
+    
+    def recall_report(self, dtype, dim=None, k=10, samples=200, namespace=None):
+        # Recall@k of a storage layout against full precision, measured on
+        # the indexed code units of one namespace with their cached
+        # full-precision vectors
+        from waycode.config import FLAT_RESCORE_FACTOR
+        from waycode.rag.quantization import recall_report
+        collection = self._collection("code_patterns", namespace)
+        documents = []
+        step = self._max_batch_size()
+        while True:
+            page = collection.get(include=["documents"], limit=step, offset=len(documents))
+            if not page["ids"]:
+                break
+            documents.extend(page["documents"])
+        vectors = [v for v in self.embedder.cached_documents(documents) if v is not None]
+        return recall_report(vectors, dtype, dim, k, samples, FLAT_RESCORE_FACTOR)
+    
+    def embed_query(self, query):
+        # Embed a query once so it can be reused across collections
+        return self.embedder.generate_query_embedding(query)
+    
+    def search_similar_code(self, query, n_results=3, query_embedding=None, namespace=None,
+                            language=None, path_prefix=None):
+        # Query existing codebase patterns of one namespace
+        return self._query("code_patterns", query, n_results, query_embedding, namespace,
+                           language, path_prefix)
+    
+    def search_refactor_history(self, query, n_results=3, query_embedding=None, namespace=None,
+                                language=None, path_prefix=None):
+        # Query past refactoring transformations of one namespace
+        return self._query("refactor_history", query, n_results, query_embedding, namespace,
+                           language, path_prefix)
+    
+    def search_style_patterns(self, query, n_results=3, query_embedding=None):
+        # Query style conventions for consistency
+        return self._query("style_preferences", query, n_results, query_embedding)
+    
+    def _query(self, base, query, n_results, query_embedding=None, namespace=None,
+               language=None, path_prefix=None):
+        # Run a similarity query, embedding the text only if no vector is
+        # given. Language is filtered by the store; a path prefix is applied
+        # to an over-fetched result since Chroma has no prefix operator.
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        collection = self._collection(base, namespace)
+        fetch = n_results * PATH_FILTER_OVERFETCH if path_prefix else n_results
+        with span(f"{self.backend.name}.query.{base}") as stage:
+            result = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=fetch,
+                where={"language": language} if language else None
+            )
+            if path_prefix:
+                result = _filter_path_prefix(result, path_prefix, n_results)
+            stage["results"] = len((result.get("ids") or [[]])[0])
+        return result
+    
+    def get_all_styles(self):
+        # Retrieve all stored style preferences
+        try:
+            return self.style_collection.get()
+        except:
+            return None
@@ -0,0 +1,148 @@
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from waycode.config import (
+    INDEXED_EXTENSIONS, WATCH_POLL_INTERVAL, WATCH_DEBOUNCE, WATCH_MAX_DELAY
+)
+from waycode.rag.namespaces import git_root
+from waycode.utils.gitignore import IgnoreRules
+
+class IndexWatcher:
+    # Keep the index of a directory fresh while it changes. A poller thread
+    # stats the indexable files that git does not ignore and collects the
+    # paths whose size or mtime changed (or that appeared or vanished).
+    # Once no change has arrived for `debounce` seconds (or `max_delay`
+    # after the first change of a burst, e.g. a branch checkout) the paths
+    # go to a worker thread as one batch for ProjectIndexer.index_files,
+    # which skips files whose content did not change and re-embeds only
+    # the units that did. Polling keeps working while a batch is indexed;
+    # batches queued meanwhile are merged.
+    #
+    # `lock` is a context manager factory held around each batch, so a
+    # daemon can keep serving queries between batches.
+    
+    def __init__(self, indexer, path, recursive=True, interval=WATCH_POLL_INTERVAL,
+                 debounce=WATCH_DEBOUNCE, max_delay=WATCH_MAX_DELAY, lock=None, on_batch=None,
+                 on_file=None):
+        self.indexer = indexer
+        self.path = os.path.abspath(path)
+        self.recursive = recursive
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.lock = lock or nullcontext
+        self.on_batch = on_batch
+        self.on_file = on_file
+        # Rules are rooted at the repository so that .git/info/exclude and
+        # the .gitignore files above a watched subdirectory apply too
+        directory = self.path if os.path.isdir(self.path) else os.path.dirname(self.path)
+        self.ignore = IgnoreRules(git_root(directory) or directory)
+        self.snapshot = self.scan()
+        self._pending = set()
+        self._first_change = self._last_change = None
+        self._batches = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+    
+    def scan(self):
+        # {path: (mtime_ns, size)} of every watched file
+        if os.path.isfile(self.path):
+            candidates = [self.path]
+        else:
+            candidates = self._walk()
+        files = {}
+        for filepath in candidates:
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                # Deleted between listing and stat
+                continue
+            files[filepath] = (stat.st_mtime_ns, stat.st_size)
+        return files
+    
+    def _walk(self):
+        # Indexable files under the watched directory, pruning ignored ones
+        for dirpath, dirs, names in os.walk(self.path):
+            if self.recursive:
+                dirs[:] = [d for d in dirs if not self.ignore.ignored(os.path.join(dirpath, d), True)]
+            else:
+                dirs[:] = []
+            for name in names:
+                filepath = os.path.join(dirpath, name)
+                if os.path.splitext(name)[1] in INDEXED_EXTENSIONS and not self.ignore.ignored(filepath):
+                    yield filepath
+    
+    def poll(self, now=None):
+        # Rescan and return a batch of changed paths once the current burst
+        # has settled, else None
+        now = time.monotonic() if now is None else now
+        current = self.scan()
+        changed = {path for path, state in current.items() if self.snapshot.get(path) != state}
+        changed.update(path for path in self.snapshot if path not in current)
+        self.snapshot = current
+        
+        if changed:
+            self._pending |= changed
+            self._last_change = now
+            if self._first_change is None:
+                self._first_change = now
+        if not self._pending:
+            return None
+        if now - self._last_change < self.debounce and now - self._first_change < self.max_delay:
+            return None
+        batch = sorted(self._pending)
+        self._pending = set()
+        self._first_change = self._last_change = None
+        return batch
+    
+    def start(self):
+        # Run the poller and the indexing worker in the background
+        self._threads = [threading.Thread(target=self._poll_loop, name="waycode-watch", daemon=True),
+                         threading.Thread(target=self._work_loop, name="waycode-reindex", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+    
+    def stop(self):
+        # Stop polling and wait for the batch in progress to finish
+        self._stop.set()
+        self._batches.put(None)
+        for thread in self._threads:
+            thread.join()
+    
+    def _poll_loop(self):
+        while not self._stop.wait(self.interval):
+            batch = self.poll()
+            if batch:
+                self._batches.put(batch)
+    
+    def _work_loop(self):
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            # Merge whatever queued up while the previous batch ran
+            paths = set(batch)
+            while not self._batches.empty():
+                more = self._batches.get()
+                if more is None:
+                    self._stop.set()
+                    break
+                paths.update(more)
+            self.run_batch(sorted(paths))
+            if self._stop.is_set():
+                return
+    
+    def run_batch(self, paths):
+        # Re-index one batch of changed paths
+        try:
+            with self.lock():
+                summary = self.indexer.index_files(paths, on_file=self.on_file)
+        except Exception as e:
+            # Keep watching; the next change to these files retries them
+            summary = {"paths": len(paths), "error": str(e)}
+        if self.on_batch:
+            self.on_batch(summary)
+        return summary
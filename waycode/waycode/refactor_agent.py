@@ -1,156 +1,467 @@
-import os
-import sys
-import json
-from google import genai
-from google.genai import types
-from waycode.config import *
-from waycode.rag.memory_manager import MemoryManager
-from waycode.rag.context_builder import ContextBuilder
-from waycode.utils.code_analyzer import CodeAnalyzer
-from waycode.utils.diff_generator import DiffGenerator
-
-class RefactorAgent:
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
-        self.memory = MemoryManager()
-        self.context_builder = ContextBuilder(self.memory)
-        self.analyzer = CodeAnalyzer()
-        self.diff_gen = DiffGenerator()
-        
-    def refactor_code(self, code, language, filename=None):
-        print("Analyzing code...")
-        
-        # Retrieve context from vector memory
-        context = self.context_builder.build_context(code, language)
-        
-        # Prepare prompt with RAG context
-        prompt = REFACTOR_PROMPT.format(
-            memory_context=context,
-            language=language,
-            code=code
-        )
-        
-        print("Generating refactor using AI model...")
-        
-        # model generation without search tool to avoid quota issues
-        response = self.client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=TEMPERATURE
-            )
-        )
-        
-        result = response.text
-        refactored = self._parse_refactored_code(result)
-        
-        if refactored:
-            # Calculate code changes
-            diff = self.diff_gen.generate_diff(code, refactored['code'])
-            
-            # Store operation in memory for future reference
-            self.memory.store_refactoring(
-                original=code,
-                refactored=refactored['code'],
-                language=language,
-                filename=filename,
-                changes=refactored.get('explanation', '')
-            )
-            
-            print("\nRefactoring complete!")
-            print("\n" + "="*60)
-            print("EXPLANATION:")
-            print("="*60)
-            print(refactored.get('explanation', 'No explanation provided'))
-            print("\n" + "="*60)
-            print("DIFF:")
-            print("="*60)
-            print(diff)
-            print("\n" + "="*60)
-            print("REFACTORED CODE:")
-            print("="*60)
-            print(refactored['code'])
-            
-            return refactored['code']
-        else:
-            print("Could not parse refactored code")
-            print(result)
-            return None
-    
-    def _parse_refactored_code(self, response):
-        # Extract code and explanation sections from model response
-        lines = response.split('\n')
-        in_code = False
-        code_lines = []
-        explanation_lines = []
-        current_section = 'explanation'
-        
-        for line in lines:
-            if line.strip().startswith('```'):
-                if in_code:
-                    in_code = False
-                    current_section = 'explanation'
-                else:
-                    in_code = True
-                    current_section = 'code'
-                continue
-            
-            if in_code:
-                code_lines.append(line)
-            elif current_section == 'explanation':
-                explanation_lines.append(line)
-        
-        if code_lines:
-            return {
-                'code': '\n'.join(code_lines),
-                'explanation': '\n'.join(explanation_lines).strip()
-            }
-        
-        return None
-    
-    def analyze_project_file(self, filepath):
-        # Index file content for knowledge base
-        print(f"Learning from {filepath}...")
-        
-        with open(filepath, 'r', encoding='utf-8') as f:
-            code = f.read()
-        
-        language = self.analyzer.detect_language(filepath)
-        self.memory.index_file(filepath, code, language)
-        
-        print(f"Indexed {filepath}")
-
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python refactor_agent.py <file_path>")
-        print("   or: python refactor_agent.py --index <file_path>")
-        sys.exit(1)
-    
-    agent = RefactorAgent()
-    
-    if sys.argv[1] == '--index':
-        # indexing mode
-        filepath = sys.argv[2]
-        agent.analyze_project_file(filepath)
-    else:
-        # refactor mode
-        filepath = sys.argv[1]
-        
-        with open(filepath, 'r', encoding='utf-8') as f:
-            code = f.read()
-        
-        language = agent.analyzer.detect_language(filepath)
-        refactored = agent.refactor_code(code, language, filepath)
-        
-        if refactored:
-            # write output to file
-            output_path = f"./output/{os.path.basename(filepath)}"
-            os.makedirs('./output', exist_ok=True)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(refactored)
-            
-            print(f"\nSaved to: {output_path}")
-
-if __name__ == "__main__":
-    main()
+import asyncio
+import os
+import random
+import sys
+import json
+import threading
+from types import SimpleNamespace
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
+from waycode.config import (
+    GEMINI_MODEL, TEMPERATURE, REFACTOR_PROMPT, LLM_CACHE_ENABLED, REFACTOR_MAX_RETRIES,
+    REFACTOR_RETRY_BASE_DELAY, REFACTOR_CONCURRENCY, LARGE_FILE_TOKENS, get_api_key
+)
+from waycode.rag.memory_manager import MemoryManager
+from waycode.rag.context_builder import ContextBuilder
+from waycode.utils.call_limiter import CallLimiter
+from waycode.utils.code_analyzer import CodeAnalyzer
+from waycode.utils.diff_generator import DiffGenerator
+from waycode.utils.response_cache import ResponseCache
+from waycode.utils.response_parser import ResponseParser
+from waycode.utils.profiler import span
+from waycode.utils.tokens import estimate_tokens, tokens_for_chars
+
+class RefactorAgent:
+    def __init__(self, use_cache=LLM_CACHE_ENABLED, use_memory=True, split_large_files=True,
+                 diff_mode='unified', color=False, retrieval_mode=None, project=None,
+                 concurrency=REFACTOR_CONCURRENCY):
+        # The model client and project memory are built on first use, so
+        # commands that never reach them don't pay for their setup
+        self.use_memory = use_memory
+        # Files above LARGE_FILE_TOKENS are refactored in segments
+        self.split_large_files = split_large_files
+        self.analyzer = CodeAnalyzer()
+        self.diff_gen = DiffGenerator()
+        # How changes are reported: 'unified', 'stat' (line counts only) or 'none'
+        self.diff_mode = diff_mode
+        self.color = color
+        # 'hybrid', 'vector' or 'lexical' (None: WAYCODE_RETRIEVAL)
+        self.retrieval_mode = retrieval_mode
+        # Namespace override for retrieval and history (None: the file's git repository)
+        self.project = project
+        # Optional on-disk cache of raw model responses
+        self.response_cache = ResponseCache() if use_cache else None
+        # Bound on async model calls in flight, shared by files and segments
+        self.model_calls = CallLimiter(concurrency)
+        self._client = None
+        self._memory = None
+        self._context_builder = None
+        self._memory_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        # GenAI client configured from the environment
+        if self._client is None:
+            self._client = genai.Client(api_key=get_api_key())
+        return self._client
+    
+    @property
+    def memory(self):
+        # Project memory backed by the vector store and refactor history
+        with self._memory_lock:
+            if self._memory is None:
+                self._memory = MemoryManager(self.retrieval_mode, self.project)
+        return self._memory
+    
+    @property
+    def context_builder(self):
+        # Retrieval context assembly over project memory
+        if self._context_builder is None:
+            self._context_builder = ContextBuilder(self.memory)
+        return self._context_builder
+        
+    def refactor_code(self, code, language, filename=None):
+        with span("refactor"):
+            return self._refactor_code(code, language, filename)
+    
+    def _refactor_code(self, code, language, filename):
+        print("Analyzing code...")
+        
+        if self._should_split(code, language):
+            result = None
+            refactored = self._refactor_split(code, language, filename)
+        else:
+            prompt = self._build_prompt(code, language, filename)
+            cache_key, result = self._cached_response(prompt)
+            cached = result is not None
+            
+            if cached:
+                print("Using cached response")
+            else:
+                print("Generating refactor using AI model...")
+                result = self.generate(prompt)
+            
+            refactored = self._parse_refactored_code(result or '')
+            if refactored and not cached:
+                self._store_response(cache_key, result)
+            refactored = self._finalize(code, language, filename, refactored, cached)
+        
+        if refactored:
+            print("\nRefactoring complete!")
+            print("\n" + "="*60)
+            print("EXPLANATION:")
+            print("="*60)
+            print(refactored.get('explanation', 'No explanation provided'))
+            self._print_diff(refactored)
+            print("\n" + "="*60)
+            print("REFACTORED CODE:")
+            print("="*60)
+            print(refactored['code'])
+            
+            return refactored['code']
+        else:
+            print("Could not parse refactored code")
+            if result:
+                print(result)
+            return None
+    
+    def _should_split(self, code, language):
+        # Large files with several top-level definitions are refactored in segments
+        if not self.split_large_files or estimate_tokens(code) <= LARGE_FILE_TOKENS:
+            return False
+        from waycode.split_refactor import SplitRefactorer
+        return SplitRefactorer(self).can_split(code, language)
+    
+    def _refactor_split(self, code, language, filename):
+        # Split-and-stitch path for large files; returns the finalized dict or None
+        from waycode.split_refactor import SplitRefactorer
+        splitter = SplitRefactorer(self)
+        print(f"Large file: refactoring in segments of up to {splitter.max_tokens} tokens...")
+        parsed = splitter.refactor(code, language, filename)
+        self._report_split(parsed)
+        return self._finalize(code, language, filename, parsed, False)
+    
+    def _report_split(self, parsed):
+        # Tell the user which segments were left as they were
+        if parsed and parsed['failed_segments']:
+            print(f"Kept segment(s) {', '.join(map(str, parsed['failed_segments']))} "
+                  f"of {parsed['segments']} unchanged")
+    
+    def generate(self, prompt):
+        # Single blocking model call returning the raw response text
+        # (model generation without search tool to avoid quota issues)
+        with span("generate") as stage:
+            response = self.client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=TEMPERATURE
+                )
+            )
+            self._count_tokens(stage, prompt, response.text, getattr(response, 'usage_metadata', None))
+        return response.text
+    
+    def _count_tokens(self, stage, prompt, text, usage=None, chars=None):
+        # Record prompt/response tokens, preferring the model's own counts;
+        # chars stands in for text when the response was never held whole
+        estimate = tokens_for_chars(chars) if chars is not None else estimate_tokens(text or '')
+        stage["tokens_in"] = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prompt)
+        stage["tokens_out"] = getattr(usage, 'candidates_token_count', None) or estimate
+    
+    async def arefactor_code(self, code, language, filename=None):
+        # Non-printing async variant used for concurrent multi-file runs.
+        # Returns the parsed result dict (code, explanation, diff, cached) or None.
+        with span("refactor"):
+            return await self._arefactor_code(code, language, filename)
+    
+    async def _arefactor_code(self, code, language, filename):
+        loop = asyncio.get_running_loop()
+        
+        if self._should_split(code, language):
+            from waycode.split_refactor import SplitRefactorer
+            parsed = await SplitRefactorer(self).arefactor(code, language, filename)
+            return await loop.run_in_executor(
+                None, self._finalize, code, language, filename, parsed, False
+            )
+        
+        # Context retrieval talks to Chroma synchronously; keep it off the loop
+        prompt = await loop.run_in_executor(None, self._build_prompt, code, language, filename)
+        cache_key, result = self._cached_response(prompt)
+        cached = result is not None
+        
+        if not cached:
+            result = await self._agenerate_with_retry(prompt)
+        
+        refactored = self._parse_refactored_code(result or '')
+        if refactored and not cached:
+            self._store_response(cache_key, result)
+        return await loop.run_in_executor(
+            None, self._finalize, code, language, filename, refactored, cached
+        )
+    
+    async def _agenerate_with_retry(self, prompt):
+        # Call the async model API, backing off on rate limits and overloads
+        for attempt in range(REFACTOR_MAX_RETRIES + 1):
+            try:
+                async with self.model_calls:
+                    with span("generate", attempt=attempt) as stage:
+                        response = await self.client.aio.models.generate_content(
+                            model=GEMINI_MODEL,
+                            contents=prompt,
+                            config=types.GenerateContentConfig(
+                                temperature=TEMPERATURE
+                            )
+                        )
+                        self._count_tokens(stage, prompt, response.text,
+                                           getattr(response, 'usage_metadata', None))
+                return response.text
+            except genai_errors.APIError as e:
+                if e.code not in (429, 500, 503) or attempt == REFACTOR_MAX_RETRIES:
+                    raise
+                delay = REFACTOR_RETRY_BASE_DELAY * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+    
+    def _build_prompt(self, code, language, filename=None):
+        # Retrieve context from vector memory and prepare the prompt
+        with span("prompt") as stage:
+            if self.use_memory:
+                context = self.context_builder.build_context(code, language, filename)
+            else:
+                context = f"Language: {language}"
+            
+            prompt = REFACTOR_PROMPT.format(
+                memory_context=context,
+                language=language,
+                code=code
+            )
+            stage["tokens_out"] = estimate_tokens(prompt)
+        return prompt
+    
+    def _cached_response(self, prompt):
+        # Return (cache_key, cached_response); both None when caching is off
+        if not self.response_cache:
+            return None, None
+        with span("cache.lookup") as stage:
+            cache_key = ResponseCache.make_key(prompt, GEMINI_MODEL, TEMPERATURE)
+            response = self.response_cache.get(cache_key)
+            stage["hit"] = response is not None
+        return cache_key, response
+    
+    def _store_response(self, cache_key, response):
+        # Cache a well-formed raw response for replay
+        if cache_key and response:
+            with span("cache.store", bytes_written=len(response.encode('utf-8'))):
+                self.response_cache.put(cache_key, response)
+    
+    def _finalize(self, code, language, filename, refactored, cached=False, diff_mode=None):
+        # Compute the diff for a parsed result and record it in history
+        if not refactored:
+            return None
+        
+        # Calculate code changes
+        with span("diff"):
+            refactored['diff'] = self.render_diff(
+                code, refactored['code'], diff_mode or self.diff_mode, filename)
+        refactored['cached'] = cached
+        
+        # Store operation in memory for future reference; serialized because
+        # concurrent refactors share the same history file
+        if not self.use_memory:
+            return refactored
+        memory = self.memory
+        with self._memory_lock, span("history"):
+            memory.store_refactoring(
+                original=code,
+                refactored=refactored['code'],
+                language=language,
+                filename=filename,
+                changes=refactored.get('explanation', '')
+            )
+        
+        return refactored
+    
+    def render_diff(self, original, refactored, diff_mode='unified', filename=None):
+        # Diff text for the given mode; 'stat' never builds hunks
+        if diff_mode == 'none':
+            return ''
+        if diff_mode == 'stat':
+            name = os.path.basename(filename) if filename else 'refactored'
+            return self.diff_gen.format_stat(self.diff_gen.stat(original, refactored), name)
+        return self.diff_gen.generate_diff(original, refactored)
+    
+    def _print_diff(self, refactored):
+        # Print the diff section, coloured when writing to a terminal
+        if self.diff_mode == 'none':
+            return
+        print("\n" + "="*60)
+        print("DIFF STAT:" if self.diff_mode == 'stat' else "DIFF:")
+        print("="*60)
+        diff = refactored['diff']
+        print(self.diff_gen.colorize(diff) if self.color else diff)
+    
+    def refactor_code_stream(self, code, language, filename=None, output_path=None):
+        # Stream the model response, printing explanation and code as lines
+        # arrive and writing code lines to output_path as they complete
+        with span("refactor"):
+            return self._refactor_code_stream(code, language, filename, output_path)
+    
+    def _refactor_code_stream(self, code, language, filename, output_path):
+        print("Analyzing code...")
+        
+        if self._should_split(code, language):
+            # Segments finish out of order, so large files are not streamed
+            refactored = self._refactor_split(code, language, filename)
+            if not refactored:
+                print("\nCould not refactor file")
+                return None
+            if output_path:
+                os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    f.write(refactored['code'])
+            print(refactored['explanation'])
+            self._print_diff(refactored)
+            print("\nRefactoring complete!")
+            return refactored['code']
+        
+        prompt = self._build_prompt(code, language, filename)
+        cache_key, cached_response = self._cached_response(prompt)
+        cached = cached_response is not None
+        
+        if cached:
+            print("Using cached response")
+            chunks = [SimpleNamespace(text=cached_response)]
+        else:
+            print("Generating refactor using AI model...")
+            chunks = self.client.models.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=types.GenerateContentConfig(
+                    temperature=TEMPERATURE
+                )
+            )
+        
+        parser = ResponseParser()
+        writer = _StreamingOutput(output_path)
+        try:
+            with span("generate.stream") as stage:
+                # Count characters as they pass rather than keeping a copy;
+                # the final chunk carries the model's usage counts
+                chars = 0
+                usage = None
+                for chunk in chunks:
+                    text = chunk.text or ''
+                    chars += len(text)
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    for section, line in parser.feed(text):
+                        writer.emit(section, line)
+                for section, line in parser.close():
+                    writer.emit(section, line)
+                self._count_tokens(stage, prompt, None, usage, chars)
+                stage["bytes_written"] = writer.bytes_written
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        
+        refactored = parser.result()
+        if not refactored or not refactored['complete']:
+            writer.abort()
+            print("\nCould not parse refactored code")
+            return None
+        
+        if not cached and self.response_cache:
+            self._store_response(cache_key, parser.render(language))
+        refactored = self._finalize(code, language, filename, refactored, cached)
+        
+        self._print_diff(refactored)
+        print("\nRefactoring complete!")
+        
+        return refactored['code']
+    
+    def _parse_refactored_code(self, response):
+        # Extract code and explanation sections from model response; a code
+        # block that was never closed is a truncated response and is rejected
+        with span("parse"):
+            parsed = ResponseParser.parse(response)
+        if parsed and not parsed['complete']:
+            return None
+        return parsed
+    
+    def analyze_project_file(self, filepath):
+        # Index file content for knowledge base
+        print(f"Learning from {filepath}...")
+        
+        with open(filepath, 'r', encoding='utf-8') as f:
+            code = f.read()
+        
+        language = self.analyzer.detect_language(filepath)
+        self.memory.index_file(filepath, code, language)
+        
+        print(f"Indexed {filepath}")
+
+class _StreamingOutput:
+    # Print streamed sections under headers and append code lines to a file
+    def __init__(self, output_path=None):
+        self.output_path = output_path
+        self.section = None
+        self.file = None
+        self.wrote_code = False
+        self.bytes_written = 0
+    
+    def emit(self, section, line):
+        if section != self.section:
+            title = "EXPLANATION:" if section == 'explanation' else "REFACTORED CODE:"
+            print("\n" + "="*60)
+            print(title)
+            print("="*60)
+            self.section = section
+        print(line, flush=True)
+        
+        if section == 'code' and self.output_path:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+                self.file = open(self.output_path, 'w', encoding='utf-8')
+            # Lines are joined with newlines, matching the non-streaming output
+            text = ('\n' if self.wrote_code else '') + line
+            self.file.write(text)
+            self.bytes_written += len(text.encode('utf-8'))
+            self.file.flush()
+            self.wrote_code = True
+    
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+    
+    def abort(self):
+        # Remove a partially written output file
+        self.close()
+        if self.wrote_code and os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        self.wrote_code = False
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python refactor_agent.py <file_path>")
+        print("   or: python refactor_agent.py --index <file_path>")
+        sys.exit(1)
+    
+    agent = RefactorAgent()
+    
+    if sys.argv[1] == '--index':
+        # indexing mode
+        filepath = sys.argv[2]
+        agent.analyze_project_file(filepath)
+    else:
+        # refactor mode
+        filepath = sys.argv[1]
+        
+        with open(filepath, 'r', encoding='utf-8') as f:
+            code = f.read()
+        
+        language = agent.analyzer.detect_language(filepath)
+        refactored = agent.refactor_code(code, language, filepath)
+        
+        if refactored:
+            # write output to file
+            output_path = f"./output/{os.path.basename(filepath)}"
+            os.makedirs('./output', exist_ok=True)
+            
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(refactored)
+            
+            print(f"\nSaved to: {output_path}")
+
+if __name__ == "__main__":
+    main()
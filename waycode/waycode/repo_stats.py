@@ -0,0 +1,95 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from waycode.config import INDEXED_EXTENSIONS, IGNORED_DIRS, INDEX_WORKERS
+from waycode.utils.code_analyzer import CodeAnalyzer
+
+# Sort keys accepted by `waycode stats --sort`, largest first except name/file
+FILE_SORT_KEYS = ('max_complexity', 'total_complexity', 'nesting_level', 'function_count',
+                  'code_lines', 'file')
+FUNCTION_SORT_KEYS = ('complexity', 'nesting', 'lines', 'name')
+
+_analyzer = None
+
+def analyze_path(filepath):
+    # Process pool entry point: metrics for one file, or an error record
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = CodeAnalyzer()
+    try:
+        return _analyzer.analyze_file(filepath)
+    except (OSError, ValueError, RecursionError) as e:
+        return {'file': filepath, 'error': str(e), 'functions': []}
+
+class RepoStats:
+    # Complexity report for a whole tree. Files are analyzed on a process
+    # pool since tokenizing and parsing is CPU bound, then ranked so the
+    # worst refactor candidates come first.
+    
+    def __init__(self, workers=INDEX_WORKERS):
+        self.workers = max(1, workers)
+    
+    def discover(self, path):
+        # Yield source files under path, skipping vendored and hidden dirs
+        if os.path.isfile(path):
+            yield os.path.abspath(path)
+            return
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS and not d.startswith('.'))
+            for name in sorted(names):
+                if os.path.splitext(name)[1] in INDEXED_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(root, name))
+    
+    def collect(self, path):
+        # Analyze every file and return (file reports, elapsed seconds)
+        started = time.perf_counter()
+        files = list(self.discover(path))
+        if self.workers == 1 or len(files) < 2 * self.workers:
+            # A pool costs more to start than it saves on small trees
+            reports = [analyze_path(f) for f in files]
+        else:
+            chunksize = max(1, min(64, len(files) // (self.workers * 4)))
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                reports = list(pool.map(analyze_path, files, chunksize=chunksize))
+        
+        base = path if os.path.isdir(path) else os.path.dirname(path)
+        for report in reports:
+            report['file'] = os.path.relpath(report['file'], base)
+        return reports, time.perf_counter() - started
+    
+    def file_rows(self, reports, sort='max_complexity'):
+        # One row per file, ranked by the given metric
+        rows = [r for r in reports if 'total_lines' in r]
+        reverse = sort != 'file'
+        return sorted(rows, key=lambda r: (r.get(sort) or 0) if reverse else r['file'], reverse=reverse)
+    
+    def function_rows(self, reports, sort='complexity'):
+        # One row per function across all files, ranked by the given metric
+        rows = [
+            dict(function, file=report['file'], lines=function['end_line'] - function['line'] + 1)
+            for report in reports for function in report['functions']
+        ]
+        if sort == 'name':
+            return sorted(rows, key=lambda r: (r['name'], r['file']))
+        return sorted(rows, key=lambda r: r[sort], reverse=True)
+    
+    def format_files(self, rows):
+        # Text table for file rows
+        header = f"{'Max CC':>6} {'Sum CC':>7} {'Nest':>5} {'Funcs':>6} {'Lines':>7}  File"
+        lines = [header, "-" * len(header)]
+        for r in rows:
+            lines.append(
+                f"{r.get('max_complexity', 0):>6} {r.get('total_complexity', 0):>7} "
+                f"{r.get('nesting_level', 0):>5} {r.get('function_count', 0):>6} "
+                f"{r.get('code_lines', 0):>7}  {r['file']}" + ("  (syntax error)" if r.get('error') else "")
+            )
+        return "\n".join(lines)
+    
+    def format_functions(self, rows):
+        # Text table for function rows
+        header = f"{'CC':>4} {'Nest':>5} {'Lines':>6}  Function"
+        lines = [header, "-" * len(header)]
+        for r in rows:
+            lines.append(f"{r['complexity']:>4} {r['nesting']:>5} {r['lines']:>6}  "
+                         f"{r['file']}:{r['line']} {r['name']}")
+        return "\n".join(lines)
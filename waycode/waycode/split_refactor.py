@@ -0,0 +1,237 @@
+import ast
+import asyncio
+import logging
+from google.genai import errors as genai_errors
+from waycode.config import SEGMENT_PROMPT, SEGMENT_MAX_TOKENS, MODULE_CONTEXT_TOKENS
+from waycode.rag.chunker import CodeChunker
+from waycode.utils.js_lexer import JSLexer
+from waycode.utils.profiler import span
+from waycode.utils.tokens import estimate_tokens
+
+# Line prefixes of comments that belong to the definition below them
+COMMENT_PREFIXES = {'python': ('#',), 'javascript': ('//', '/*', '*'), 'typescript': ('//', '/*', '*')}
+
+# Leading statements hoisted from refactored segments into the preamble
+IMPORT_PREFIXES = {'python': ('import ', 'from '), 'javascript': ('import ',), 'typescript': ('import ',)}
+
+# Blank lines placed between stitched top-level segments
+SEPARATORS = {'python': '\n\n\n'}
+
+logger = logging.getLogger(__name__)
+
+class SplitRefactorer:
+    # Refactor files too large for one prompt. The file is split at top-level
+    # definition boundaries into segments of at most max_tokens; each segment
+    # is refactored concurrently with the module preamble and an outline of
+    # the rest of the file as shared context, then the results are stitched
+    # back in order and validated before anything is returned. Model calls
+    # go through the agent, whose limiter also bounds the calls of other
+    # files refactored at the same time.
+    
+    def __init__(self, agent, max_tokens=SEGMENT_MAX_TOKENS):
+        self.agent = agent
+        self.max_tokens = max_tokens
+        self.chunker = CodeChunker()
+    
+    def split(self, code, language):
+        # Return (preamble, segments); each segment is a dict with the
+        # original text, 1-based line span and the symbols it defines
+        lines = code.splitlines(keepends=True)
+        units = [
+            u for u in self.chunker.chunk(code, language)
+            if u['kind'] not in ('method', 'module')
+        ]
+        units = self._top_level(units)
+        if not units:
+            return code, []
+        
+        starts = [self._start_with_comments(lines, u, language, prev) for u, prev in
+                  zip(units, [None] + units[:-1])]
+        preamble = ''.join(lines[:starts[0] - 1])
+        
+        pieces = []
+        for i, unit in enumerate(units):
+            end = starts[i + 1] - 1 if i + 1 < len(units) else len(lines)
+            text = ''.join(lines[starts[i] - 1:end])
+            pieces.append({'text': text, 'start_line': starts[i], 'end_line': end,
+                           'symbols': [unit['symbol']], 'tokens': estimate_tokens(text)})
+        
+        # Group adjacent definitions while they fit in one segment
+        segments = []
+        for piece in pieces:
+            last = segments[-1] if segments else None
+            if last and last['tokens'] + piece['tokens'] <= self.max_tokens:
+                last['text'] += piece['text']
+                last['end_line'] = piece['end_line']
+                last['symbols'] += piece['symbols']
+                last['tokens'] += piece['tokens']
+            else:
+                segments.append(dict(piece))
+        return preamble, segments
+    
+    def _top_level(self, units):
+        # Drop units nested inside another unit, in source order
+        units = sorted(units, key=lambda u: (u['start_line'], -u['end_line']))
+        top = []
+        for unit in units:
+            if top and unit['start_line'] <= top[-1]['end_line']:
+                continue
+            top.append(unit)
+        return top
+    
+    def _start_with_comments(self, lines, unit, language, previous):
+        # Move a unit's first line up over the comment block directly above it
+        start = unit['start_line']
+        floor = previous['end_line'] + 1 if previous else 1
+        prefixes = COMMENT_PREFIXES.get(language, ('#', '//'))
+        while start - 1 >= floor and lines[start - 2].strip().startswith(prefixes):
+            start -= 1
+        return start
+    
+    def can_split(self, code, language):
+        # True when the file has at least two segments to work with
+        return len(self.split(code, language)[1]) >= 2
+    
+    def refactor(self, code, language, filename=None):
+        # Blocking entry point; see arefactor
+        return asyncio.run(self.arefactor(code, language, filename))
+    
+    async def arefactor(self, code, language, filename=None):
+        # Refactor every segment and return the stitched result dict
+        # (code, explanation, segments, failed_segments) or None
+        preamble, segments = self.split(code, language)
+        if len(segments) < 2:
+            return None
+        
+        outline = self._outline(preamble, segments)
+        
+        async def worker(index, segment):
+            with span("segment", tokens_in=segment['tokens']):
+                return await self._refactor_segment(
+                    index, segment, len(segments), outline, language, filename)
+        
+        results = await asyncio.gather(*(worker(i, s) for i, s in enumerate(segments)))
+        failed = [i + 1 for i, result in enumerate(results) if result is None]
+        if len(failed) == len(segments):
+            return None
+        
+        with span("stitch"):
+            stitched = self.stitch(preamble, [
+                result['code'] if result else segment['text']
+                for segment, result in zip(segments, results)
+            ], language)
+            if not self.validate(stitched, language):
+                return None
+        
+        explanations = [
+            f"[Segment {i + 1}, lines {s['start_line']}-{s['end_line']}: {', '.join(s['symbols'])}]\n"
+            + (r['explanation'] if r else "Left unchanged: the model output was unusable.")
+            for i, (s, r) in enumerate(zip(segments, results))
+        ]
+        return {
+            'code': stitched,
+            'explanation': "\n\n".join(explanations),
+            'segments': len(segments),
+            'failed_segments': failed
+        }
+    
+    async def _refactor_segment(self, index, segment, total, outline, language, filename):
+        # Refactor one segment; None when the model call failed (after the
+        # agent's retries) or the output is missing or invalid
+        agent = self.agent
+        loop = asyncio.get_running_loop()
+        prompt = await loop.run_in_executor(
+            None, self._build_prompt, index, segment, total, outline, language, filename)
+        cache_key, response = agent._cached_response(prompt)
+        cached = response is not None
+        try:
+            if not cached:
+                response = await agent._agenerate_with_retry(prompt)
+        except genai_errors.APIError as e:
+            logger.warning("Segment %d of %s failed: %s", index + 1, filename or "<unknown>", e)
+            return None
+        
+        result = agent._parse_refactored_code(response or '')
+        if not result or not self.validate(result['code'], language):
+            return None
+        if not cached:
+            agent._store_response(cache_key, response)
+        return result
+    
+    def _build_prompt(self, index, segment, total, outline, language, filename):
+        # Segment prompt with project memory retrieved for this segment only
+        if self.agent.use_memory:
+            context = self.agent.context_builder.build_context(segment['text'], language,
+                                                               filename)
+        else:
+            context = f"Language: {language}"
+        return SEGMENT_PROMPT.format(
+            memory_context=context,
+            module_context=outline,
+            language=language,
+            filename=filename or "<unknown>",
+            index=index + 1,
+            total=total,
+            code=segment['text'].strip('\n')
+        )
+    
+    def _outline(self, preamble, segments):
+        # Shared module context: the preamble plus the first line of every
+        # top-level definition, trimmed to MODULE_CONTEXT_TOKENS
+        parts = [preamble.strip('\n')]
+        for segment in segments:
+            for line in segment['text'].splitlines():
+                stripped = line.strip()
+                if line[:1] not in (' ', '\t') and stripped and not stripped.startswith(('#', '//', '@')):
+                    parts.append(line.rstrip() + " ...")
+        outline = "\n".join(p for p in parts if p)
+        limit = MODULE_CONTEXT_TOKENS * 4
+        return outline if len(outline) <= limit else outline[:limit] + "\n..."
+    
+    def stitch(self, preamble, codes, language):
+        # Join refactored segments in order, hoisting new leading imports
+        # into the preamble so every segment can see them
+        prefixes = IMPORT_PREFIXES.get(language, ())
+        preamble_lines = preamble.rstrip('\n').splitlines()
+        present = {line.strip() for line in preamble_lines}
+        bodies = []
+        for code in codes:
+            lines = code.strip('\n').splitlines()
+            while lines and prefixes and lines[0].startswith(prefixes):
+                line = lines.pop(0)
+                if line.strip() not in present:
+                    present.add(line.strip())
+                    preamble_lines.append(line)
+            while lines and not lines[0].strip():
+                lines.pop(0)
+            bodies.append("\n".join(lines))
+        
+        separator = SEPARATORS.get(language, '\n\n')
+        head = "\n".join(preamble_lines).rstrip('\n')
+        body = separator.join(b for b in bodies if b)
+        return (head + separator + body if head else body) + "\n"
+    
+    def validate(self, code, language):
+        # True when code parses (Python) or tokenizes with balanced brackets
+        if language == 'python':
+            try:
+                ast.parse(code)
+                return True
+            except SyntaxError:
+                return False
+        return self._balanced(code)
+    
+    def _balanced(self, code):
+        # Bracket balance over JS/TS tokens (strings and comments excluded)
+        pairs = {')': '(', ']': '[', '}': '{'}
+        stack = []
+        for tok in JSLexer().tokenize(code):
+            if tok.kind != 'punct':
+                continue
+            for ch in tok.value:
+                if ch in '([{':
+                    stack.append(ch)
+                elif ch in pairs:
+                    if not stack or stack.pop() != pairs[ch]:
+                        return False
+        return not stack
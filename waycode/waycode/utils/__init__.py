@@ -1,5 +1,8 @@
-from .code_analyzer import CodeAnalyzer
-from .diff_generator import DiffGenerator
-
-# Define public classes for the utils package
-__all__ = ['CodeAnalyzer', 'DiffGenerator']
+from .code_analyzer import CodeAnalyzer
+from .diff_generator import DiffGenerator
+from .js_lexer import JSLexer
+from .response_parser import ResponseParser
+from .profiler import Profiler
+
+# Define public classes for the utils package
+__all__ = ['CodeAnalyzer', 'DiffGenerator', 'JSLexer', 'ResponseParser', 'Profiler']
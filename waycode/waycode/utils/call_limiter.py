@@ -0,0 +1,31 @@
+import asyncio
+import threading
+import weakref
+
+class CallLimiter:
+    # Async context manager bounding concurrent model calls. One instance
+    # is shared by everything an agent runs (the files of refactor-dir and
+    # the segments of every split file), so --concurrency caps the calls in
+    # flight overall. A semaphore is kept per event loop because blocking
+    # entry points each run their own loop with asyncio.run.
+    
+    def __init__(self, limit):
+        self.limit = max(1, limit)
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+    
+    def _semaphore(self):
+        # Semaphore of the running event loop, created on first use
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+        return semaphore
+    
+    async def __aenter__(self):
+        await self._semaphore().acquire()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self._semaphore().release()
@@ -1,60 +1,284 @@
-import os
-
-class CodeAnalyzer:
-    def __init__(self):
-        # Map of file extensions to their respective languages
-        self.language_extensions = {
-            '.py': 'python',
-            '.js': 'javascript',
-            '.ts': 'typescript',
-            '.jsx': 'javascript',
-            '.tsx': 'typescript',
-            '.java': 'java',
-            '.cpp': 'cpp',
-            '.c': 'c',
-            '.go': 'go',
-            '.rs': 'rust',
-            '.rb': 'ruby',
-            '.php': 'php',
-            '.cs': 'csharp',
-            '.swift': 'swift',
-            '.kt': 'kotlin',
-            '.scala': 'scala',
-            '.html': 'html',
-            '.css': 'css',
-            '.sql': 'sql',
-            '.sh': 'bash',
-        }
-    
-    def detect_language(self, filepath):
-        # Identify language based on file extension
-        _, ext = os.path.splitext(filepath)
-        return self.language_extensions.get(ext.lower(), 'unknown')
-    
-    def analyze_complexity(self, code):
-        # Generate basic code complexity metrics
-        lines = code.split('\n')
-        non_empty_lines = [l for l in lines if l.strip()]
-        
-        metrics = {
-            'total_lines': len(lines),
-            'code_lines': len(non_empty_lines),
-            'nesting_level': self._calculate_nesting(code),
-            'function_count': code.count('def ') + code.count('function ')
-        }
-        
-        return metrics
-    
-    def _calculate_nesting(self, code):
-        # Calculate deepest level of brace or parenthesis nesting
-        max_nesting = 0
-        current_nesting = 0
-        
-        for char in code:
-            if char in ('{', '('):
-                current_nesting += 1
-                max_nesting = max(max_nesting, current_nesting)
-            elif char in ('}', ')'):
-                current_nesting = max(0, current_nesting - 1)
-        
-        return max_nesting
+import ast
+import os
+from waycode.utils.js_lexer import JSLexer
+
+# Python statements that open a nested block
+PY_BLOCKS = frozenset(getattr(ast, name) for name in (
+    'If', 'For', 'AsyncFor', 'While', 'With', 'AsyncWith', 'Try', 'TryStar', 'Match',
+    'FunctionDef', 'AsyncFunctionDef', 'ClassDef'
+) if hasattr(ast, name))
+
+# Python nodes that add a branch to a function's cyclomatic complexity
+PY_DECISIONS = frozenset(getattr(ast, name) for name in (
+    'If', 'For', 'AsyncFor', 'While', 'IfExp', 'ExceptHandler', 'Assert', 'match_case'
+) if hasattr(ast, name))
+
+PY_FUNCTIONS = frozenset((ast.FunctionDef, ast.AsyncFunctionDef))
+
+# JS/TS tokens that add a branch to a function's cyclomatic complexity
+JS_DECISION_KEYWORDS = {'if', 'for', 'while', 'case', 'catch'}
+JS_DECISION_OPERATORS = {'&&', '||', '??'}
+# Identifiers before '(' that start a control statement, not a function
+JS_CONTROL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'with', 'return', 'typeof', 'await'}
+
+class CodeAnalyzer:
+    def __init__(self):
+        # Map of file extensions to their respective languages
+        self.language_extensions = {
+            '.py': 'python',
+            '.js': 'javascript',
+            '.ts': 'typescript',
+            '.jsx': 'javascript',
+            '.tsx': 'typescript',
+            '.java': 'java',
+            '.cpp': 'cpp',
+            '.c': 'c',
+            '.go': 'go',
+            '.rs': 'rust',
+            '.rb': 'ruby',
+            '.php': 'php',
+            '.cs': 'csharp',
+            '.swift': 'swift',
+            '.kt': 'kotlin',
+            '.scala': 'scala',
+            '.html': 'html',
+            '.css': 'css',
+            '.sql': 'sql',
+            '.sh': 'bash',
+        }
+    
+    def detect_language(self, filepath):
+        # Identify language based on file extension
+        _, ext = os.path.splitext(filepath)
+        return self.language_extensions.get(ext.lower(), 'unknown')
+    
+    def analyze_file(self, filepath):
+        # Metrics for one file on disk, tagged with its path
+        with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+            code = f.read()
+        metrics = self.analyze_complexity(code, self.detect_language(filepath))
+        metrics['file'] = filepath
+        return metrics
+    
+    def analyze_complexity(self, code, language='python'):
+        # Generate code complexity metrics: line counts, block nesting depth,
+        # function and class counts and cyclomatic complexity per function
+        if language in ('javascript', 'typescript'):
+            metrics = self._analyze_js(code)
+        elif language == 'python':
+            metrics = self._analyze_python(code)
+        else:
+            metrics = self._analyze_lines(code)
+        
+        functions = metrics['functions']
+        metrics.update({
+            'language': language,
+            'total_lines': len(code.split('\n')),
+            'function_count': len(functions),
+            'max_complexity': max((f['complexity'] for f in functions), default=0),
+            'total_complexity': sum(f['complexity'] for f in functions)
+        })
+        return metrics
+    
+    # Python
+    
+    def _analyze_python(self, code):
+        # One ast walk for structure and complexity; string spans from the
+        # same walk keep '#' inside multi-line strings out of comment counts
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            metrics = self._analyze_lines(code)
+            metrics['error'] = 'syntax'
+            return metrics
+        
+        functions = []
+        classes = 0
+        max_depth = 0
+        string_lines = set()
+        # `elif` branches are If nodes nested in orelse, not a deeper block
+        elifs = set()
+        # (node, block depth, enclosing function record, qualified name prefix)
+        stack = [(child, 0, None, '') for child in reversed(tree.body)]
+        while stack:
+            node, depth, owner, prefix = stack.pop()
+            kind = type(node)
+            if kind in PY_BLOCKS and id(node) not in elifs:
+                depth += 1
+                max_depth = max(max_depth, depth)
+                if owner is not None:
+                    owner['nesting'] = max(owner['nesting'], depth - owner['depth'])
+            
+            if kind in PY_FUNCTIONS:
+                owner = {'name': prefix + node.name, 'line': node.lineno,
+                         'end_line': node.end_lineno or node.lineno,
+                         'complexity': 1, 'nesting': 0, 'depth': depth}
+                functions.append(owner)
+                prefix += node.name + '.'
+            elif kind is ast.ClassDef:
+                classes += 1
+                prefix += node.name + '.'
+            elif kind is ast.Constant:
+                if node.end_lineno != node.lineno and isinstance(node.value, str):
+                    string_lines.update(range(node.lineno + 1, node.end_lineno + 1))
+                continue
+            elif owner is not None:
+                if kind in PY_DECISIONS:
+                    owner['complexity'] += 1
+                elif kind is ast.BoolOp:
+                    owner['complexity'] += len(node.values) - 1
+                elif kind is ast.comprehension:
+                    owner['complexity'] += 1 + len(node.ifs)
+            
+            if kind is ast.If and len(node.orelse) == 1 and type(node.orelse[0]) is ast.If:
+                elifs.add(id(node.orelse[0]))
+            for child in reversed(list(ast.iter_child_nodes(node))):
+                stack.append((child, depth, owner, prefix))
+        
+        code_lines = comment_lines = 0
+        for number, line in enumerate(code.split('\n'), 1):
+            stripped = line.lstrip()
+            if number in string_lines:
+                code_lines += 1
+            elif stripped.startswith('#'):
+                comment_lines += 1
+            elif stripped:
+                code_lines += 1
+        
+        for function in functions:
+            del function['depth']
+        functions.sort(key=lambda f: f['line'])
+        return {
+            'code_lines': code_lines,
+            'comment_lines': comment_lines,
+            'nesting_level': max_depth,
+            'class_count': classes,
+            'functions': functions
+        }
+    
+    # JavaScript / TypeScript
+    
+    def _analyze_js(self, code):
+        # One pass over lexer tokens: strings, comments and regexes never
+        # count as braces, keywords or operators
+        tokens = JSLexer().tokenize(code, include_comments=True)
+        code_lines, comment_lines = set(), set()
+        functions = []
+        classes = 0
+        depth = max_depth = 0
+        # Open function bodies as (brace depth, record); parens as token indexes
+        open_functions = []
+        parens = []
+        last_group = None
+        significant = [t for t in tokens if t.kind != 'comment']
+        
+        for tok in tokens:
+            target = comment_lines if tok.kind == 'comment' else code_lines
+            target.update(range(tok.line, tok.end_line + 1))
+        
+        for i, tok in enumerate(significant):
+            value = tok.value
+            owner = open_functions[-1][1] if open_functions else None
+            
+            if tok.kind == 'ident':
+                previous = significant[i - 1].value if i else None
+                if value == 'class' and previous != '.':
+                    classes += 1
+                elif value in JS_DECISION_KEYWORDS and previous != '.' and owner:
+                    owner['complexity'] += 1
+                continue
+            if tok.kind != 'punct':
+                continue
+            
+            if value in JS_DECISION_OPERATORS and owner:
+                owner['complexity'] += 1
+            elif value == '?' and owner and not self._js_optional_marker(significant, i):
+                owner['complexity'] += 1
+            elif value == '(':
+                parens.append(i)
+            elif value == ')':
+                last_group = (parens.pop() if parens else None, i)
+            elif value == '=>':
+                name = self._js_arrow_name(significant, i, last_group)
+                record = {'name': name, 'line': tok.line, 'end_line': tok.line,
+                          'complexity': 1, 'nesting': 0}
+                functions.append(record)
+                if i + 1 < len(significant) and significant[i + 1].value == '{':
+                    # The body brace opens the function on the next token
+                    open_functions.append((depth + 1, record))
+            elif value == '{':
+                depth += 1
+                max_depth = max(max_depth, depth)
+                name = self._js_function_name(significant, i, last_group)
+                if name:
+                    record = {'name': name, 'line': significant[last_group[0]].line,
+                              'end_line': tok.line, 'complexity': 1, 'nesting': 0}
+                    functions.append(record)
+                    open_functions.append((depth, record))
+                for start, record in open_functions:
+                    record['nesting'] = max(record['nesting'], depth - start)
+            elif value == '}':
+                while open_functions and open_functions[-1][0] == depth:
+                    record = open_functions.pop()[1]
+                    record['end_line'] = tok.line
+                depth = max(0, depth - 1)
+        
+        functions.sort(key=lambda f: f['line'])
+        return {
+            'code_lines': len(code_lines),
+            'comment_lines': len(comment_lines),
+            'nesting_level': max_depth,
+            'class_count': classes,
+            'functions': functions
+        }
+    
+    def _js_function_name(self, tokens, i, last_group):
+        # Name of the function whose body starts at the '{' at index i, or
+        # None when the brace opens a block, object or class body
+        if not last_group or last_group[0] is None or not last_group[0]:
+            return None
+        open_idx, close_idx = last_group
+        if close_idx != i - 1:
+            # Allow a TypeScript return type annotation: `): Type {`
+            if tokens[close_idx + 1].value != ':' or i - close_idx > 8:
+                return None
+        before = tokens[open_idx - 1]
+        if before.value == 'function' or before.value == '*':
+            return self._js_binding_name(tokens, open_idx - 1)
+        if before.kind != 'ident' or before.value in JS_CONTROL_KEYWORDS:
+            return None
+        # `function name(`, `function* name(` or a method `name(`
+        return before.value
+    
+    def _js_arrow_name(self, tokens, i, last_group):
+        # Binding name of an arrow function (`const name = (...) =>`)
+        start = i - 1
+        if last_group and last_group[1] == i - 1 and last_group[0] is not None:
+            start = last_group[0]
+        return self._js_binding_name(tokens, start)
+    
+    def _js_binding_name(self, tokens, start):
+        # Name a function expression starting at `start` is assigned to
+        k = start - 1
+        while k >= 0 and tokens[k].value in ('async', 'function', '*'):
+            k -= 1
+        if k >= 1 and tokens[k].value in ('=', ':') and tokens[k - 1].kind == 'ident':
+            return tokens[k - 1].value
+        return '<anonymous>'
+    
+    def _js_optional_marker(self, tokens, i):
+        # TypeScript optional markers (`name?: T`, `name?)`) are not ternaries
+        nxt = tokens[i + 1].value if i + 1 < len(tokens) else None
+        return nxt in (':', ')', ',', '=')
+    
+    # Other languages
+    
+    def _analyze_lines(self, code):
+        # Line counts only, for languages without a tokenizer here
+        return {
+            'code_lines': sum(1 for line in code.split('\n') if line.strip()),
+            'comment_lines': 0,
+            'nesting_level': 0,
+            'class_count': 0,
+            'functions': []
+        }
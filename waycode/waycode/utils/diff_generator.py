@@ -1,37 +1,363 @@
-import difflib
-
-class DiffGenerator:
-    def generate_diff(self, original, refactored):
-        # Generate standard unified diff format
-        original_lines = original.splitlines(keepends=True)
-        refactored_lines = refactored.splitlines(keepends=True)
-        
-        diff = difflib.unified_diff(
-            original_lines,
-            refactored_lines,
-            fromfile='original',
-            tofile='refactored',
-            lineterm=''
-        )
-        
-        return ''.join(diff)
-    
-    def generate_side_by_side(self, original, refactored):
-        # Create a split-view comparison of code changes
-        original_lines = original.splitlines()
-        refactored_lines = refactored.splitlines()
-        
-        max_len = max(len(original_lines), len(refactored_lines))
-        
-        result = []
-        result.append(f"{'ORIGINAL':<50} | {'REFACTORED':<50}")
-        result.append("-" * 103)
-        
-        for i in range(max_len):
-            orig = original_lines[i] if i < len(original_lines) else ''
-            refac = refactored_lines[i] if i < len(refactored_lines) else ''
-            
-            # Format lines into two columns
-            result.append(f"{orig:<50} | {refac:<50}")
-        
-        return '\n'.join(result)
+from bisect import bisect_left
+from itertools import zip_longest
+from math import isqrt
+from waycode.config import DIFF_CONTEXT_LINES, DIFF_MIN_COST_LIMIT, SIDE_BY_SIDE_WIDTH
+
+# ANSI escape sequences used when colour output is requested
+COLORS = {
+    'header': '\033[1m',
+    'hunk': '\033[36m',
+    'delete': '\033[31m',
+    'insert': '\033[32m',
+    'change': '\033[33m',
+}
+RESET = '\033[0m'
+
+NO_NEWLINE = "\\ No newline at end of file"
+
+def intern_lines(a, b):
+    # Map every distinct line to a small int so the diff compares ints
+    # instead of strings
+    ids = {}
+    return ([ids.setdefault(line, len(ids)) for line in a],
+            [ids.setdefault(line, len(ids)) for line in b])
+
+def _unique_matches(a, b, a_lo, a_hi, b_lo, b_hi):
+    # Longest increasing run of lines that occur exactly once on each side
+    # (the patience diff anchors), as (i, j) pairs in order
+    counts = {}
+    for i in range(a_lo, a_hi):
+        entry = counts.get(a[i])
+        counts[a[i]] = [i, 1, 0, None] if entry is None else [i, 2, 0, None]
+    for j in range(b_lo, b_hi):
+        entry = counts.get(b[j])
+        if entry is not None and entry[1] == 1:
+            entry[2] += 1
+            entry[3] = j
+    pairs = sorted((e[0], e[3]) for e in counts.values() if e[1] == 1 and e[2] == 1)
+    if not pairs:
+        return []
+    
+    # Patience sort on the b positions to find the longest increasing subsequence
+    tails, tail_index, back = [], [], [None] * len(pairs)
+    for n, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        back[n] = tail_index[pos - 1] if pos else None
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(n)
+        else:
+            tails[pos] = j
+            tail_index[pos] = n
+    result = []
+    n = tail_index[-1]
+    while n is not None:
+        result.append(pairs[n])
+        n = back[n]
+    result.reverse()
+    return result
+
+def _middle_snake(a, b, left, top, right, bottom, max_cost):
+    # Linear-space Myers: run the forward and backward searches until they
+    # overlap and return the diagonal ((x1, y1), (x2, y2)) where they meet,
+    # or None when they have not met after max_cost steps each
+    width, height = right - left, bottom - top
+    delta = width - height
+    limit = (width + height + 1) // 2
+    if limit > max_cost:
+        limit = max_cost
+    vf = [0] * (2 * limit + 4)
+    vb = [0] * (2 * limit + 4)
+    vf[1] = left
+    vb[1] = bottom
+    for d in range(limit + 1):
+        for k in range(d, -d - 1, -2):
+            if k == -d or (k != d and vf[k - 1] < vf[k + 1]):
+                x = vf[k + 1]
+            else:
+                x = vf[k - 1] + 1
+            y = top + (x - left) - k
+            x0, y0 = x, y
+            while x < right and y < bottom and a[x] == b[y]:
+                x += 1
+                y += 1
+            vf[k] = x
+            c = k - delta
+            if delta & 1 and -(d - 1) <= c <= d - 1 and y >= vb[c]:
+                return (x0, y0), (x, y)
+        for c in range(d, -d - 1, -2):
+            if c == -d or (c != d and vb[c - 1] > vb[c + 1]):
+                y = vb[c + 1]
+            else:
+                y = vb[c - 1] - 1
+            k = c + delta
+            x = left + (y - top) + k
+            x0, y0 = x, y
+            while x > left and y > top and a[x - 1] == b[y - 1]:
+                x -= 1
+                y -= 1
+            vb[c] = y
+            if not delta & 1 and -d <= k <= d and x <= vf[k]:
+                return (x, y), (x0, y0)
+    return None
+
+def _myers(a, b, a_lo, a_hi, b_lo, b_hi, matches, max_cost):
+    # Append the matched (i, j) pairs of a minimal diff of the two ranges,
+    # splitting at middle snakes with an explicit stack instead of recursion.
+    # A sub-range costing more than max_cost edits keeps no matches and
+    # becomes a single replace, so heavily rewritten files stay fast.
+    stack = [(a_lo, b_lo, a_hi, b_hi)]
+    while stack:
+        item = stack.pop()
+        if item[0] == 'snake':
+            _, x, y, length = item
+            matches.extend((x + n, y + n) for n in range(length))
+            continue
+        left, top, right, bottom = item
+        while left < right and top < bottom and a[left] == b[top]:
+            matches.append((left, top))
+            left += 1
+            top += 1
+        suffix = 0
+        while left < right - suffix and top < bottom - suffix and \
+                a[right - suffix - 1] == b[bottom - suffix - 1]:
+            suffix += 1
+        if suffix:
+            # Emitted once the rest of this range has been visited
+            stack.append(('snake', right - suffix, bottom - suffix, suffix))
+            right -= suffix
+            bottom -= suffix
+        if left == right or top == bottom:
+            continue
+        
+        snake = _middle_snake(a, b, left, top, right, bottom, max_cost)
+        if snake is None:
+            continue
+        (x1, y1), (x2, y2) = snake
+        stack.append((x2, y2, right, bottom))
+        stack.append(('snake', x1, y1, x2 - x1))
+        stack.append((left, top, x1, y1))
+    return matches
+
+def _patience(a, b, a_lo, a_hi, b_lo, b_hi, matches, max_cost):
+    # Patience diff: anchor on lines unique to both sides, recurse into the
+    # gaps and fall back to Myers where there are no unique lines left
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        matches.append((a_lo, b_lo))
+        a_lo += 1
+        b_lo += 1
+    suffix = []
+    while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+        a_hi -= 1
+        b_hi -= 1
+        suffix.append((a_hi, b_hi))
+    
+    anchors = _unique_matches(a, b, a_lo, a_hi, b_lo, b_hi) if a_lo < a_hi and b_lo < b_hi else []
+    if anchors:
+        i, j = a_lo, b_lo
+        for ai, bj in anchors:
+            _patience(a, b, i, ai, j, bj, matches, max_cost)
+            matches.append((ai, bj))
+            i, j = ai + 1, bj + 1
+        _patience(a, b, i, a_hi, j, b_hi, matches, max_cost)
+    elif a_lo < a_hi and b_lo < b_hi and not set(a[a_lo:a_hi]).isdisjoint(b[b_lo:b_hi]):
+        # (Ranges sharing no line at all are one replace; skip the search)
+        _myers(a, b, a_lo, a_hi, b_lo, b_hi, matches, max_cost)
+    matches.extend(reversed(suffix))
+    return matches
+
+def diff_opcodes(a, b):
+    # difflib-style (tag, i1, i2, j1, j2) opcodes for two sequences of
+    # hashable items, using patience anchors over a linear-space Myers diff
+    a, b = intern_lines(a, b)
+    max_cost = max(DIFF_MIN_COST_LIMIT, isqrt(len(a) + len(b) + 3))
+    matches = _patience(a, b, 0, len(a), 0, len(b), [], max_cost)
+    end = (len(a), len(b))
+    
+    opcodes = []
+    i = j = 0
+    for mi, mj in matches + [end]:
+        if mi > i or mj > j:
+            tag = 'replace' if mi > i and mj > j else 'delete' if mi > i else 'insert'
+            opcodes.append((tag, i, mi, j, mj))
+        if (mi, mj) == end:
+            break
+        last = opcodes[-1] if opcodes else None
+        if last and last[0] == 'equal' and last[2] == mi and last[4] == mj:
+            opcodes[-1] = ('equal', last[1], mi + 1, last[3], mj + 1)
+        else:
+            opcodes.append(('equal', mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+def group_opcodes(opcodes, context=DIFF_CONTEXT_LINES):
+    # Yield hunks (lists of opcodes) with up to `context` equal lines around
+    # each change, like difflib.SequenceMatcher.get_grouped_opcodes
+    if not opcodes:
+        return
+    codes = list(opcodes)
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # A long unchanged run ends the current hunk
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+class DiffGenerator:
+    # Line diffs between original and refactored code. Hunks and
+    # side-by-side rows are produced lazily, so callers can stream them.
+    
+    def __init__(self, context=DIFF_CONTEXT_LINES, color=False):
+        self.context = context
+        self.color = color
+    
+    def opcodes(self, original, refactored):
+        # Edit script between the two texts, one entry per changed region
+        return diff_opcodes(original.splitlines(keepends=True), refactored.splitlines(keepends=True))
+    
+    def iter_diff(self, original, refactored, fromfile='original', tofile='refactored'):
+        # Yield unified diff lines (without line endings) hunk by hunk
+        a = original.splitlines(keepends=True)
+        b = refactored.splitlines(keepends=True)
+        started = False
+        for group in group_opcodes(diff_opcodes(a, b), self.context):
+            if not started:
+                yield self._paint('header', f"--- {fromfile}")
+                yield self._paint('header', f"+++ {tofile}")
+                started = True
+            yield from self._hunk_lines(group, a, b)
+    
+    def hunks(self, original, refactored):
+        # Yield each hunk as a dict: its unified diff text (header included)
+        # and the 0-based [start, end) line ranges it covers in both texts
+        a = original.splitlines(keepends=True)
+        b = refactored.splitlines(keepends=True)
+        for group in group_opcodes(diff_opcodes(a, b), self.context):
+            changes = [op for op in group if op[0] != 'equal']
+            yield {
+                'text': '\n'.join(self._hunk_lines(group, a, b)),
+                'old_start': group[0][1], 'old_end': group[-1][2],
+                'new_start': group[0][3], 'new_end': group[-1][4],
+                # Lines actually changed, without the surrounding context
+                'changed_start': changes[0][1], 'changed_end': changes[-1][2]
+            }
+    
+    def _hunk_lines(self, group, a, b):
+        # Header and body lines of one hunk
+        first, last = group[0], group[-1]
+        yield self._paint('hunk', "@@ -{} +{} @@".format(
+            _range(first[1], last[2]), _range(first[3], last[4])))
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield from self._emit(' ', line, None)
+                continue
+            for line in a[i1:i2]:
+                yield from self._emit('-', line, 'delete')
+            for line in b[j1:j2]:
+                yield from self._emit('+', line, 'insert')
+    
+    def generate_diff(self, original, refactored):
+        # Generate standard unified diff format
+        return '\n'.join(self.iter_diff(original, refactored))
+    
+    def stat(self, original, refactored):
+        # Count inserted and deleted lines without building any hunks
+        a = original.splitlines(keepends=True)
+        b = refactored.splitlines(keepends=True)
+        insertions = deletions = 0
+        for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+            if tag != 'equal':
+                deletions += i2 - i1
+                insertions += j2 - j1
+        return {'insertions': insertions, 'deletions': deletions}
+    
+    def format_stat(self, stat, name='refactored', width=40):
+        # git-style "name | N +++---" summary of a stat() result
+        changed = stat['insertions'] + stat['deletions']
+        scale = min(1.0, width / changed) if changed else 0
+        plus = int(round(stat['insertions'] * scale))
+        minus = int(round(stat['deletions'] * scale))
+        bar = self._paint('insert', '+' * plus) + self._paint('delete', '-' * minus)
+        return (f" {name} | {changed} {bar}\n"
+                f" 1 file changed, {stat['insertions']} insertions(+), "
+                f"{stat['deletions']} deletions(-)")
+    
+    def iter_side_by_side(self, original, refactored, width=SIDE_BY_SIDE_WIDTH):
+        # Yield aligned two-column rows; the gutter shows '|' for changed,
+        # '<' for deleted and '>' for inserted lines
+        a = original.splitlines()
+        b = refactored.splitlines()
+        yield f"{'ORIGINAL':<{width}}   REFACTORED"
+        yield "-" * (2 * width + 3)
+        for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+            if tag == 'equal':
+                for left, right in zip(a[i1:i2], b[j1:j2]):
+                    yield self._row(left, ' ', right, None, width)
+                continue
+            for left, right in zip_longest(a[i1:i2], b[j1:j2]):
+                if left is None:
+                    yield self._row('', '>', right, 'insert', width)
+                elif right is None:
+                    yield self._row(left, '<', '', 'delete', width)
+                else:
+                    yield self._row(left, '|', right, 'change', width)
+    
+    def generate_side_by_side(self, original, refactored):
+        # Create a split-view comparison of code changes
+        return '\n'.join(self.iter_side_by_side(original, refactored))
+    
+    def colorize(self, diff_text):
+        # Add ANSI colours to an already rendered unified diff
+        painted = []
+        for line in diff_text.split('\n'):
+            if line.startswith(('---', '+++')):
+                painted.append(_paint('header', line))
+            elif line.startswith('@@'):
+                painted.append(_paint('hunk', line))
+            elif line.startswith('-'):
+                painted.append(_paint('delete', line))
+            elif line.startswith('+'):
+                painted.append(_paint('insert', line))
+            else:
+                painted.append(line)
+        return '\n'.join(painted)
+    
+    def _emit(self, prefix, line, kind):
+        # One diff line, plus the marker for a missing final newline
+        text = line.rstrip('\r\n')
+        yield self._paint(kind, prefix + text)
+        if text == line:
+            yield NO_NEWLINE
+    
+    def _row(self, left, gutter, right, kind, width):
+        left = left.expandtabs(4)[:width]
+        right = right.expandtabs(4)[:width]
+        return self._paint(kind, f"{left:<{width}} {gutter} {right}".rstrip())
+    
+    def _paint(self, kind, text):
+        return _paint(kind, text) if self.color and kind and text else text
+
+def _paint(kind, text):
+    return f"{COLORS[kind]}{text}{RESET}" if kind else text
+
+def _range(start, stop):
+    # Unified diff range: 1-based start and length, as difflib formats it
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    if not length:
+        start -= 1
+    return f"{start + 1},{length}"
@@ -0,0 +1,50 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    # Exclusive inter-process lock on a sidecar file, also safe across threads
+    def __init__(self, path):
+        # Lock file is created lazily on first acquire
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._fd = None
+    
+    def __enter__(self):
+        # Block until both the thread and the file lock are held
+        self._thread_lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+        except BaseException:
+            self._release()
+            raise
+        return self
+    
+    def __exit__(self, *exc):
+        # Release on exit, never swallowing exceptions
+        self._release()
+        return False
+    
+    def _release(self):
+        # Drop the file lock and close the descriptor, then the thread lock
+        if self._fd is not None:
+            try:
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
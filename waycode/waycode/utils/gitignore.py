@@ -0,0 +1,110 @@
+import os
+import re
+from waycode.config import IGNORED_DIRS
+
+def _glob_regex(pattern):
+    # Regex body for one gitignore glob: * and ? stop at slashes, ** spans
+    # directories, [...] is a character class
+    out = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            out.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and pattern.find(']', i + 2) != -1:
+            end = pattern.find(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            out.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(out)
+
+def parse_rules(lines):
+    # Compile gitignore lines into (regex, negated, directory_only) rules
+    rules = []
+    for line in lines:
+        line = line.rstrip('\r\n').rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        directory_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to its directory
+        anchored = '/' in line
+        regex = ('' if anchored else '(?:.*/)?') + _glob_regex(line.lstrip('/')) + '$'
+        rules.append((re.compile(regex), negated, directory_only))
+    return rules
+
+class IgnoreRules:
+    # .gitignore matching under a root directory: the rules of every
+    # .gitignore from the root down to a path apply, deeper files and later
+    # lines winning, plus .git/info/exclude and IGNORED_DIRS. Files are
+    # re-read when their mtime changes. Callers walking the tree prune
+    # ignored directories, so a path's ancestors are not re-checked.
+    
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._cache = {}
+    
+    def _rules(self, directory):
+        # Rules of one directory's .gitignore (and the root's exclude file)
+        sources = [os.path.join(directory, '.gitignore')]
+        if directory == self.root:
+            sources.insert(0, os.path.join(directory, '.git', 'info', 'exclude'))
+        rules = []
+        for source in sources:
+            try:
+                mtime = os.stat(source).st_mtime_ns
+            except OSError:
+                continue
+            cached = self._cache.get(source)
+            if not cached or cached[0] != mtime:
+                with open(source, 'r', encoding='utf-8', errors='replace') as f:
+                    cached = (mtime, parse_rules(f))
+                self._cache[source] = cached
+            rules.extend(cached[1])
+        return rules
+    
+    def ignored(self, path, is_dir=False):
+        # True when git would ignore path
+        path = os.path.abspath(path)
+        if is_dir and os.path.basename(path) in IGNORED_DIRS:
+            return True
+        relative = os.path.relpath(path, self.root)
+        if relative.startswith(os.pardir):
+            return False
+        parts = relative.replace(os.sep, '/').split('/')
+        ignored = False
+        directory = self.root
+        for depth in range(len(parts)):
+            if depth:
+                directory = os.path.join(directory, parts[depth - 1])
+            candidate = '/'.join(parts[depth:])
+            for regex, negated, directory_only in self._rules(directory):
+                if directory_only and not is_dir:
+                    continue
+                if regex.match(candidate):
+                    ignored = not negated
+        return ignored
@@ -0,0 +1,209 @@
+import re
+
+# Keywords after which a '/' starts a regex literal rather than a division
+REGEX_PRECEDING_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+IDENT_RE = re.compile(r'[A-Za-z_$][\w$]*')
+NUMBER_RE = re.compile(r'\d[\w.]*')
+PUNCT_3 = ('===', '!==', '**=', '<<=', '>>=', '>>>', '...', '&&=', '||=', '??=')
+PUNCT_2 = ('=>', '==', '!=', '<=', '>=', '&&', '||', '??', '?.', '++', '--',
+           '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<', '>>', '**')
+
+class JSToken:
+    __slots__ = ('kind', 'value', 'line', 'end_line')
+    
+    def __init__(self, kind, value, line, end_line):
+        # kind is one of: ident, number, string, template, regex, comment, punct
+        self.kind = kind
+        self.value = value
+        self.line = line
+        self.end_line = end_line
+    
+    def __repr__(self):
+        return f"JSToken({self.kind!r}, {self.value!r}, {self.line})"
+
+class JSLexer:
+    # Lightweight JavaScript/TypeScript lexer that understands strings,
+    # template literals, comments and regex literals well enough to track
+    # brace structure without a full parser.
+    
+    def tokenize(self, source, include_comments=False):
+        # Return the token list for a JS/TS source string
+        return list(self.iter_tokens(source, include_comments))
+    
+    def iter_tokens(self, source, include_comments=False):
+        # Yield tokens one at a time in source order
+        pos = 0
+        line = 1
+        length = len(source)
+        prev = None
+        
+        while pos < length:
+            ch = source[pos]
+            
+            if ch == '\n':
+                line += 1
+                pos += 1
+                continue
+            if ch.isspace():
+                pos += 1
+                continue
+            
+            start_line = line
+            
+            # Comments
+            if source.startswith('//', pos):
+                end = source.find('\n', pos)
+                end = length if end == -1 else end
+                if include_comments:
+                    yield JSToken('comment', source[pos:end], start_line, start_line)
+                pos = end
+                continue
+            if source.startswith('/*', pos):
+                end = source.find('*/', pos + 2)
+                end = length if end == -1 else end + 2
+                text = source[pos:end]
+                line += text.count('\n')
+                if include_comments:
+                    yield JSToken('comment', text, start_line, line)
+                pos = end
+                continue
+            
+            # String literals
+            if ch in ('"', "'"):
+                end = self._scan_string(source, pos, ch)
+                text = source[pos:end]
+                line += text.count('\n')
+                prev = JSToken('string', text, start_line, line)
+                yield prev
+                pos = end
+                continue
+            if ch == '`':
+                end = self._scan_template(source, pos)
+                text = source[pos:end]
+                line += text.count('\n')
+                prev = JSToken('template', text, start_line, line)
+                yield prev
+                pos = end
+                continue
+            
+            # Regex literals, distinguished from division by the previous token
+            if ch == '/' and self._regex_allowed(prev):
+                end = self._scan_regex(source, pos)
+                if end is not None:
+                    prev = JSToken('regex', source[pos:end], start_line, line)
+                    yield prev
+                    pos = end
+                    continue
+            
+            match = IDENT_RE.match(source, pos)
+            if match:
+                prev = JSToken('ident', match.group(), start_line, line)
+                yield prev
+                pos = match.end()
+                continue
+            
+            match = NUMBER_RE.match(source, pos)
+            if match:
+                prev = JSToken('number', match.group(), start_line, line)
+                yield prev
+                pos = match.end()
+                continue
+            
+            for width, table in ((3, PUNCT_3), (2, PUNCT_2)):
+                if source[pos:pos + width] in table:
+                    value = source[pos:pos + width]
+                    break
+            else:
+                value = ch
+            prev = JSToken('punct', value, start_line, line)
+            yield prev
+            pos += len(value)
+    
+    def _regex_allowed(self, prev):
+        # A regex may start at the beginning, after operators or after keywords
+        if prev is None:
+            return True
+        if prev.kind == 'punct':
+            return prev.value not in (')', ']', '}')
+        if prev.kind == 'ident':
+            return prev.value in REGEX_PRECEDING_KEYWORDS
+        return False
+    
+    def _scan_string(self, source, pos, quote):
+        # Return the index just past a quoted string literal
+        i = pos + 1
+        length = len(source)
+        while i < length:
+            c = source[i]
+            if c == '\\':
+                i += 2
+                continue
+            if c == quote or c == '\n':
+                return i + 1
+            i += 1
+        return length
+    
+    def _scan_template(self, source, pos):
+        # Return the index just past a template literal, including ${} parts
+        i = pos + 1
+        length = len(source)
+        while i < length:
+            c = source[i]
+            if c == '\\':
+                i += 2
+                continue
+            if c == '`':
+                return i + 1
+            if c == '$' and source.startswith('${', i):
+                i = self._scan_substitution(source, i + 2)
+                continue
+            i += 1
+        return length
+    
+    def _scan_substitution(self, source, pos):
+        # Skip the expression inside ${ ... } honouring nested strings and braces
+        depth = 1
+        i = pos
+        length = len(source)
+        while i < length and depth:
+            c = source[i]
+            if c in ('"', "'"):
+                i = self._scan_string(source, i, c)
+                continue
+            if c == '`':
+                i = self._scan_template(source, i)
+                continue
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            i += 1
+        return i
+    
+    def _scan_regex(self, source, pos):
+        # Return the index past a regex literal, or None if it is not one
+        i = pos + 1
+        length = len(source)
+        in_class = False
+        while i < length:
+            c = source[i]
+            if c == '\n':
+                return None
+            if c == '\\':
+                i += 2
+                continue
+            if c == '[':
+                in_class = True
+            elif c == ']':
+                in_class = False
+            elif c == '/' and not in_class:
+                i += 1
+                while i < length and (source[i].isalnum() or source[i] == '_'):
+                    i += 1
+                return i
+            i += 1
+        return None
@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Process-wide profiler used by span(); None when profiling is off
+_active = None
+
+class _NullSpan:
+    # Shared no-op span returned while profiling is disabled
+    def __enter__(self):
+        return {}
+    
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name, **attrs):
+    # Time a block as a named stage. The yielded dict collects attributes
+    # such as tokens_in, tokens_out and bytes_written for the stage.
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, **attrs)
+
+def activate(profiler):
+    # Route span() calls in every thread to this profiler
+    global _active
+    _active = profiler
+    return profiler
+
+def deactivate():
+    # Stop recording spans
+    global _active
+    _active = None
+
+class _Span:
+    def __init__(self, profiler, name, attrs):
+        self.profiler = profiler
+        self.name = name
+        self.attrs = attrs
+    
+    def __enter__(self):
+        # Push onto the thread's span stack and start the clock
+        stack = self.profiler._stack()
+        # Spans opened on worker threads nest under whatever the profiling
+        # thread currently has open (e.g. the stage that submitted them)
+        owner = self.profiler._owner_stack
+        parent = stack[-1] if stack else (owner[-1] if owner else None)
+        self.parent = parent.name if parent else None
+        self.depth = parent.depth + 1 if parent else 0
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self.attrs
+    
+    def __exit__(self, exc_type, exc, tb):
+        # Stop the clock and hand the finished span to the profiler
+        duration = time.perf_counter() - self.started
+        stack = self.profiler._stack()
+        # Interleaved coroutines may close spans out of order
+        if stack and stack[-1] is self:
+            stack.pop()
+        elif self in stack:
+            stack.remove(self)
+        if exc_type is not None:
+            self.attrs.setdefault("error", exc_type.__name__)
+        self.profiler._record({
+            "name": self.name,
+            "parent": self.parent,
+            "depth": self.depth,
+            "start_ms": (self.started - self.profiler.started) * 1000,
+            "duration_ms": duration * 1000,
+            "thread": threading.current_thread().name,
+            **self.attrs
+        })
+        return False
+
+class Profiler:
+    # Records wall time and attributes of nested stages across threads and
+    # renders them as a per-stage breakdown or JSON lines for aggregation.
+    
+    COUNTERS = ("tokens_in", "tokens_out", "bytes_written")
+    
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._owner = threading.get_ident()
+        self._owner_stack = []
+    
+    def span(self, name, **attrs):
+        # Context manager timing one stage
+        return _Span(self, name, dict(attrs))
+    
+    def _stack(self):
+        # Open spans of the calling thread, innermost last
+        if threading.get_ident() == self._owner:
+            return self._owner_stack
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+    
+    def _record(self, record):
+        # Store a finished span (spans finish on several threads)
+        with self._lock:
+            self.spans.append(record)
+    
+    def summary(self):
+        # Aggregate spans by stage name in order of first appearance
+        rows = {}
+        for record in sorted(self.spans, key=lambda r: r["start_ms"]):
+            row = rows.setdefault(record["name"], {
+                "name": record["name"], "depth": record["depth"], "calls": 0, "total_ms": 0.0,
+                **{counter: 0 for counter in self.COUNTERS}
+            })
+            row["calls"] += 1
+            row["total_ms"] += record["duration_ms"]
+            for counter in self.COUNTERS:
+                row[counter] += record.get(counter) or 0
+        return list(rows.values())
+    
+    def format_table(self):
+        # Human-readable breakdown printed by --profile
+        rows = self.summary()
+        wall = sum(r["duration_ms"] for r in self.spans if r["depth"] == 0) or 1e-9
+        header = f"{'Stage':<40} {'Calls':>5} {'Total ms':>10} {'%':>6} {'Tok in':>8} {'Tok out':>8} {'Bytes':>9}"
+        lines = [header, "-" * len(header)]
+        for row in rows:
+            name = ("  " * row["depth"] + row["name"])[:40]
+            lines.append(
+                f"{name:<40} {row['calls']:>5} {row['total_ms']:>10.1f} "
+                f"{100 * row['total_ms'] / wall:>5.1f}% "
+                f"{row['tokens_in'] or '':>8} {row['tokens_out'] or '':>8} {row['bytes_written'] or '':>9}"
+            )
+        return "\n".join(lines)
+    
+    def write_trace(self, path, **context):
+        # Append one JSON line per span, tagged with this run's id
+        timestamp = datetime.now().isoformat()
+        lines = [
+            json.dumps({"run_id": self.run_id, "timestamp": timestamp, **context, **record})
+            for record in sorted(self.spans, key=lambda r: r["start_ms"])
+        ]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
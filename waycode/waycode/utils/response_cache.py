@@ -0,0 +1,116 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from waycode.config import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_BYTES
+
+class ResponseCache:
+    # On-disk cache of raw model responses keyed by a hash of
+    # (prompt, model, temperature), with TTL and size-based LRU eviction.
+    
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connection(self):
+        # Open the SQLite database on first use
+        if self._conn is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);"
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+            )
+        return self._conn
+    
+    @staticmethod
+    def make_key(prompt, model, temperature):
+        # Stable key for a generation request
+        payload = f"{model}\x00{temperature!r}\x00{prompt}"
+        return hashlib.sha256(payload.encode('utf-8', errors='replace')).hexdigest()
+    
+    def get(self, key):
+        # Return the cached response, or None when missing or expired
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            
+            if row and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            
+            if row:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._bump(conn, "hits" if row else "misses")
+            conn.commit()
+            return row[0] if row else None
+    
+    def put(self, key, response):
+        # Store a response and evict least recently used entries over the size cap
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode('utf-8', errors='replace')), now, now)
+            )
+            self._evict(conn)
+            conn.commit()
+    
+    def _evict(self, conn):
+        # Drop expired entries, then the oldest-used ones until under max_bytes
+        if self.ttl:
+            conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+    
+    def _bump(self, conn, name):
+        # Increment a persistent hit/miss counter
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+    
+    def stats(self):
+        # Entry count, total size and lifetime hit/miss counters
+        with self._lock:
+            conn = self._connection()
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            return {
+                "entries": entries,
+                "bytes": size,
+                "hits": counters.get("hits", 0),
+                "misses": counters.get("misses", 0)
+            }
+    
+    def clear(self):
+        # Remove all cached responses and reset counters
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM counters")
+            conn.commit()
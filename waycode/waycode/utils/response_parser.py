@@ -0,0 +1,70 @@
+class ResponseParser:
+    # Incremental parser for model responses. Text can be fed in arbitrary
+    # chunks; complete lines are classified as explanation or code by
+    # tracking ``` fences, so output can be shown while the model streams.
+    
+    def __init__(self):
+        self._buffer = ''
+        self.in_code = False
+        self.code_lines = []
+        self.explanation_lines = []
+    
+    def feed(self, chunk):
+        # Consume a chunk and return (section, line) events for completed lines
+        if not chunk:
+            return []
+        self._buffer += chunk
+        if '\n' not in self._buffer:
+            return []
+        *complete, self._buffer = self._buffer.split('\n')
+        events = []
+        for line in complete:
+            event = self._consume(line)
+            if event:
+                events.append(event)
+        return events
+    
+    def close(self):
+        # Flush the trailing partial line once the response is complete
+        line, self._buffer = self._buffer, ''
+        event = self._consume(line)
+        return [event] if event else []
+    
+    def _consume(self, line):
+        # Classify one line, toggling code mode on fence lines
+        if line.strip().startswith('```'):
+            self.in_code = not self.in_code
+            return None
+        
+        if self.in_code:
+            self.code_lines.append(line)
+            return ('code', line)
+        self.explanation_lines.append(line)
+        return ('explanation', line)
+    
+    def result(self):
+        # Parsed {'code', 'explanation', 'complete'} dict, or None when no code
+        # was found; complete is False when the code block was never closed,
+        # which usually means the response was cut off
+        if self.code_lines:
+            return {
+                'code': '\n'.join(self.code_lines),
+                'explanation': '\n'.join(self.explanation_lines).strip(),
+                'complete': not self.in_code
+            }
+        return None
+    
+    def render(self, language=''):
+        # Rebuild an equivalent raw response from the parsed sections
+        parsed = self.result()
+        if not parsed:
+            return None
+        return f"{parsed['explanation']}\n```{language}\n{parsed['code']}\n```"
+    
+    @classmethod
+    def parse(cls, response):
+        # Parse a complete response in one call
+        parser = cls()
+        parser.feed(response)
+        parser.close()
+        return parser.result()
@@ -0,0 +1,10 @@
+# Rough token estimates used for budgeting prompts without a tokenizer call
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    # Approximate token count of a string (about four characters per token)
+    return tokens_for_chars(len(text) if text else 0)
+
+def tokens_for_chars(count):
+    # Approximate token count of `count` characters of text
+    return count // CHARS_PER_TOKEN + 1 if count else 0